@@ -169,6 +169,7 @@ class SRT:
         time: str | None = None,
         time_limit: str | None = None,
         available_only: bool = True,
+        passengers: list[Passenger] | None = None,
     ) -> list[SRTTrain]:
         """주어진 출발지에서 도착지로 향하는 SRT 열차를 검색합니다.
 
@@ -179,6 +180,7 @@ class SRT:
             time (str, optional): 출발 시각 (hhmmss) (default: 0시 0분 0초)
             time_limit (str, optional): 출발 시각 조회 한도 (hhmmss)
             available_only (bool, optional): 매진되지 않은 열차만 검색합니다 (default: True)
+            passengers (list[:class:`Passenger`], optional): 검색 인원, 이 인원이 앉을 수 있는 열차만 예약 가능으로 표시됩니다 (default: 어른 1명)
 
         Returns:
             list[:class:`SRTTrain`]: 열차 리스트
@@ -207,6 +209,7 @@ class SRT:
             dep_code=dep_code,
             available_only=available_only,
             use_netfunnel_cache=True,
+            passengers=passengers,
         )
 
         return trains
@@ -222,6 +225,7 @@ class SRT:
         dep_code: str | None = None,
         available_only: bool = True,
         use_netfunnel_cache: bool = True,
+        passengers: list[Passenger] | None = None,
     ) -> list[SRTTrain]:
         """netfunnel_key를 발급받아 열차를 검색하는 내부 함수입니다.
 
@@ -235,6 +239,7 @@ class SRT:
             dep_code (str, optional): 출발역 코드
             available_only (bool, optional): 매진되지 않은 열차만 검색합니다 (default: True)
             use_netfunnel_cache (bool, optional): netfunnel 캐시 사용 여부, 사용하지 않으면 요청 시마다 새로 netfunnel 키를 요청합니다 (default: True)
+            passengers (list[:class:`Passenger`], optional): 검색 인원 (default: 어른 1명)
 
         Returns:
             list[:class:`SRTTrain`]: 열차 리스트
@@ -249,8 +254,8 @@ class SRT:
             "chtnDvCd": "1",
             "arriveTime": "N",
             "seatAttCd": "015",
-            # 검색 시에는 1명 기준으로 검색
-            "psgNum": 1,
+            # 검색 인원 (잔여석 여부가 이 인원 기준으로 내려옴)
+            "psgNum": int(Passenger.total_count(passengers)) if passengers else 1,
             "trnGpCd": 109,
             # train type (05: 전체, 17: SRT)
             "stlbTrnClsfCd": "05",
@@ -288,6 +293,7 @@ class SRT:
                     dep_code=dep_code,
                     available_only=available_only,
                     use_netfunnel_cache=False,
+                    passengers=passengers,
                 )
             else:
                 message = parser.message()
@@ -1,7 +1,9 @@
+import json
 from pathlib import Path
 
 import pytest
 
+from SRT.errors import SRTResponseError
 from SRT.reservation import SRTReservation
 
 mock_response_dir = Path(__file__).parent / "mock_responses"
@@ -365,3 +367,32 @@ def test_pay_with_card_fail_suspension_card(mock_server, httpserver):
             installment=0,
             card_type="J",
         )
+
+
+# 검색 인원이 psgNum으로 전달되는지 확인
+def test_search_train_sends_passenger_count(mock_server, httpserver):
+    from werkzeug.wrappers import Response
+
+    from SRT import SRT
+    from SRT.passenger import Adult, Child
+
+    sent = []
+
+    def handler(request):
+        sent.append(request.form["psgNum"])
+        body = {"resultMap": [{"strResult": "FAIL", "msgTxt": "", "msgCd": ""}]}
+        return Response(json.dumps(body), content_type="application/json")
+
+    httpserver.expect_request("/search_schedule").respond_with_handler(handler)
+
+    srt = SRT("010-1234-1234", "password", auto_login=False)
+    srt.netfunnel_helper.generate_netfunnel_key = lambda use_cache: "netfunnel-key"
+
+    with pytest.raises(SRTResponseError):
+        srt.search_train("수서", "부산", "20231024", "000000")
+    with pytest.raises(SRTResponseError):
+        srt.search_train(
+            "수서", "부산", "20231024", "000000", passengers=[Adult(2), Child(1), Adult()]
+        )
+
+    assert sent == ["1", "4"]
@@ -0,0 +1,260 @@
+"""
+잔여석 변화 이벤트 - (노선, 날짜, 열차)별 이전 좌석 상태를 기억해 바뀐 부분만 이벤트로 만들고 asyncio 버스로 구독자에게 전달
+"""
+import asyncio
+import inspect
+import logging
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+from scoring import GENERAL, SPECIAL
+
+# 이벤트 종류
+SEAT_OPENED = "seat_opened"
+SEAT_CLOSED = "seat_closed"
+STANDBY_OPENED = "standby_opened"
+OPEN_KINDS = frozenset({SEAT_OPENED, STANDBY_OPENED})
+
+# 열차 좌석 상태 비트
+_GENERAL_BIT = 1
+_SPECIAL_BIT = 2
+_STANDBY_BIT = 4
+_SEAT_BITS = ((_GENERAL_BIT, GENERAL), (_SPECIAL_BIT, SPECIAL))
+
+Party = Tuple[int, int]  # 조회 인원 (어른, 어린이)
+RouteKey = Tuple[str, str, str, str, Party]  # (service, 출발, 도착, 날짜, 조회 인원)
+TrainId = Tuple[str, str]  # (열차 번호, 출발 시각 HHMMSS)
+Handler = Callable[["AvailabilityEvent"], Union[None, Awaitable[None]]]
+
+
+@dataclass
+class AvailabilityEvent:
+    kind: str
+    service: str
+    departure: str
+    arrival: str
+    date: str
+    train_no: str
+    dep_time: str  # HHMMSS
+    seat_class: Optional[str] = None  # GENERAL / SPECIAL (예약대기 이벤트는 None)
+    train: Any = None  # 이벤트를 만든 조회 결과의 열차 객체
+    party: Party = (1, 0)  # 조회 인원 (인원마다 잔여석 판단이 다르므로 상태도 따로 비교)
+    at: float = field(default_factory=time.time)
+
+    @property
+    def route(self) -> RouteKey:
+        return (self.service, self.departure, self.arrival, self.date, self.party)
+
+
+def _train_fields(train: Any, service: str) -> Tuple[TrainId, int]:
+    """((열차 번호, 출발 시각), 좌석 상태 비트)"""
+    if service == 'KTX':
+        state = (
+            (_GENERAL_BIT if train.has_general_seat() else 0)
+            | (_SPECIAL_BIT if train.has_special_seat() else 0)
+            | (_STANDBY_BIT if train.has_waiting_list() else 0)
+        )
+        return (train.train_no, train.dpt_time), state
+    state = (
+        (_GENERAL_BIT if train.general_seat_available() else 0)
+        | (_SPECIAL_BIT if train.special_seat_available() else 0)
+        | (_STANDBY_BIT if train.reserve_standby_available() else 0)
+    )
+    return (train.train_number, train.dep_time), state
+
+
+class AvailabilityTracker:
+    """노선/날짜/조회 인원별 열차 좌석 상태 벡터와 비교해 바뀐 비트만 이벤트로 변환
+
+    조회 인원이 다르면 같은 열차도 좌석 유무가 다르므로 인원별로 따로 비교 (번갈아 비교하면 열림/매진이 반복됨).
+
+    좌석 있는 열차만 돌려주는 조회(available_only)에서 빠진 열차는 조회한 시간 범위 안이면 매진으로 봄.
+    범위 끝은 window_end, 없으면 결과의 마지막 출발 시각 (결과가 비어 있으면 window_start 이후 전부).
+    """
+
+    def __init__(self, max_routes: int = 2000) -> None:
+        self.max_routes = max_routes
+        self._states: Dict[RouteKey, Dict[TrainId, int]] = {}
+        self.observations = 0
+
+    def observe(
+        self,
+        service: str,
+        departure: str,
+        arrival: str,
+        date: str,
+        trains: Iterable[Any],
+        window_start: Optional[str] = None,
+        window_end: Optional[str] = None,
+        available_only: bool = False,
+        party: Party = (1, 0),
+    ) -> List[AvailabilityEvent]:
+        self.observations += 1
+        party = tuple(party)
+        route = (service, departure, arrival, date, party)
+        previous = self._states.get(route)
+        if previous is None:
+            if len(self._states) >= self.max_routes:
+                del self._states[next(iter(self._states))]
+            previous = self._states[route] = {}
+
+        current: Dict[TrainId, Tuple[int, Any]] = {}
+        for train in trains:
+            train_id, state = _train_fields(train, service)
+            current[train_id] = (state, train)
+
+        if available_only:
+            span_end = window_end or (max(dep for _, dep in current) if current else None)
+            for train_id, state in previous.items():
+                dep = train_id[1]
+                if train_id in current or not state:
+                    continue
+                if (window_start and dep < window_start) or (span_end and dep > span_end):
+                    continue
+                current[train_id] = (0, None)
+
+        events = []
+        for train_id, (state, train) in current.items():
+            old = previous.get(train_id, 0)
+            changed = old ^ state
+            if not changed:
+                continue
+            previous[train_id] = state
+            for bit, seat_class in _SEAT_BITS:
+                if changed & bit:
+                    kind = SEAT_OPENED if state & bit else SEAT_CLOSED
+                    events.append(AvailabilityEvent(kind, service, departure, arrival, date,
+                                                    train_id[0], train_id[1], seat_class, train, party))
+            if changed & state & _STANDBY_BIT:
+                events.append(AvailabilityEvent(STANDBY_OPENED, service, departure, arrival, date,
+                                                train_id[0], train_id[1], None, train, party))
+        return events
+
+
+class Subscription:
+    """구독자별 이벤트 큐 - 가득 차면 가장 오래된 이벤트를 버림 (발행자는 기다리지 않음)"""
+
+    def __init__(self, bus: "AvailabilityBus", kinds: Optional[Iterable[str]], maxsize: int) -> None:
+        self._bus = bus
+        self.kinds = frozenset(kinds) if kinds is not None else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def wants(self, event: AvailabilityEvent) -> bool:
+        return self.kinds is None or event.kind in self.kinds
+
+    def put(self, event: AvailabilityEvent) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> AvailabilityEvent:
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> AvailabilityEvent:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self._bus.unsubscribe(self)
+
+
+class AvailabilityBus:
+    """잔여석 변화 이벤트 pub/sub (같은 이벤트 루프 안에서 발행/구독)"""
+
+    def __init__(self) -> None:
+        self._subscriptions: List[Subscription] = []
+        self.published = 0
+
+    def subscribe(self, kinds: Optional[Iterable[str]] = None, maxsize: int = 1000) -> Subscription:
+        subscription = Subscription(self, kinds, maxsize)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def publish(self, events: Iterable[AvailabilityEvent]) -> int:
+        count = 0
+        for event in events:
+            count += 1
+            for subscription in self._subscriptions:
+                if subscription.wants(event):
+                    subscription.put(event)
+        self.published += count
+        return count
+
+
+class AvailabilitySubscriber:
+    """버스를 구독해 이벤트마다 handler(event)를 실행하는 워커 (handler는 함수 또는 코루틴 함수)"""
+
+    def __init__(self, bus: AvailabilityBus, handler: Handler, kinds: Optional[Iterable[str]] = None, name: str = "") -> None:
+        self.bus = bus
+        self.handler = handler
+        self.kinds = kinds
+        self.name = name or getattr(handler, '__qualname__', 'subscriber')
+        self._subscription: Optional[Subscription] = None
+        self._task: Optional[asyncio.Task] = None
+        self._logger = logging.getLogger(__name__ + ".AvailabilitySubscriber")
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task and not self._task.done():
+            return
+        # 시작 전에 구독해야 워커가 처음 돌기 전에 발행된 이벤트도 받음
+        self._subscription = self.bus.subscribe(self.kinds)
+        self._task = loop.create_task(self.run())
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def stop(self) -> None:
+        if self._subscription is not None:
+            self._subscription.close()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> None:
+        async for event in self._subscription:
+            try:
+                result = self.handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._logger.exception("Subscriber %s failed on %s: %s", self.name, event.kind, exc)
+
+
+class AvailabilityStats:
+    """분석용 구독자 - 노선/날짜별 최근 이벤트 시각을 종류별로 보관 (조회 인원은 구분하지 않음)"""
+
+    def __init__(self, window: float = 3600.0, max_per_route: int = 500, clock: Callable[[], float] = time.time) -> None:
+        self.window = window
+        self.max_per_route = max_per_route
+        self._clock = clock
+        self._events: Dict[Tuple[str, str, str, str], Dict[str, Deque[float]]] = defaultdict(dict)
+        self.totals: Dict[str, int] = defaultdict(int)
+
+    def record(self, event: AvailabilityEvent) -> None:
+        self.totals[event.kind] += 1
+        by_kind = self._events[event.route[:4]]
+        times = by_kind.get(event.kind)
+        if times is None:
+            times = by_kind[event.kind] = deque(maxlen=self.max_per_route)
+        times.append(event.at)
+
+    def recent(self, service: str, departure: str, arrival: str, date: str) -> Dict[str, int]:
+        """최근 window초 동안 종류별 이벤트 수"""
+        since = self._clock() - self.window
+        by_kind = self._events.get((service, departure, arrival, date), {})
+        return {kind: sum(1 for at in times if at >= since) for kind, times in by_kind.items()}
@@ -0,0 +1,185 @@
+"""
+유연 날짜 잔여석 그리드 - 날짜 ±N일 × 시간대 조회를 동시에 실행해 날짜×시간대 행렬로 모아 보여줌
+"""
+import asyncio
+import logging
+import time
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from rate_limiter import TokenBucket
+
+DAYS_OF_WEEK = ['월', '화', '수', '목', '금', '토', '일']
+
+# 기본 시간대 (시작, 끝) HHMMSS
+DEFAULT_BANDS: Tuple[Tuple[str, str], ...] = (
+    ('060000', '085959'),
+    ('090000', '115959'),
+    ('120000', '145959'),
+    ('150000', '175959'),
+    ('180000', '205959'),
+    ('210000', '235959'),
+)
+
+UNKNOWN = -1  # 조회 실패/미조회 셀
+_MAX_COUNT = 127  # array('b') 셀 최댓값
+
+CellKey = Tuple[str, str, str, str, str, str]  # (service, 출발, 도착, 날짜, 시간대 시작, 시간대 끝)
+SearchFunc = Callable[[str, str, str, str, str, str], Awaitable[int]]
+
+
+class AvailabilityGrid:
+    """날짜(행) × 시간대(열) 잔여 열차 수 행렬 (array('b') 한 개에 행 우선으로 저장)"""
+
+    def __init__(self, dates: Sequence[str], bands: Sequence[Tuple[str, str]]) -> None:
+        self.dates = list(dates)
+        self.bands = list(bands)
+        self.cells = array('b', [UNKNOWN]) * (len(self.dates) * len(self.bands))
+
+    def _index(self, row: int, col: int) -> int:
+        return row * len(self.bands) + col
+
+    def get(self, row: int, col: int) -> int:
+        return self.cells[self._index(row, col)]
+
+    def set(self, row: int, col: int, count: int) -> None:
+        self.cells[self._index(row, col)] = UNKNOWN if count < 0 else min(count, _MAX_COUNT)
+
+    def row_total(self, row: int) -> int:
+        start = self._index(row, 0)
+        return sum(c for c in self.cells[start:start + len(self.bands)] if c > 0)
+
+    def render(self, title: str = "") -> str:
+        """텔레그램 메시지 한 개로 보낼 표"""
+        lines = [title] if title else []
+        lines.append("날짜      " + " ".join(f"{start[:2]}시" for start, _ in self.bands))
+        for row, day in enumerate(self.dates):
+            weekday = DAYS_OF_WEEK[datetime.strptime(day, '%Y%m%d').weekday()]
+            cells = []
+            for col in range(len(self.bands)):
+                count = self.get(row, col)
+                if count == UNKNOWN:
+                    cells.append(" ⚠️ ")
+                elif count == 0:
+                    cells.append(" ❌ ")
+                else:
+                    cells.append(f"✅{count:<2d}" if count < 100 else "✅99")
+            lines.append(f"{day[4:6]}/{day[6:]}({weekday}) " + " ".join(cells))
+        lines.append("✅n: 좌석 있는 열차 수 · ❌: 매진 · ⚠️: 조회 실패")
+        return "\n".join(lines)
+
+
+class CellCache:
+    """셀 단위 TTL 캐시 - 같은 구간을 다시 볼 때 업스트림 조회 없이 응답"""
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 5000, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: Dict[CellKey, Tuple[float, int]] = {}  # key -> (만료 시각, 열차 수)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CellKey) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: CellKey, count: int) -> None:
+        now = self._clock()
+        if len(self._entries) >= self.max_entries:
+            expired = [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for k in expired:
+                del self._entries[k]
+            if len(self._entries) >= self.max_entries:
+                # 삽입 순서상 가장 오래된 항목부터 제거
+                for k in list(self._entries)[:len(self._entries) - self.max_entries + 1]:
+                    del self._entries[k]
+        self._entries[key] = (now + self.ttl, count)
+
+
+@dataclass
+class GridStats:
+    cells: int = 0
+    cached: int = 0
+    searched: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+
+class AvailabilityGridBuilder:
+    """캐시에 없는 셀만 레이트 리미터와 동시 실행 한도 안에서 한꺼번에 조회
+
+    `search(service, dep, arr, date, band_start, band_end)`는 시간대 안에서 좌석이 있는 열차 수를 반환.
+    실패한 셀은 캐시하지 않으므로 다음 조회에서 다시 시도함.
+    """
+
+    def __init__(
+        self,
+        search: SearchFunc,
+        limiter: TokenBucket,
+        cache: Optional[CellCache] = None,
+        concurrency: int = 8,
+    ) -> None:
+        self.search = search
+        self.limiter = limiter
+        self.cache = cache if cache is not None else CellCache()
+        self.concurrency = concurrency
+        self._logger = logging.getLogger(__name__ + ".AvailabilityGridBuilder")
+
+    @staticmethod
+    def date_range(center: str, days: int, today: Optional[str] = None) -> List[str]:
+        """center ±days 날짜 (오늘 이전은 제외)"""
+        base = datetime.strptime(center, '%Y%m%d')
+        today = today or datetime.now().strftime('%Y%m%d')
+        dates = [(base + timedelta(days=offset)).strftime('%Y%m%d') for offset in range(-days, days + 1)]
+        return [d for d in dates if d >= today]
+
+    async def build(
+        self,
+        service: str,
+        departure: str,
+        arrival: str,
+        dates: Sequence[str],
+        bands: Sequence[Tuple[str, str]] = DEFAULT_BANDS,
+    ) -> Tuple[AvailabilityGrid, GridStats]:
+        started = time.perf_counter()
+        grid = AvailabilityGrid(dates, bands)
+        stats = GridStats(cells=len(grid.cells))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = []
+
+        async def fill(row: int, col: int, key: CellKey) -> None:
+            async with semaphore:
+                await self.limiter.acquire()
+                try:
+                    count = await self.search(*key)
+                except Exception as exc:
+                    stats.failed += 1
+                    self._logger.debug("Grid cell %s failed: %s", key, exc)
+                    return
+            stats.searched += 1
+            self.cache.put(key, count)
+            grid.set(row, col, count)
+
+        for row, day in enumerate(grid.dates):
+            for col, (start, end) in enumerate(grid.bands):
+                key = (service, departure, arrival, day, start, end)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    stats.cached += 1
+                    grid.set(row, col, cached)
+                else:
+                    pending.append(fill(row, col, key))
+
+        if pending:
+            await asyncio.gather(*pending)
+        stats.elapsed = time.perf_counter() - started
+        return grid, stats
@@ -0,0 +1,1062 @@
+"""
+성능 벤치마크 모음
+
+사용법:
+    python benchmarks.py            # 전체 실행
+    python benchmarks.py keyboards  # 이름으로 골라 실행 (keyboards, callbacks, target_recovery, scheduler, registry_locks, shard_ring, leases, group_reservation, availability_grid, seat_maps, korail_cars, seat_blocks, seat_watcher, availability_events, search_cache)
+"""
+import copy
+import logging
+import random
+import sys
+import time
+from typing import Callable, Dict
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {}
+
+
+def benchmark(name: str):
+    """벤치마크 함수 등록 데코레이터"""
+    def decorator(func: Callable[[], None]) -> Callable[[], None]:
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def _report(label: str, count: int, elapsed: float) -> None:
+    print(f"  {label:<24} {count:>8}건 {elapsed:8.3f}s  {count / elapsed:>12,.0f}건/s")
+
+
+@benchmark("keyboards")
+def bench_keyboards(updates: int = 50000) -> None:
+    """달력/시간 선택 콜백을 빠르게 연달아 처리할 때의 키보드 생성 처리량 (캐시 vs 매번 생성)"""
+    import keyboards
+
+    rng = random.Random(42)
+    today = keyboards._today()
+    months = [((today.month - 1 + i) % 12 + 1, today.year + (today.month - 1 + i) // 12) for i in range(3)]
+    hours = [None, *keyboards.HOURS]
+    minutes = [None, *keyboards.MINUTES]
+    # 실제 콜백 분포를 흉내냄: 달력 이동 1 : 시간/분 선택 4
+    stream = []
+    for _ in range(updates):
+        if rng.random() < 0.2:
+            month, year = rng.choice(months)
+            stream.append(("cal", year, month))
+        else:
+            stream.append(("time", rng.choice(hours), rng.choice(minutes)))
+
+    def run(build_calendar, build_time) -> float:
+        started = time.perf_counter()
+        for kind, a, b in stream:
+            if kind == "cal":
+                build_calendar(a, b, today)
+            else:
+                build_time(a, b)
+        return time.perf_counter() - started
+
+    print(f"keyboards: 콜백 {updates}건")
+    uncached = run(keyboards._build_calendar.__wrapped__, keyboards.create_time_selector.__wrapped__)
+    _report("매번 생성", updates, uncached)
+    keyboards._build_calendar.cache_clear()
+    keyboards.create_time_selector.cache_clear()
+    cached = run(keyboards._build_calendar, keyboards.create_time_selector)
+    _report("LRU 캐시", updates, cached)
+    print(f"  속도 향상 x{uncached / cached:.1f}, "
+          f"time_selector {keyboards.create_time_selector.cache_info()}")
+
+
+# main2.py에 등록된 콜백 네임스페이스 (정확 일치 / 접두사)
+_CALLBACK_EXACT = [
+    "time_confirm", "time_reset", "time_cancel", "route_ktx_seoul_busan", "route_ktx_busan_seoul",
+    "route_seoul_busan", "route_busan_seoul", "route_custom", "sort_time", "sort_price", "search_again",
+    "multi_monitor_mode", "single_booking_mode", "multi_start", "adult_manual", "child_manual",
+    "window_priority", "window_only", "window_no", "seat_special", "seat_general",
+]
+_CALLBACK_PREFIXES = ["cal_", "date_", "time_hour_", "time_minute_", "select_train_", "multi_toggle_",
+                      "adult_", "child_"]
+
+
+def _synthetic_callback_updates(count: int, rng: random.Random):
+    """가짜 CallbackQuery 업데이트 생성"""
+    from telegram import Bot, Update
+
+    bot = Bot("123456:BENCHMARK")
+    samples = _CALLBACK_EXACT + [
+        "cal_2025_8_2025", "date_today", "date_20250812", "time_hour_09", "time_minute_35",
+        "select_train_4", "multi_toggle_2", "adult_2", "child_0", "ignore",
+    ]
+    updates = []
+    for update_id in range(count):
+        user = {'id': 1000 + update_id % 50, 'is_bot': False, 'first_name': 'bench'}
+        chat = {'id': user['id'], 'type': 'private', 'first_name': 'bench'}
+        updates.append(Update.de_json({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': user,
+                'chat_instance': str(user['id']),
+                'data': rng.choice(samples),
+                'message': {'message_id': update_id, 'date': 0, 'chat': chat, 'text': 'bench'},
+            },
+        }, bot))
+    return updates
+
+
+@benchmark("callbacks")
+def bench_callbacks(updates: int = 100000) -> None:
+    """콜백 디스패치 처리량 - 테이블 기반 라우터 vs 접두사를 차례로 검사하는 if/elif 체인"""
+    import asyncio
+
+    from callback_router import CallbackRouter, parse_calendar, parse_date, parse_int
+
+    parsers = {"cal_": parse_calendar, "date_": parse_date}
+
+    async def count(update, context, payload):
+        return payload
+
+    router = CallbackRouter()
+    for data in _CALLBACK_EXACT:
+        router.add_exact(data, count)
+    for prefix in _CALLBACK_PREFIXES:
+        router.add_prefix(prefix, count, parsers.get(prefix, parse_int))
+    router.fallback(count)
+
+    # 기존 handle_callback_query와 같은 방식: 등록 순서대로 검사
+    chain = [(data, False) for data in _CALLBACK_EXACT] + [(prefix, True) for prefix in _CALLBACK_PREFIXES]
+
+    async def chain_dispatch(update, context):
+        data = update.callback_query.data
+        for key, is_prefix in chain:
+            if data.startswith(key) if is_prefix else data == key:
+                await count(update, context, data[len(key):] if is_prefix else data)
+                return
+        await count(update, context, data)
+
+    stream = _synthetic_callback_updates(updates, random.Random(7))
+
+    async def run(dispatch) -> float:
+        started = time.perf_counter()
+        for update in stream:
+            await dispatch(update, None)
+        return time.perf_counter() - started
+
+    print(f"callbacks: 합성 CallbackQuery {updates}건")
+    chain_elapsed = asyncio.run(run(chain_dispatch))
+    _report("if/elif 체인", updates, chain_elapsed)
+    router_elapsed = asyncio.run(run(router.dispatch))
+    _report("CallbackRouter", updates, router_elapsed)
+    print(f"  매칭 {router.dispatched_count}건, 미등록 {router.unmatched_count}건")
+
+
+@benchmark("target_recovery")
+def bench_target_recovery(targets: int = 100000, wal_records: int = 20000) -> None:
+    """TargetStore 복구 시간 - 스냅샷 10만 타겟 + WAL 재생 후 레지스트리 재구성"""
+    import tempfile
+    from datetime import datetime, timedelta
+
+    from pipeline import TargetItem, TargetRegistry
+    from target_store import TargetStore
+
+    rng = random.Random(3)
+    now = datetime.utcnow()
+    items = [
+        TargetItem(
+            target_id=f"{i:08x}",
+            chat_id=10000 + i % 5000,
+            service=rng.choice(("KTX", "SRT")),
+            departure="서울",
+            arrival="부산",
+            date="20250812",
+            time=f"{6 + i % 16:02d}0000",
+            metadata={'adult_count': 1, 'seat': 'GENERAL_FIRST'},
+            group_id=f"g{i // 4:07d}" if i % 3 else None,
+            priority=i % 4 + 1,
+            next_scan=now + timedelta(seconds=rng.uniform(0, 600)),
+        )
+        for i in range(targets)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TargetStore(f"{tmp}/targets", compact_every=10 ** 9)
+        started = time.perf_counter()
+        store.compact(items, {})
+        capture_elapsed = time.perf_counter() - started
+        store.flush()
+        snapshot_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(wal_records):
+            target = rng.choice(items)
+            target.last_scan = now
+            target.next_scan = now + timedelta(seconds=rng.uniform(0, 600))
+            store.record_scan(target)
+        wal_elapsed = time.perf_counter() - started
+        store.flush()
+        wal_written = time.perf_counter() - started
+        store.close()
+        expected = {t.target_id: t.next_scan for t in items}
+
+        print(f"target_recovery: 타겟 {targets}건, WAL {wal_records}건")
+        _report("스냅샷 (루프에서 값 복사)", targets, capture_elapsed)
+        _report("스냅샷 (기록 완료까지)", targets, snapshot_elapsed)
+        _report("WAL 추가 (루프)", wal_records, wal_elapsed)
+        _report("WAL 추가 (기록 완료까지)", wal_records, wal_written)
+        print(f"  기록 묶음 {store.batches}회, 병합된 스캔 기록 {store.coalesced_scans}건")
+
+        registry = TargetRegistry(store=TargetStore(f"{tmp}/targets", compact_every=10 ** 9))
+        started = time.perf_counter()
+        restored = registry.restore_from_store()
+        restore_elapsed = time.perf_counter() - started
+        _report("복구 (재생+재계산)", restored, restore_elapsed)
+
+        mismatched = sum(
+            1 for target in registry._iter_targets()
+            if target.next_scan < expected[target.target_id]
+        )
+        print(f"  next_scan 보존 실패 {mismatched}건")
+
+
+@benchmark("scheduler")
+def bench_scheduler(chats: int = 20, targets_per_chat: int = 250, group_size: int = 5) -> None:
+    """스캔 1회당 레지스트리 오버헤드 - fetch_next_target → set_pending → handle_reservation_result"""
+    import asyncio
+
+    from pipeline import TargetRegistry
+
+    async def run() -> None:
+        registry = TargetRegistry()
+        for chat_id in range(chats):
+            courses = [
+                dict(service="KTX", departure="서울", arrival="부산", date="20250812", time=f"{6 + i % 16:02d}0000")
+                for i in range(targets_per_chat)
+            ]
+            for start in range(0, targets_per_chat, group_size):
+                await registry.add_target_group(chat_id, courses[start:start + group_size])
+
+        total = chats * targets_per_chat
+        fetch_elapsed = 0.0
+        events_elapsed = 0.0
+        scans = 0
+        while True:
+            started = time.perf_counter()
+            target = await registry.fetch_next_target()
+            fetch_elapsed += time.perf_counter() - started
+            if target is None:
+                break
+            started = time.perf_counter()
+            await registry.set_pending(target.chat_id, target.target_id, True)
+            await registry.handle_reservation_result(target.chat_id, target.target_id, False)
+            events_elapsed += time.perf_counter() - started
+            scans += 1
+
+        print(f"scheduler: 채팅 {chats}개 x 타겟 {targets_per_chat}개 (그룹 크기 {group_size}), 스캔 {scans}건")
+        print(f"  fetch_next_target        {fetch_elapsed / scans * 1e6:10.1f}us/스캔")
+        print(f"  pending/결과 처리          {events_elapsed / scans * 1e6:10.1f}us/스캔")
+        assert scans == total
+
+    logging_level = logging.getLogger("pipeline").level
+    logging.getLogger("pipeline").setLevel(logging.WARNING)
+    try:
+        asyncio.run(run())
+    finally:
+        logging.getLogger("pipeline").setLevel(logging_level)
+
+
+@benchmark("registry_locks")
+def bench_registry_locks(chats: int = 200, workers: int = 32, ops_per_worker: int = 2000) -> None:
+    """레지스트리 락 경합 - 전역 락(lock_shards=1) vs 채팅별 락
+
+    워커는 실제 레지스트리 연산(set_pending/mark_scan_failure/list_targets)과 함께,
+    락을 잡은 채 한 번 양보하는 합성 임계 구역(오프로딩된 I/O 대기 가정)을 섞어 수행.
+    """
+    import asyncio
+
+    from pipeline import TargetRegistry
+
+    async def run(lock_shards) -> None:
+        registry = TargetRegistry(lock_shards=lock_shards)
+        targets = []
+        for chat_id in range(chats):
+            targets.extend(await registry.add_targets(chat_id, [
+                dict(service="SRT", departure="수서", arrival="부산", date="20250812", time="080000")
+                for _ in range(5)
+            ]))
+        registry.lock_stats.__init__()
+        rng = random.Random(11)
+
+        async def worker() -> None:
+            for i in range(ops_per_worker):
+                target = rng.choice(targets)
+                if i % 4 == 0:
+                    await registry.list_targets(target.chat_id)
+                elif i % 4 == 1:
+                    await registry.mark_scan_failure(target.chat_id, target.target_id, backoff_seconds=0)
+                elif i % 4 == 2:
+                    await registry.set_pending(target.chat_id, target.target_id, i % 8 == 2)
+                else:
+                    async with registry._locked(target.chat_id):
+                        await asyncio.sleep(0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        elapsed = time.perf_counter() - started
+        stats = registry.lock_stats.snapshot()
+        label = "전역 락" if lock_shards == 1 else "채팅별 락"
+        _report(label, workers * ops_per_worker, elapsed)
+        print(f"    경합률 {stats['contention_rate'] * 100:5.1f}%, 평균 대기 {stats['avg_wait_ms']:.3f}ms, "
+              f"최대 대기 {stats['max_wait_ms']:.3f}ms")
+
+    print(f"registry_locks: 채팅 {chats}개, 워커 {workers}개 x 연산 {ops_per_worker}건")
+    logging.getLogger("pipeline").setLevel(logging.WARNING)
+    asyncio.run(run(1))
+    asyncio.run(run(None))
+
+
+@benchmark("shard_ring")
+def bench_shard_ring(chats: int = 100000, shards: int = 4) -> None:
+    """일관 해시 링의 샤드별 채팅 분포와 워커 하나가 재시작될 때 옮겨지는 채팅 비율"""
+    from sharding import ConsistentHashRing
+
+    ring = ConsistentHashRing(range(shards))
+    started = time.perf_counter()
+    owners = {chat_id: ring.node_for(chat_id) for chat_id in range(chats)}
+    _report("조회", chats, time.perf_counter() - started)
+
+    counts = [0] * shards
+    for owner in owners.values():
+        counts[owner] += 1
+    ideal = chats / shards
+    print(f"    샤드별 채팅: {counts} (편차 최대 {max(abs(c - ideal) for c in counts) / ideal * 100:.1f}%)")
+
+    ring.remove_node(0)
+    moved = sum(1 for chat_id, owner in owners.items() if ring.node_for(chat_id) != owner)
+    print(f"    샤드 0 종료 시 이동 {moved / chats * 100:.1f}% (샤드 0 몫 {counts[0] / chats * 100:.1f}%)")
+    ring.add_node(0)
+    restored = sum(1 for chat_id, owner in owners.items() if ring.node_for(chat_id) == owner)
+    print(f"    재시작 후 원래 샤드로 복귀 {restored / chats * 100:.1f}%")
+
+
+@benchmark("leases")
+def bench_leases(chats: int = 100, targets_per_chat: int = 2, scan_cost: float = 0.02, duration: float = 3.0) -> None:
+    """여러 인스턴스가 같은 타겟을 가질 때 임대로 나눠 스캔하는 처리량과 중복 스캔 수
+
+    인스턴스마다 스캐너 1개가 스캔 한 번에 `scan_cost`초(업스트림 호출)를 쓰므로,
+    인스턴스 하나로는 타겟 주기(1초)를 따라가지 못하고 인스턴스 수만큼 처리량이 늘어야 함.
+    """
+    import asyncio
+    import os
+    import tempfile
+
+    from lease_store import LeaseKeeper, LeaseStore
+    from pipeline import TargetRegistry
+
+    async def run(replicas: int, use_leases: bool, db_path: str) -> None:
+        courses = [
+            dict(service="KTX", departure="서울", arrival="부산", date="20250812", time=f"{6 + i:02d}0000")
+            for i in range(targets_per_chat)
+        ]
+        template = TargetRegistry()
+        for chat_id in range(chats):
+            await template.add_targets(chat_id, courses)
+
+        registries, keepers = [], []
+        for index in range(replicas):
+            store = LeaseStore(db_path, owner=f"replica-{index}", ttl=3.0) if use_leases else None
+            registry = TargetRegistry(lease_store=store)
+            # 모든 인스턴스가 같은 타겟(같은 ID)을 가진 상태 (예: 같은 스냅샷에서 복구)
+            for target in template._iter_targets():
+                replica_target = copy.copy(target)
+                registry._targets[target.chat_id][target.target_id] = replica_target
+                registry._allocations[target.chat_id].add(replica_target)
+            registries.append(registry)
+            if store is not None:
+                keepers.append(LeaseKeeper(store, registry, renew_interval=1.0))
+        # 합류 직후 첫 인스턴스가 전부 가져간 임대가 몫만큼 나뉠 때까지 sync
+        for _ in range(2):
+            for keeper in keepers:
+                await keeper.sync_once()
+
+        last_scan = {}
+        scans = duplicates = 0
+        deadline = time.monotonic() + duration
+
+        async def scanner(index: int, registry: TargetRegistry) -> None:
+            nonlocal scans, duplicates
+            while time.monotonic() < deadline:
+                target = await registry.fetch_next_target()
+                if target is None:
+                    await asyncio.sleep(0.01)
+                    continue
+                now = time.monotonic()
+                key = (target.chat_id, target.target_id)
+                previous = last_scan.get(key)
+                if previous is not None and previous[0] != index and now - previous[1] < target.scan_interval * 0.9:
+                    duplicates += 1
+                last_scan[key] = (index, now)
+                scans += 1
+                await asyncio.sleep(scan_cost)
+
+        loop = asyncio.get_running_loop()
+        for keeper in keepers:
+            keeper.start(loop)
+        await asyncio.gather(*(scanner(i, registry) for i, registry in enumerate(registries)))
+        for keeper in keepers:
+            await keeper.stop()
+            keeper.store.close()
+
+        label = f"{'임대' if use_leases else '임대 없음'} 인스턴스 {replicas}개"
+        _report(label, scans, duration)
+        print(f"    중복 스캔 {duplicates}건, 스캔한 타겟 {len(last_scan)}/{chats * targets_per_chat}개")
+
+    print(f"leases: 타겟 {chats * targets_per_chat}개, 스캔 비용 {scan_cost * 1000:.0f}ms, {duration:.0f}초씩")
+    logging.getLogger("pipeline").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(2, False, os.path.join(directory, "none.db")))
+        for replicas in (1, 2, 4):
+            asyncio.run(run(replicas, True, os.path.join(directory, f"leases-{replicas}.db")))
+
+
+@benchmark("group_reservation")
+def bench_group_reservation(trials: int = 200, group_size: int = 5) -> None:
+    """다중 코스 그룹 예매 - 최우선 코스 하나만 예약(기존) vs 좌석 있는 코스 동시 예약 후 최우선만 유지
+
+    코스마다 좌석이 있을 확률 60%, 예약 성공 확률 70%, 조회 10ms / 예약 20~80ms / 취소 20ms (지연은 asyncio.sleep)
+    """
+    import asyncio
+
+    from group_strategy import SpeculativeGroupReservation
+    from pipeline import ReservationTask, TargetRegistry
+
+    rng = random.Random(7)
+
+    class FakeTrains:
+        def __init__(self, available, succeeds, latency):
+            self.available, self.succeeds, self.latency = available, succeeds, latency
+
+        async def scan_for_available_train(self, target):
+            await asyncio.sleep(0.01)
+            return {'train': target.target_id} if self.available[target.target_id] else None
+
+        async def hold_reservation(self, target, payload):
+            await asyncio.sleep(self.latency[target.target_id])
+            if not self.succeeds[target.target_id]:
+                raise RuntimeError("잔여석 없음")
+            return object()
+
+        async def cancel_reservation(self, target, reservation):
+            await asyncio.sleep(0.02)
+            return True
+
+    async def run() -> None:
+        registry = TargetRegistry()
+        totals = {'best': [0, 0.0, 0], 'speculative': [0, 0.0, 0]}  # [성공, 첫 좌석까지 시간 합, 유지한 순위 합]
+        strategy = None
+        for trial in range(trials):
+            courses = [
+                dict(service="KTX", departure="서울", arrival="부산", date="20250812", time=f"{6 + i:02d}0000")
+                for i in range(group_size)
+            ]
+            members = await registry.add_target_group(trial, courses)
+            available = {t.target_id: rng.random() < 0.6 for t in members}
+            trigger = next((t for t in members if available[t.target_id]), None)
+            if trigger is None:
+                continue
+            trains = FakeTrains(
+                available,
+                {t.target_id: rng.random() < 0.7 for t in members},
+                {t.target_id: rng.uniform(0.02, 0.08) for t in members},
+            )
+
+            # 기존: 그룹 최우선 코스 하나만 예약 (그 코스에 좌석이 없으면 실패)
+            best = min(members, key=lambda t: t.priority)
+            started = time.perf_counter()
+            try:
+                if available[best.target_id] and await trains.hold_reservation(best, {}):
+                    totals['best'][0] += 1
+                    totals['best'][1] += time.perf_counter() - started
+                    totals['best'][2] += best.priority
+            except RuntimeError:
+                pass
+
+            strategy = SpeculativeGroupReservation(trains, registry) if strategy is None else strategy
+            strategy.train_reservation = trains
+            result = await strategy.reserve(ReservationTask(target=trigger, train_payload={'train': trigger.target_id}))
+            if result.winner is not None:
+                totals['speculative'][0] += 1
+                totals['speculative'][1] += result.first_hold_seconds
+                totals['speculative'][2] += result.winner.priority
+
+        print(f"group_reservation: 그룹 {trials}개 x 코스 {group_size}개")
+        for name, (successes, first_hold, priority) in totals.items():
+            label = "최우선 하나만" if name == 'best' else "병렬 예약"
+            print(f"  {label:<12} 성공 {successes:>4}/{trials} "
+                  f"첫 좌석까지 평균 {first_hold / max(1, successes) * 1000:6.1f}ms "
+                  f"유지한 순위 평균 {priority / max(1, successes):.2f}")
+        stats = strategy.stats.snapshot()
+        print(f"  병렬 예약 시도 {stats['attempts']}건, 확보 {stats['holds']}건, 취소 {stats['cancellations']}건 "
+              f"(그룹당 {stats['cancellations'] / max(1, stats['runs']):.2f}건)")
+
+    logging.getLogger("pipeline").setLevel(logging.WARNING)
+    logging.getLogger("group_strategy").setLevel(logging.WARNING)
+    asyncio.run(run())
+
+
+@benchmark("availability_grid")
+def bench_availability_grid(days: int = 3, latency: float = 0.08) -> None:
+    """±3일 × 6개 시간대 잔여석 그리드 - 순차 조회 vs 동시 조회 vs 캐시된 재조회 (조회당 80ms)"""
+    import asyncio
+
+    from availability_grid import DEFAULT_BANDS, AvailabilityGridBuilder, CellCache
+    from rate_limiter import TokenBucket
+
+    calls = 0
+
+    async def search(service, dep, arr, date, start, end) -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(latency)
+        return (int(date[-2:]) + int(start[:2])) % 4
+
+    async def run() -> None:
+        nonlocal calls
+        builder = AvailabilityGridBuilder(search, TokenBucket(rate=20.0, capacity=20.0), CellCache(ttl=60.0))
+        dates = builder.date_range("20991015", days)
+        cells = len(dates) * len(DEFAULT_BANDS)
+
+        started = time.perf_counter()
+        for day in dates:
+            for start, end in DEFAULT_BANDS:
+                await search("KTX", "서울", "부산", day, start, end)
+        _report("순차 조회 (/start 반복)", cells, time.perf_counter() - started)
+
+        calls = 0
+        grid, stats = await builder.build("KTX", "서울", "부산", dates)
+        _report(f"동시 조회 (업스트림 {calls}회)", cells, stats.elapsed)
+
+        calls = 0
+        grid, stats = await builder.build("KTX", "서울", "부산", dates)
+        _report(f"캐시 재조회 (업스트림 {calls}회)", cells, stats.elapsed)
+        print(f"  렌더링 {len(grid.render().encode())}바이트, 셀 저장 {grid.cells.itemsize * len(grid.cells)}바이트")
+
+    print(f"availability_grid: {2 * days + 1}일 × {len(DEFAULT_BANDS)}개 시간대, 초당 20회 제한, 동시 8개")
+    asyncio.run(run())
+
+
+def _use_letskorail() -> None:
+    """저장소에 포함된 letskorail 소스를 import 경로에 추가"""
+    if "letskorail-master" not in sys.path:
+        sys.path.insert(0, "letskorail-master")
+
+
+def _korail_seats(car_no: str, rows: int, is_free: Callable[[int, str], bool]):
+    """letskorail Seats (4열, A/D 창측, rows행) - is_free(행, 열)로 판매 가능 여부 지정"""
+    _use_letskorail()
+    from letskorail.train import Seats
+
+    return Seats({"h_srcar_no": car_no, "h_max_seat_no": str(rows * 4), "seat_infos": {"seat_info": [
+        {"h_con_seat_no": f"{row}{col}", "h_seat_no": str((row - 1) * 4 + "ABCD".index(col) + 1),
+         "h_for_rev_dir_dv": "009", "h_sale_psb_flg": "Y" if is_free(row, col) else "N",
+         "h_sigl_win_in_dv": "012" if col in "AD" else "013", "h_dmd_seat_att": "015"}
+        for row in range(1, rows + 1) for col in "ABCD"
+    ]}})
+
+
+@benchmark("seat_maps")
+def bench_seat_maps(trains: int = 5, cars: int = 8, latency: float = 0.04) -> None:
+    """창측만 조건 확인 - 객차 좌석을 순차 조회(예매 시 지연 조회) vs fetch_cars 동시 조회 vs TTL 캐시 (요청당 40ms)"""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from types import SimpleNamespace
+
+    from seat_maps import SeatMapCache, SeatPreference, _car_map, select_seats
+
+    requests = 0
+
+    def fetch(value):
+        nonlocal requests
+        requests += 1
+        time.sleep(latency)
+        return value
+
+    def make_train(index: int):
+        car_objects = []
+        for car_no in range(1, cars + 1):
+            seats = _korail_seats(
+                f"{car_no:04d}", 14, lambda row, col: (row * 7 + car_no + index + ord(col)) % 5 == 0
+            )
+            car = SimpleNamespace(h_srcar_no=f"{car_no:04d}", h_psrm_cl_cd="2" if car_no == 1 else "1")
+            car_objects.append((car, seats))
+
+        class FakeCar:
+            def __init__(self, car, seats):
+                self.h_srcar_no, self.h_psrm_cl_cd, self._seats = car.h_srcar_no, car.h_psrm_cl_cd, seats
+
+            @property
+            def seats(self):
+                return fetch(self._seats)
+
+        car_map = {int(car.h_srcar_no): FakeCar(car, seats) for car, seats in car_objects}
+
+        class FakeTrain:
+            train_no, dpt_date, dpt_time = f"{index:03d}", "20991015", f"{8 + index:02d}0000"
+
+            @property
+            def cars(self):
+                return fetch(FakeCars(car_map))
+
+        return FakeTrain()
+
+    class FakeCars:
+        def __init__(self, car_map):
+            self._car_map = car_map
+
+        def car_list(self):
+            return sorted(self._car_map)
+
+        def __getitem__(self, number):
+            return self._car_map[number]
+
+    def fetch_cars(train):
+        """Korail.fetch_cars처럼 객차 좌석을 스레드 풀에서 동시에 받아 채운 Cars"""
+        cars = train.cars
+        numbers = cars.car_list()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            seats = list(pool.map(lambda number: cars[number].seats, numbers))
+        return FakeCars({
+            number: SimpleNamespace(h_srcar_no=cars[number].h_srcar_no, h_psrm_cl_cd=cars[number].h_psrm_cl_cd,
+                                    seats=seat_map)
+            for number, seat_map in zip(numbers, seats)
+        })
+
+    preference = SeatPreference(count=2, window_only=True)
+    train_list = [make_train(i) for i in range(trains)]
+    print(f"seat_maps: 열차 {trains}개 × 객차 {cars}량, 창측 2석 조건")
+
+    requests = 0
+    started = time.perf_counter()
+    for train in train_list:
+        car_list = train.cars
+        maps = [_car_map(car_list[n]) for n in car_list.car_list()]
+        select_seats(maps, preference)
+    _report(f"순차 조회 (요청 {requests}회)", trains, time.perf_counter() - started)
+
+    async def run() -> None:
+        nonlocal requests
+        cache = SeatMapCache(load_cars=fetch_cars, ttl=30.0)
+        for label in ("fetch_cars 동시 조회", "캐시 재조회"):
+            requests = 0
+            started = time.perf_counter()
+            found = await asyncio.gather(*(cache.find_seats(train, preference) for train in train_list))
+            _report(f"{label} (요청 {requests}회)", trains, time.perf_counter() - started)
+        print(f"  창측 2석 있는 열차 {sum(1 for f in found if f)}/{trains}, 캐시 적중 {cache.hits} / 조회 {cache.misses}")
+
+    asyncio.run(run())
+
+
+@benchmark("korail_cars")
+def bench_korail_cars(trains: int = 3, latency: float = 0.03) -> None:
+    """letskorail 객차/좌석 조회 - train.cars 순차 지연 조회 vs Korail.fetch_cars 동시 조회 (로컬 대역 서버, 요청당 30ms)"""
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs
+
+    _use_letskorail()
+    from letskorail import korail as korail_module
+
+    cars_per_class = {"1": 8, "2": 2}
+    requests_served = 0
+
+    def schedule() -> Dict:
+        return {"strResult": "SUCC", "trn_infos": {"trn_info": [
+            {"h_trn_no": f"{100 + i:03d}", "h_dpt_dt": "20991015", "h_dpt_tm": f"{8 + i:02d}0000",
+             "h_arv_tm": f"{10 + i:02d}4000", "h_rsv_psb_flg": "Y", "h_gen_rsv_cd": "11", "h_spe_rsv_cd": "11"}
+            for i in range(trains)
+        ]}}
+
+    def cars_info(form) -> Dict:
+        seat_class = form.get("txtPsrmClCd", ["1"])[0]
+        first = 1 if seat_class == "2" else 3
+        return {"strResult": "SUCC", "srcar_infos": {"srcar_info": [
+            {"h_srcar_no": f"{first + i:04d}", "h_psrm_cl_cd": seat_class, "h_rest_seat_cnt": "10"}
+            for i in range(cars_per_class[seat_class])
+        ]}}
+
+    def car_detail(form) -> Dict:
+        return {"strResult": "SUCC", "h_srcar_no": form["txtSrcarNo"][0], "h_max_seat_no": "56",
+                "seat_infos": {"seat_info": [
+                    {"h_con_seat_no": f"{row}{col}", "h_seat_no": str(row), "h_for_rev_dir_dv": "009",
+                     "h_sale_psb_flg": "Y" if (row + ord(col)) % 3 else "N",
+                     "h_sigl_win_in_dv": "012" if col in "AD" else "013", "h_dmd_seat_att": "015"}
+                    for row in range(1, 15) for col in "ABCD"
+                ]}}
+
+    routes = {"/schedule": schedule, "/cars": cars_info, "/detail": car_detail}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            nonlocal requests_served
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode())
+            time.sleep(latency)
+            route = routes[self.path]
+            body = json.dumps(route() if route is schedule else route(form)).encode()
+            requests_served += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 64  # 기본 backlog(5)면 동시 접속 시 SYN 재전송으로 1초씩 지연
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    url = korail_module.URL
+    saved = (url.SCHEDULE, url.CARS_INFO, url.CAR_DETAIL)
+    url.SCHEDULE, url.CARS_INFO, url.CAR_DETAIL = f"{base}/schedule", f"{base}/cars", f"{base}/detail"
+    try:
+        korail = korail_module.Korail()
+        print(f"korail_cars: 열차 {trains}개 × 객차 {sum(cars_per_class.values())}량, 로컬 서버 지연 {latency * 1000:.0f}ms")
+
+        found = korail.search_train("서울", "부산", "20991015", "080000")
+        requests_served = 0
+        started = time.perf_counter()
+        seats = 0
+        for train in found:
+            cars = train.cars
+            seats += sum(len(cars[n].seats.seat_info) for n in cars.car_list())
+        _report(f"순차 (요청 {requests_served}회)", len(found), time.perf_counter() - started)
+
+        for workers in (4, 8, 16):
+            found = korail.search_train("서울", "부산", "20991015", "080000")
+            requests_served = 0
+            started = time.perf_counter()
+            loaded = korail.fetch_cars(found, max_workers=workers)
+            elapsed = time.perf_counter() - started
+            assert sum(len(c[n].seats.seat_info) for c in loaded for n in c.car_list()) == seats
+            _report(f"fetch_cars x{workers} (요청 {requests_served}회)", len(found), elapsed)
+    finally:
+        url.SCHEDULE, url.CARS_INFO, url.CAR_DETAIL = saved
+        server.shutdown()
+
+
+@benchmark("seat_blocks")
+def bench_seat_blocks(trains: int = 200, cars: int = 18, party: int = 3) -> None:
+    """3인 일행 좌석 배정 - 중앙 가까운 순 (Seats._select_seat) vs 붙어 있는 묶음 (Cars.select_block), 18량 열차 좌석 배치"""
+    _use_letskorail()
+    from letskorail.train import Car, Cars
+
+    def spread(seats) -> int:
+        """배정된 좌석이 차지하는 (행 수 - 1) * 4 + 열 간격 - 붙어 있을수록 작음"""
+        rows = [int(s["seat"][:-1]) for s in seats]
+        cols = ["ABCD".index(s["seat"][-1]) for s in seats]
+        return (max(rows) - min(rows)) * 4 + max(cols) - min(cols)
+
+    rng = random.Random(11)
+    train_cars = []
+    for _ in range(trains):
+        car_list = []
+        for car_no in range(1, cars + 1):
+            occupancy = rng.uniform(0.5, 0.95)
+            car = Car({"h_srcar_no": f"{car_no:04d}", "h_psrm_cl_cd": "1"})
+            car._set_loaded_seats(_korail_seats(f"{car_no:04d}", 15, lambda row, col: rng.random() > occupancy))
+            car_list.append(car)
+        train_cars.append(Cars(tuple(car_list)))
+
+    print(f"seat_blocks: 열차 {trains}개 × {cars}량 × 60석, {party}인 일행")
+    results = {}
+    def centre_first(c):
+        """기존 방식: 조건(기본 창측)에 맞는 좌석이 충분한 첫 객차에서 중앙 가까운 순으로 party석"""
+        for n in c.car_list():
+            try:
+                return c[n].select_seats(count=party)
+            except Exception:
+                continue
+        return None
+
+    for label, pick in (("중앙 우선 (select_seats)", centre_first), ("인접 묶음 (select_block)", lambda c: c.select_block(party))):
+        spreads = []
+        started = time.perf_counter()
+        for c in train_cars:
+            seats = pick(c)
+            if seats:
+                spreads.append(spread(seats))
+        _report(label, trains, time.perf_counter() - started)
+        results[label] = spreads
+    for label, spreads in results.items():
+        together = sum(1 for s in spreads if s <= 2) / max(1, len(spreads)) * 100
+        print(f"  {label:<24} 평균 간격 {sum(spreads) / max(1, len(spreads)):5.1f}  같은 줄 연속 {together:5.1f}%")
+
+
+@benchmark("seat_watcher")
+def bench_seat_watcher(trains: int = 3, cars: int = 18, rounds: int = 200, latency: float = 0.03) -> None:
+    """좌석 단위 취소표 감지 - 폴링마다 Seats를 다시 만들어 비교 vs 비트셋 비교, 감지까지 요청 수 (전체 재조회 vs 객차 조회만)"""
+    import asyncio
+    from types import SimpleNamespace
+
+    _use_letskorail()
+    from letskorail.train import Car, Cars, Seats
+    from pipeline import TargetRegistry
+    from rate_limiter import TokenBucket
+    from seat_watcher import SeatWatcher, sale_bits, seat_index
+
+    rng = random.Random(5)
+
+    def detail(car_no: str, free) -> Dict:
+        return {"h_srcar_no": car_no, "h_max_seat_no": "60", "seat_infos": {"seat_info": [
+            {"h_con_seat_no": f"{row}{col}", "h_seat_no": str((row - 1) * 4 + "ABCD".index(col) + 1),
+             "h_for_rev_dir_dv": "009", "h_sale_psb_flg": "Y" if (row, col) in free else "N",
+             "h_sigl_win_in_dv": "012" if col in "AD" else "013", "h_dmd_seat_att": "015"}
+            for row in range(1, 16) for col in "ABCD"
+        ]}}
+
+    # 매진 열차: 통로측 좌석만 드문드문 남아 있고 창측은 없음
+    free = {
+        (t, c): {(row, col) for row in range(1, 16) for col in "BC" if rng.random() < 0.1}
+        for t in range(trains) for c in range(1, cars + 1)
+    }
+    keys = list(free)
+
+    # 1) 폴링 한 번의 비교 비용 (응답 파싱 포함)
+    responses = [detail(f"{c:04d}", free[(t, c)]) for t, c in keys]
+    print(f"seat_watcher: 열차 {trains}개 × {cars}량 × 60석, 폴링 {rounds}회")
+    previous = [{k: s.sale_psb for k, s in Seats(d).seat_info.items()} for d in responses]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for i, d in enumerate(responses):
+            current = {k: s.sale_psb for k, s in Seats(d).seat_info.items()}
+            [k for k, v in current.items() if v and not previous[i].get(k)]
+            previous[i] = current
+    _report("Seats 재생성 비교", rounds * len(keys), time.perf_counter() - started)
+    indexes = [seat_index(Seats(d)) for d in responses]
+    bits = [sale_bits(d, index) for d, index in zip(responses, indexes)]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for i, d in enumerate(responses):
+            new = sale_bits(d, indexes[i])
+            if new != bits[i]:
+                bits[i] = new
+    _report("비트셋 비교", rounds * len(keys), time.perf_counter() - started)
+
+    # 2) 창측 좌석 하나가 풀린 뒤 예매를 넘길 때까지 (요청당 latency초)
+    flip_round = 3
+    requests = 0
+    state = {"round": 0}
+
+    def car_free(t: int, c: int):
+        if state["round"] >= flip_round and (t, c) == (trains - 1, cars // 2):
+            return free[(t, c)] | {(7, "A")}
+        return free[(t, c)]
+
+    def make_train(t: int):
+        car_list = []
+        for c in range(1, cars + 1):
+            car = Car({"h_srcar_no": f"{c:04d}", "h_psrm_cl_cd": "1"})
+            car._set_loaded_seats(Seats(detail(f"{c:04d}", free[(t, c)])))
+            car._watch = (t, c)
+            car_list.append(car)
+        return SimpleNamespace(train_no=f"{t:03d}", dpt_date="20991015", dpt_time=f"{8 + t:02d}0000",
+                               cars=Cars(tuple(car_list)))
+
+    train_list = [make_train(t) for t in range(trains)]
+
+    class Source:
+        async def search_watch_trains(self, target, limit):
+            nonlocal requests
+            requests += 1
+            await asyncio.sleep(latency)
+            return train_list[:limit]
+
+        async def fetch_watch_cars(self, found):
+            nonlocal requests
+            requests += len(found) * (1 + cars)
+            await asyncio.sleep(latency * 2)
+            return [train.cars for train in found]
+
+        async def fetch_car_detail(self, car):
+            nonlocal requests
+            requests += 1
+            await asyncio.sleep(latency)
+            return detail(car.h_srcar_no, car_free(*car._watch))
+
+        def seat_watch_payload(self, target, train, seat_opt):
+            return {"service": "KTX", "train": train, "seat_opt": seat_opt}
+
+    async def run() -> None:
+        registry = TargetRegistry()
+        await registry.add_target(1, "KTX", "서울", "부산", "20991015", "080000",
+                                  metadata={"seat_watch": True, "window_only": True})
+        dispatched = []
+
+        async def dispatch(target, payload):
+            dispatched.append(payload)
+            await registry.set_pending(target.chat_id, target.target_id, True)
+
+        watcher = SeatWatcher(registry, dispatch, Source(), TokenBucket(rate=1000.0, capacity=1000.0),
+                              max_trains=trains, concurrency=16)
+        await watcher.refresh()
+        baseline = requests
+        started = time.perf_counter()
+        while not dispatched:
+            state["round"] += 1
+            await watcher.poll_once()
+        elapsed = time.perf_counter() - started
+        polled = requests - baseline
+        seats = ", ".join(f"{s['car_no']}-{s['seat']}" for s in dispatched[0]["seat_opt"])
+        print(f"  객차 조회만: 폴링 {state['round']}회 {elapsed:.2f}s, 요청 {polled}회 (기준 수집 {baseline}회) → {seats}")
+        # 같은 감지를 매번 전체 재조회(조회 1 + 객차 목록 1 + 객차 {cars})로 하면
+        full = state["round"] * (1 + trains * (1 + cars))
+        print(f"  전체 재조회였다면: 요청 {full}회, 변경 객차 {watcher.stats.changed_cars} / 조회 객차 {watcher.stats.car_requests}")
+
+    asyncio.run(run())
+
+
+@benchmark("availability_events")
+def bench_availability_events(routes: int = 50, trains: int = 10, polls: int = 200, change_rate: float = 0.02) -> None:
+    """스캔 결과 처리 - 구독자 3개가 매번 전체 결과를 다시 훑음 vs 상태 벡터 비교 후 바뀐 열차 이벤트만 발행"""
+    import asyncio
+
+    from availability_events import AvailabilityBus, AvailabilityTracker
+
+    class FakeTrain:
+        __slots__ = ("train_no", "dpt_time", "general", "special", "standby")
+
+        def __init__(self, index: int, general: bool, special: bool, standby: bool) -> None:
+            self.train_no, self.dpt_time = f"{index:03d}", f"{6 + index:02d}0000"
+            self.general, self.special, self.standby = general, special, standby
+
+        def has_general_seat(self):
+            return self.general
+
+        def has_special_seat(self):
+            return self.special
+
+        def has_waiting_list(self):
+            return self.standby
+
+    rng = random.Random(7)
+    state = {(r, t): [rng.random() < 0.3, rng.random() < 0.2, False] for r in range(routes) for t in range(trains)}
+    stream = []
+    flips = 0
+    for _ in range(polls):
+        for r in range(routes):
+            for t in range(trains):
+                for i in range(3):
+                    if rng.random() < change_rate / 3:
+                        state[(r, t)][i] = not state[(r, t)][i]
+                        flips += 1
+            stream.append((r, [FakeTrain(t, *state[(r, t)]) for t in range(trains)]))
+    observations = len(stream)
+    print(f"availability_events: 노선 {routes}개 × 열차 {trains}개, 조회 {observations}건, 상태 변화 {flips}회")
+
+    # 기존 방식: 구독자마다 전체 결과를 받아 자기 이전 상태와 비교
+    started = time.perf_counter()
+    seen = [dict() for _ in range(3)]
+    reprocessed = 0
+    for r, result in stream:
+        for consumer in seen:
+            for train in result:
+                key = (r, train.train_no, train.dpt_time)
+                current = (train.has_general_seat(), train.has_special_seat(), train.has_waiting_list())
+                reprocessed += 1
+                if consumer.get(key) != current:
+                    consumer[key] = current
+    _report(f"전체 재처리 (열차 {reprocessed}건)", observations, time.perf_counter() - started)
+
+    async def run() -> None:
+        tracker = AvailabilityTracker()
+        bus = AvailabilityBus()
+        subscriptions = [bus.subscribe(maxsize=100000) for _ in range(3)]
+        started = time.perf_counter()
+        for r, result in stream:
+            bus.publish(tracker.observe("KTX", "서울", f"역{r}", "20991015", result))
+        delivered = 0
+        for subscription in subscriptions:
+            while not subscription.queue.empty():
+                await subscription.get()
+                delivered += 1
+        _report(f"변화 이벤트 (전달 {delivered}건)", observations, time.perf_counter() - started)
+        print(f"  발행 이벤트 {bus.published}건 (첫 조회의 초기 상태 포함)")
+
+    asyncio.run(run())
+
+
+@benchmark("search_cache")
+def bench_search_cache(routes: int = 5, scanners: int = 40, users: int = 10, duration: float = 3.0, latency: float = 0.05) -> None:
+    """열차 조회 공유 - 스캔 타겟과 대화형 조회가 같은 노선을 각자 조회 vs SearchCache (스캔 TTL 2초, 목록 20초, 요청당 50ms)"""
+    import asyncio
+
+    from search_cache import SearchCache
+
+    rng = random.Random(3)
+    # 타겟/사용자마다 노선 하나 (몇 개 노선에 몰림)
+    scan_routes = [rng.randrange(routes) for _ in range(scanners)]
+    user_routes = [rng.randrange(routes) for _ in range(users)]
+
+    async def run(cache) -> None:
+        requests = 0
+
+        async def upstream(route: int):
+            nonlocal requests
+            requests += 1
+            await asyncio.sleep(latency)
+            return [route] * 10
+
+        async def search(route: int, ttl: float):
+            if cache is None:
+                return await upstream(route)
+            return await cache.get(("KTX", route), lambda: upstream(route), ttl=ttl)
+
+        searches = 0
+        deadline = time.perf_counter() + duration
+
+        async def scanner(route: int) -> None:
+            nonlocal searches
+            await asyncio.sleep(rng.uniform(0, 0.5))
+            while time.perf_counter() < deadline:
+                await search(route, 2.0)
+                searches += 1
+                await asyncio.sleep(0.5)  # 타겟 스캔 주기
+
+        async def user(route: int) -> None:
+            nonlocal searches
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(rng.uniform(0.2, 1.0))  # 목록 보기 / 다시검색
+                await search(route, 20.0)
+                searches += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(scanner(r) for r in scan_routes), *(user(r) for r in user_routes))
+        label = "캐시 없음" if cache is None else "공유 캐시"
+        _report(f"{label} (요청 {requests}회)", searches, time.perf_counter() - started)
+        if cache is not None:
+            stats = cache.stats
+            print(f"  적중 {stats.hit_rate * 100:.0f}% (캐시 {stats.hits} · 합류 {stats.joined} · 업스트림 {stats.misses})")
+            for key, entry in cache.entry_stats(3):
+                print(f"    {key}: 적중 {entry.hits} · 합류 {entry.joined}")
+
+    print(f"search_cache: 노선 {routes}개, 스캔 타겟 {scanners}개(0.5초 주기), 사용자 {users}명, {duration:.0f}초")
+    asyncio.run(run(None))
+    asyncio.run(run(SearchCache(default_ttl=2.0, max_age=20.0)))
+
+
+def main(argv) -> int:
+    names = argv or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"알 수 없는 벤치마크: {', '.join(unknown)} (가능: {', '.join(BENCHMARKS)})")
+        return 1
+    for name in names:
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
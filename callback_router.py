@@ -0,0 +1,131 @@
+"""
+인라인 버튼 콜백 디스패처 - callback_data 네임스페이스별 핸들러 등록/조회
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# handler(update, context, payload)
+CallbackHandler = Callable[[Any, Any, Any], Awaitable[Any]]
+PayloadParser = Callable[[str], Any]
+
+# 콜백 데이터 최대 길이 (텔레그램 제한 64바이트) - 접두사 탐색 횟수의 상한
+MAX_PREFIX_DEPTH = 8
+
+
+class DateChoice(NamedTuple):
+    value: date
+    label: str  # 사용자에게 보여줄 표현 (오늘/내일/모레 또는 YYYY년 MM월 DD일)
+
+
+_RELATIVE_DAYS = {'today': (0, "오늘"), 'tomorrow': (1, "내일"), 'day_after': (2, "모레")}
+
+
+def parse_int(payload: str) -> int:
+    """`select_train_3` → 3"""
+    return int(payload)
+
+
+def parse_calendar(payload: str) -> Tuple[int, int]:
+    """`cal_2025_7_2025` → (2025, 7)"""
+    parts = payload.split("_")
+    return int(parts[0]), int(parts[1])
+
+
+def parse_date(payload: str) -> DateChoice:
+    """`date_today` / `date_tomorrow` / `date_day_after` / `date_YYYYMMDD` → DateChoice"""
+    relative = _RELATIVE_DAYS.get(payload)
+    if relative is not None:
+        days, label = relative
+        return DateChoice((datetime.now() + timedelta(days=days)).date(), label)
+    value = datetime.strptime(payload, "%Y%m%d").date()
+    return DateChoice(value, value.strftime("%Y년 %m월 %d일"))
+
+
+class _Route(NamedTuple):
+    handler: CallbackHandler
+    parser: Optional[PayloadParser]
+
+
+class CallbackRouter:
+    """callback_data를 핸들러로 연결하는 테이블 기반 디스패처
+
+    - `exact("sort_time")`: 정확히 일치하는 데이터
+    - `prefix("time_hour_", parse_int)`: `_`로 끝나는 접두사 + 파서가 변환한 페이로드
+    조회는 정확 일치 딕셔너리를 먼저 보고, 없으면 데이터의 `_` 위치마다 접두사 딕셔너리를
+    긴 것부터 확인하므로 등록된 핸들러 수와 무관하게 일정한 비용으로 끝남.
+    """
+
+    def __init__(self) -> None:
+        self._exact: Dict[str, _Route] = {}
+        self._prefix: Dict[str, _Route] = {}
+        self._fallback: Optional[CallbackHandler] = None
+        self.dispatched_count = 0
+        self.unmatched_count = 0
+
+    def exact(self, data: str) -> Callable[[CallbackHandler], CallbackHandler]:
+        def decorator(handler: CallbackHandler) -> CallbackHandler:
+            self.add_exact(data, handler)
+            return handler
+        return decorator
+
+    def prefix(self, prefix: str, parser: Optional[PayloadParser] = None) -> Callable[[CallbackHandler], CallbackHandler]:
+        def decorator(handler: CallbackHandler) -> CallbackHandler:
+            self.add_prefix(prefix, handler, parser)
+            return handler
+        return decorator
+
+    def fallback(self, handler: CallbackHandler) -> CallbackHandler:
+        self._fallback = handler
+        return handler
+
+    def add_exact(self, data: str, handler: CallbackHandler) -> None:
+        if data in self._exact:
+            raise ValueError(f"콜백 '{data}' 핸들러가 이미 등록되어 있습니다")
+        self._exact[data] = _Route(handler, None)
+
+    def add_prefix(self, prefix: str, handler: CallbackHandler, parser: Optional[PayloadParser] = None) -> None:
+        if not prefix.endswith("_"):
+            raise ValueError(f"콜백 접두사는 '_'로 끝나야 합니다: {prefix}")
+        if prefix.count("_") > MAX_PREFIX_DEPTH:
+            raise ValueError(f"콜백 접두사가 너무 깁니다: {prefix}")
+        if prefix in self._prefix:
+            raise ValueError(f"콜백 접두사 '{prefix}' 핸들러가 이미 등록되어 있습니다")
+        self._prefix[prefix] = _Route(handler, parser)
+
+    def resolve(self, data: str) -> Tuple[Optional[CallbackHandler], Any]:
+        """(핸들러, 페이로드) 반환. 페이로드 파싱 실패나 미등록이면 (None, None)"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route.handler, data
+
+        end = len(data)
+        for _ in range(MAX_PREFIX_DEPTH):
+            end = data.rfind("_", 0, end)
+            if end < 0:
+                break
+            route = self._prefix.get(data[:end + 1])
+            if route is not None:
+                payload = data[end + 1:]
+                if route.parser is None:
+                    return route.handler, payload
+                try:
+                    return route.handler, route.parser(payload)
+                except (ValueError, IndexError):
+                    logger.warning("잘못된 콜백 데이터: %s", data)
+                    return None, None
+        return None, None
+
+    async def dispatch(self, update, context) -> Any:
+        """CallbackQueryHandler 콜백으로 등록해서 사용"""
+        data = update.callback_query.data or ""
+        handler, payload = self.resolve(data)
+        if handler is None:
+            self.unmatched_count += 1
+            if self._fallback is not None:
+                return await self._fallback(update, context, data)
+            return None
+        self.dispatched_count += 1
+        return await handler(update, context, payload)
@@ -0,0 +1,168 @@
+"""
+업스트림(Korail/SRT) 엔드포인트 그룹별 서킷 브레이커
+"""
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple
+
+
+class CircuitOpenError(Exception):
+    """서킷이 열려 있어 호출이 즉시 거부된 경우"""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"{name} 서킷 오픈 상태 ({retry_after:.0f}초 후 재시도)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """오류율 기반 서킷 브레이커
+
+    - closed: 모든 호출 허용, 최근 `window_seconds` 동안의 결과로 오류율 계산
+    - open: `open_seconds` 동안 모든 호출을 즉시 거부
+    - half_open: 단 하나의 프로브 호출만 허용, 성공하면 closed, 실패하면 다시 open
+      (프로브 결과가 `probe_timeout`초 안에 기록되지 않으면 실패로 보고 다시 open)
+
+    호출하는 쪽은 `allow_request()`가 True를 돌려준 호출마다 성공/실패 중 하나를 반드시 기록해야 함.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 10,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+        probe_timeout: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+        self._clock = clock
+        self._results: Deque[Tuple[float, bool]] = deque()  # (시각, 성공 여부)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self.trip_count = 0
+        self.rejected_count = 0
+        self._logger = logging.getLogger(__name__ + ".CircuitBreaker")
+
+    @property
+    def state(self) -> str:
+        if (self._state == self.HALF_OPEN and self._probe_in_flight
+                and self._clock() - self._probe_started >= self.probe_timeout):
+            self._logger.warning("Circuit %s probe timed out after %.0fs", self.name, self.probe_timeout)
+            self._trip()
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def retry_after(self) -> float:
+        """다시 호출이 허용되기까지 남은 시간(초)"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (self._clock() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """호출 허용 여부 (half_open에서는 프로브 1건만 허용)"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            self._probe_started = self._clock()
+            return True
+        self.rejected_count += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._logger.info("Circuit %s closed after successful probe", self.name)
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+            self._results.clear()
+        self._record(True)
+
+    def record_failure(self) -> None:
+        state = self.state
+        if state == self.HALF_OPEN:
+            self._trip()
+            return
+        self._record(False)
+        if state == self.CLOSED and self._should_trip():
+            self._trip()
+
+    def failure_rate(self) -> float:
+        self._evict()
+        if not self._results:
+            return 0.0
+        failures = sum(1 for _, ok in self._results if not ok)
+        return failures / len(self._results)
+
+    def snapshot(self) -> Dict[str, object]:
+        self._evict()
+        return {
+            'name': self.name,
+            'state': self.state,
+            'calls': len(self._results),
+            'failure_rate': self.failure_rate(),
+            'retry_after': self.retry_after(),
+            'trips': self.trip_count,
+            'rejected': self.rejected_count,
+        }
+
+    def _record(self, success: bool) -> None:
+        self._results.append((self._clock(), success))
+        self._evict()
+
+    def _evict(self) -> None:
+        cutoff = self._clock() - self.window_seconds
+        while self._results and self._results[0][0] < cutoff:
+            self._results.popleft()
+
+    def _should_trip(self) -> bool:
+        if len(self._results) < self.minimum_calls:
+            return False
+        return self.failure_rate() >= self.failure_rate_threshold
+
+    def _trip(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._probe_in_flight = False
+        self.trip_count += 1
+        self._logger.warning(
+            "Circuit %s opened (failure rate %.0f%%, %d calls)",
+            self.name, self.failure_rate() * 100, len(self._results),
+        )
+
+
+class CircuitBreakerRegistry:
+    """서비스(KTX/SRT) x 엔드포인트 그룹(search/reserve/login)별 브레이커 관리"""
+
+    GROUPS = ("search", "reserve", "login")
+
+    def __init__(self, **breaker_options) -> None:
+        self._breaker_options = breaker_options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, service: str, group: str) -> CircuitBreaker:
+        name = f"{service.upper()}.{group}"
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **self._breaker_options)
+            self._breakers[name] = breaker
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        return {name: breaker.snapshot() for name, breaker in sorted(self._breakers.items())}
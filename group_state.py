@@ -0,0 +1,208 @@
+"""
+다중 코스 그룹 예매 상태 머신 - idle → claiming → reserving → reserved / failed
+"""
+import heapq
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class GroupClaim:
+    group_id: str
+    state: str
+    token: Optional[str] = None
+    target_id: Optional[str] = None  # 예매를 진행 중인 타겟
+    deadline: Optional[float] = None  # 이 시각까지 다음 상태로 넘어가지 않으면 회수
+    superseded: bool = False  # 예매 중에 이전 선점의 늦은 성공이 보고됨 (이 선점이 끝나면 reserved)
+
+
+class GroupStateMachine:
+    """그룹별 예매 상태
+
+    - claiming: 스캐너가 표를 발견해 그룹을 선점 (`claim_timeout` 안에 예매를 시작해야 함)
+    - reserving: 예매 실행기 큐에서 대기(`queue_timeout`) 후 선택된 타겟으로 예매 중
+      (실행기가 작업을 꺼낸 `start_reserving`부터 `reserve_timeout` 안에 결과를 보고해야 함)
+    - reserved: 예매 완료 (해제 전까지 유지, 저장소에 기록)
+    - failed: 예매 실패 후 `failed_cooldown` 동안 대기했다가 idle로 복귀
+    모든 전이는 await 없이 확인과 변경을 함께 하므로 이벤트 루프 안에서 원자적이고,
+    claim 이후 전이는 claim이 돌려준 토큰이 맞을 때만 허용됨 (회수된 선점의 늦은 보고는 무시).
+    기한이 지난 claiming/reserving은 `expire()`에서 idle로 회수되어 그룹이 멈춰 있지 않음.
+    회수된 선점의 늦은 예매 성공은 그룹을 reserved로 끝냄 (그 사이 새 선점이 claiming이면 취소,
+    reserving이면 이미 진행 중인 예매를 멈출 수 없으므로 그 선점이 끝나거나 회수될 때 reserved).
+    idle 그룹은 보관하지 않으므로 `busy_groups`에 없으면 idle.
+    """
+
+    IDLE = "idle"
+    CLAIMING = "claiming"
+    RESERVING = "reserving"
+    RESERVED = "reserved"
+    FAILED = "failed"
+
+    def __init__(
+        self,
+        claim_timeout: float = 30.0,
+        reserve_timeout: float = 900.0,
+        queue_timeout: float = 3600.0,
+        failed_cooldown: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.claim_timeout = claim_timeout
+        self.reserve_timeout = reserve_timeout
+        self.queue_timeout = queue_timeout
+        self.failed_cooldown = failed_cooldown
+        self._clock = clock
+        self._groups: Dict[str, GroupClaim] = {}
+        self._deadlines: List[Tuple[float, str, Optional[str]]] = []  # (기한, group_id, 토큰) 최소 힙
+        self.reclaimed_count = 0
+        self.transition_count = 0
+        self._logger = logging.getLogger(__name__ + ".GroupStateMachine")
+
+    @property
+    def busy_groups(self):
+        """idle이 아닌 그룹 ID (멤버십 확인용 뷰)"""
+        return self._groups.keys()
+
+    def state(self, group_id: str) -> str:
+        self.expire()
+        claim = self._groups.get(group_id)
+        return claim.state if claim is not None else self.IDLE
+
+    def get(self, group_id: str) -> Optional[GroupClaim]:
+        return self._groups.get(group_id)
+
+    def _enter(self, group_id: str, state: str, token: Optional[str], timeout: Optional[float],
+               target_id: Optional[str] = None) -> GroupClaim:
+        deadline = self._clock() + timeout if timeout is not None else None
+        claim = GroupClaim(group_id=group_id, state=state, token=token, target_id=target_id, deadline=deadline)
+        self._groups[group_id] = claim
+        if deadline is not None:
+            heapq.heappush(self._deadlines, (deadline, group_id, token))
+        self.transition_count += 1
+        return claim
+
+    def _current(self, group_id: str, token: str, state: str) -> Optional[GroupClaim]:
+        claim = self._groups.get(group_id)
+        if claim is None or claim.token != token or claim.state != state:
+            return None
+        return claim
+
+    # ---- 전이 ----
+
+    def claim(self, group_id: str) -> Optional[str]:
+        """idle → claiming. 선점 토큰 반환 (이미 다른 상태면 None)"""
+        self.expire()
+        if group_id in self._groups:
+            return None
+        token = uuid.uuid4().hex[:12]
+        self._enter(group_id, self.CLAIMING, token, self.claim_timeout)
+        return token
+
+    def begin_reserving(self, group_id: str, token: str, target_id: str) -> bool:
+        """claiming → reserving (실행기 큐 대기 기한 `queue_timeout`)"""
+        self.expire()
+        if self._current(group_id, token, self.CLAIMING) is None:
+            return False
+        self._enter(group_id, self.RESERVING, token, self.queue_timeout, target_id=target_id)
+        return True
+
+    def start_reserving(self, group_id: str, token: str) -> bool:
+        """실행기가 작업을 꺼낼 때 호출 - 예매 기한을 지금부터 `reserve_timeout`으로 설정
+
+        선점이 회수되었거나 대기 중에 이전 선점의 늦은 성공으로 그룹이 끝났으면 False (예매하지 않음).
+        """
+        self.expire()
+        claim = self._current(group_id, token, self.RESERVING)
+        if claim is None:
+            return False
+        if claim.superseded:
+            self._enter(group_id, self.RESERVED, token, None, target_id=claim.target_id)
+            return False
+        self._enter(group_id, self.RESERVING, token, self.reserve_timeout, target_id=claim.target_id)
+        return True
+
+    def complete(self, group_id: str, token: str, success: bool) -> Optional[bool]:
+        """reserving → reserved / failed. 그룹 결과(reserved면 True, failed면 False) 반환, 무시되었으면 None"""
+        self.expire()
+        claim = self._current(group_id, token, self.RESERVING)
+        if claim is None:
+            return self._late_complete(group_id, token, success)
+        if success or claim.superseded:
+            self._enter(group_id, self.RESERVED, token, None, target_id=claim.target_id)
+            return True
+        self._enter(group_id, self.FAILED, token, self.failed_cooldown, target_id=claim.target_id)
+        return False
+
+    def _late_complete(self, group_id: str, token: str, success: bool) -> Optional[bool]:
+        """기한이 지나 회수된 선점의 결과 - 실패는 무시하고, 실제로 예매된 성공이면 그룹을 끝냄"""
+        if not success:
+            return None
+        current = self._groups.get(group_id)
+        if current is not None and current.state == self.RESERVING:
+            # 새 선점이 이미 예매 중이면 그 결과를 기다렸다가 reserved로 끝냄 (중복 예매 가능성 경고)
+            self._logger.warning("Late reservation success for group %s while claim %s is reserving; "
+                                 "group will be reserved when it finishes", group_id, current.token)
+            current.superseded = True
+            return True
+        if current is not None and current.state == self.CLAIMING:
+            self._logger.warning("Late reservation success for group %s, cancelling claim %s", group_id, current.token)
+        else:
+            self._logger.warning("Late reservation success for group %s, marking reserved", group_id)
+        self._enter(group_id, self.RESERVED, token, None)
+        return True
+
+    def release(self, group_id: str, token: str) -> bool:
+        """claiming/reserving → idle (예매할 타겟이 없는 등 선점 포기)"""
+        claim = self._groups.get(group_id)
+        if claim is None or claim.token != token or claim.state not in (self.CLAIMING, self.RESERVING):
+            return False
+        del self._groups[group_id]
+        self.transition_count += 1
+        return True
+
+    def mark_reserved(self, group_id: str) -> None:
+        """복구/이동된 예매 완료 상태 반영"""
+        self._enter(group_id, self.RESERVED, None, None)
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """기한이 지난 상태를 idle로 되돌리고, 회수된 선점(claiming/reserving) 그룹 ID 반환"""
+        if not self._deadlines:
+            return []
+        now = self._clock() if now is None else now
+        reclaimed = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, group_id, token = heapq.heappop(self._deadlines)
+            claim = self._groups.get(group_id)
+            if claim is None or claim.token != token or claim.deadline != deadline:
+                continue  # 이미 다음 상태로 넘어간 기한
+            if claim.superseded:
+                # 늦은 성공으로 이미 예매된 그룹은 회수하지 않고 reserved로 끝냄
+                self._enter(group_id, self.RESERVED, claim.token, None, target_id=claim.target_id)
+                continue
+            del self._groups[group_id]
+            self.transition_count += 1
+            if claim.state in (self.CLAIMING, self.RESERVING):
+                self.reclaimed_count += 1
+                reclaimed.append(group_id)
+                self._logger.warning("Group %s claim expired in %s state, reclaimed", group_id, claim.state)
+        return reclaimed
+
+    # ---- 영속화 ----
+
+    def reserved_groups(self) -> Dict[str, bool]:
+        return {group_id: True for group_id, claim in self._groups.items() if claim.state == self.RESERVED}
+
+    def restore(self, group_ids: Iterable[str]) -> None:
+        self._groups.clear()
+        self._deadlines.clear()
+        for group_id in group_ids:
+            self.mark_reserved(group_id)
+
+    def snapshot(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for claim in self._groups.values():
+            counts[claim.state] = counts.get(claim.state, 0) + 1
+        counts['reclaimed'] = self.reclaimed_count
+        return counts
@@ -0,0 +1,201 @@
+"""
+다중 코스 그룹 병렬(투기적) 예매 - 지금 좌석이 있는 그룹 코스를 모두 동시에 예약하고 우선순위가 가장 높은 것만 남김
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from pipeline import ReservationTask, TargetItem, TargetRegistry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SpeculativeStats:
+    runs: int = 0
+    attempts: int = 0
+    holds: int = 0
+    cancellations: int = 0
+    cancel_failures: int = 0
+    first_hold_seconds: List[float] = field(default_factory=list)
+
+    def snapshot(self) -> Dict[str, float]:
+        samples = self.first_hold_seconds
+        return {
+            'runs': self.runs,
+            'attempts': self.attempts,
+            'holds': self.holds,
+            'cancellations': self.cancellations,
+            'cancel_failures': self.cancel_failures,
+            'avg_first_hold_ms': sum(samples) / len(samples) * 1000 if samples else 0.0,
+        }
+
+
+@dataclass
+class _Hold:
+    target: TargetItem
+    payload: Dict[str, Any]
+    reservation: Any
+
+
+@dataclass
+class SpeculativeResult:
+    hold: Optional[_Hold]  # 남긴 예약
+    attempts: int
+    cancellations: int
+    first_hold_seconds: Optional[float]
+    uncancelled: List[_Hold] = field(default_factory=list)  # 재시도 후에도 취소하지 못한 밀린 예약
+
+    @property
+    def winner(self) -> Optional[TargetItem]:
+        return self.hold.target if self.hold else None
+
+
+class SpeculativeGroupReservation:
+    """그룹 병렬 예매 전략 (ReservationExecutor가 그룹 타겟 예매에 사용)
+
+    1. 그룹의 활성 코스를 모두 동시에 조회 (표를 찾은 코스는 방금 찾은 열차를 그대로 사용)
+    2. 좌석이 있는 코스마다 동시에 예약(hold) 시도
+    3. 예약이 잡힐 때마다 지금까지의 최선과 우선순위를 비교해 밀린 쪽을 바로 취소
+       (취소 실패 시 `cancel_retries`번 재시도, 끝내 실패한 예약은 결과 알림에 예약번호와 함께 표시)
+    `train_reservation`은 scan_for_available_train / hold_reservation / cancel_reservation /
+    reservation_number를 제공해야 함.
+    """
+
+    def __init__(
+        self,
+        train_reservation,
+        registry: TargetRegistry,
+        cancel_retries: int = 2,
+        cancel_retry_delay: float = 1.0,
+    ) -> None:
+        self.train_reservation = train_reservation
+        self.registry = registry
+        self.cancel_retries = cancel_retries
+        self.cancel_retry_delay = cancel_retry_delay
+        self.stats = SpeculativeStats()
+        self._logger = logging.getLogger(__name__ + ".SpeculativeGroupReservation")
+
+    async def _payload_for(self, member: TargetItem, task: ReservationTask) -> Optional[Dict[str, Any]]:
+        if member.target_id == task.target.target_id:
+            return task.train_payload
+        return await self.train_reservation.scan_for_available_train(member)
+
+    async def reserve(self, task: ReservationTask) -> SpeculativeResult:
+        trigger = task.target
+        started = time.perf_counter()
+        members = [
+            t for t in await self.registry.get_targets_by_group(trigger.chat_id, trigger.group_id)
+            if t.is_active
+        ] or [trigger]
+        payloads = await asyncio.gather(
+            *(self._payload_for(member, task) for member in members), return_exceptions=True
+        )
+        candidates: List[Tuple[TargetItem, Dict[str, Any]]] = [
+            (member, payload) for member, payload in zip(members, payloads)
+            if payload and not isinstance(payload, BaseException)
+        ]
+
+        best: Optional[_Hold] = None
+        first_hold: Optional[float] = None
+        cancellations = 0
+        cancels: List[asyncio.Task] = []
+        uncancelled: List[_Hold] = []
+
+        async def cancel(hold: _Hold) -> None:
+            for attempt_no in range(self.cancel_retries + 1):
+                if attempt_no:
+                    await asyncio.sleep(self.cancel_retry_delay * attempt_no)
+                try:
+                    if await self.train_reservation.cancel_reservation(hold.target, hold.reservation):
+                        return
+                    error: Exception = RuntimeError("cancel returned False")
+                except Exception as exc:
+                    error = exc
+                self._logger.warning("Cancel attempt %d failed for speculative hold of target %s: %s",
+                                     attempt_no + 1, hold.target.target_id, error)
+            self.stats.cancel_failures += 1
+            uncancelled.append(hold)
+            self._logger.error("Failed to cancel speculative hold for target %s", hold.target.target_id)
+
+        async def attempt(member: TargetItem, payload: Dict[str, Any]) -> None:
+            nonlocal best, first_hold, cancellations
+            try:
+                reservation = await self.train_reservation.hold_reservation(member, payload)
+            except Exception as exc:
+                self._logger.info("Speculative hold failed for target %s: %s", member.target_id, exc)
+                return
+            if not reservation:
+                return
+            self.stats.holds += 1
+            if first_hold is None:
+                first_hold = time.perf_counter() - started
+            # 비교와 교체 사이에 await가 없으므로 동시에 끝난 예약끼리도 최선은 하나만 남음
+            hold = _Hold(member, payload, reservation)
+            if best is None or member.priority < best.target.priority:
+                loser, best = best, hold
+            else:
+                loser = hold
+            if loser is not None:
+                cancellations += 1
+                cancels.append(asyncio.ensure_future(cancel(loser)))
+
+        await asyncio.gather(*(attempt(member, payload) for member, payload in candidates))
+        if cancels:
+            await asyncio.gather(*cancels)
+
+        self.stats.runs += 1
+        self.stats.attempts += len(candidates)
+        self.stats.cancellations += cancellations
+        if first_hold is not None:
+            self.stats.first_hold_seconds.append(first_hold)
+            del self.stats.first_hold_seconds[:-1000]
+        result = SpeculativeResult(
+            hold=best,
+            attempts=len(candidates),
+            cancellations=cancellations,
+            first_hold_seconds=first_hold,
+            uncancelled=uncancelled,
+        )
+        self._logger.info(
+            "Speculative group %s: %d attempts, winner %s, %d cancelled, first hold %s",
+            trigger.group_id, len(candidates), result.winner.target_id if result.winner else None,
+            cancellations, f"{first_hold * 1000:.0f}ms" if first_hold is not None else "-",
+        )
+        return result
+
+    async def execute(self, task: ReservationTask, bot) -> Optional[TargetItem]:
+        """병렬 예매 후 결과 알림. 남긴 예약의 타겟 반환 (실패 시 None)"""
+        result = await self.reserve(task)
+        hold = result.hold
+        chat_id = task.target.chat_id
+        if bot is None:
+            return result.winner
+        if hold is not None:
+            service = (hold.target.service or '').upper()
+            number = self.train_reservation.reservation_number(service, hold.reservation)
+            text = (
+                f"✅ 다중 코스 병렬 예매 성공 ({hold.target.priority}순위 코스)\n"
+                f"{hold.payload.get('summary', '')}\n"
+                f"예약번호: {number}\n"
+                f"⚡ 첫 좌석 확보 {result.first_hold_seconds * 1000:.0f}ms · "
+                f"동시 시도 {result.attempts}건 · 취소 {result.cancellations}건"
+            )
+            if result.uncancelled:
+                lines = [
+                    f"- {loser.target.priority}순위 코스 예약번호 "
+                    f"{self.train_reservation.reservation_number((loser.target.service or '').upper(), loser.reservation)}"
+                    for loser in result.uncancelled
+                ]
+                text += "\n\n⚠️ 아래 예약은 자동 취소에 실패했습니다. 직접 취소해주세요:\n" + "\n".join(lines)
+        elif result.attempts:
+            text = f"다중 코스 병렬 예매 실패 ({result.attempts}개 코스 시도)"
+        else:
+            return None
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+        except Exception:
+            self._logger.debug("Failed to notify chat %s", chat_id)
+        return result.winner
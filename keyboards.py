@@ -0,0 +1,163 @@
+"""
+인라인 키보드 팩토리 - 달력/시간 선택/빠른 경로 키보드를 미리 만들어 재사용
+"""
+import calendar
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# 달력 생성을 위한 상수
+DAYS_OF_WEEK = ['월', '화', '수', '목', '금', '토', '일']
+MONTHS = ['', '1월', '2월', '3월', '4월', '5월', '6월',
+          '7월', '8월', '9월', '10월', '11월', '12월']
+
+# 시간 선택기 범위
+HOURS = range(6, 22)  # 06:00 ~ 21:00
+MINUTES = range(0, 60, 5)
+
+# 달력 캐시가 만들어진 날짜 (자정이 지나면 캐시를 비움)
+_calendar_cache_day: Optional[date] = None
+
+
+def _today() -> date:
+    """오늘 날짜 (자정이 지나면 달력 캐시를 비움)"""
+    global _calendar_cache_day
+    today = datetime.now().date()
+    if _calendar_cache_day != today:
+        _build_calendar.cache_clear()
+        _calendar_cache_day = today
+    return today
+
+
+@lru_cache(maxsize=64)
+def _build_calendar(year: int, month: int, today: date) -> InlineKeyboardMarkup:
+    # 달력 데이터 생성
+    cal = calendar.monthcalendar(year, month)
+
+    # 키보드 생성
+    keyboard = []
+
+    # 월/년 헤더
+    header = f"{year}년 {month}월"
+    keyboard.append([InlineKeyboardButton(header, callback_data="ignore")])
+
+    # 요일 헤더
+    weekday_header = [InlineKeyboardButton(day, callback_data="ignore") for day in DAYS_OF_WEEK]
+    keyboard.append(weekday_header)
+
+    # 날짜 버튼들
+    for week in cal:
+        week_buttons = []
+        for day in week:
+            if day == 0:
+                # 빈 칸
+                week_buttons.append(InlineKeyboardButton(" ", callback_data="ignore"))
+            else:
+                callback_data = f"date_{year}{month:02d}{day:02d}"
+                week_buttons.append(InlineKeyboardButton(str(day), callback_data=callback_data))
+        keyboard.append(week_buttons)
+
+    # 내비게이션 버튼 (이전/다음 달, 오늘/내일/모레)
+    tomorrow = today + timedelta(days=1)
+    day_after = today + timedelta(days=2)
+    nav_row = [
+        InlineKeyboardButton("◀ 이전", callback_data=f"cal_{year}_{month-1 if month > 1 else 12}_{year if month > 1 else year-1}"),
+        InlineKeyboardButton(f"오늘({today.day})", callback_data="date_today"),
+        InlineKeyboardButton(f"내일({tomorrow.day})", callback_data="date_tomorrow"),
+        InlineKeyboardButton(f"모레({day_after.day})", callback_data="date_day_after"),
+        InlineKeyboardButton("다음 ▶", callback_data=f"cal_{year}_{month+1 if month < 12 else 1}_{year if month < 12 else year+1}")
+    ]
+    keyboard.append(nav_row)
+
+    return InlineKeyboardMarkup(keyboard)
+
+
+def create_calendar(year=None, month=None):
+    """
+    지정된 년월에 대한 달력 인라인 키보드를 생성합니다.
+    (년, 월, 오늘 날짜) 별로 캐시되며 자정이 지나면 새로 만듭니다.
+    """
+    today = _today()
+    if year is None or month is None:
+        year = today.year
+        month = today.month
+    return _build_calendar(year, month, today)
+
+
+@lru_cache(maxsize=512)
+def create_time_selector(selected_hour=None, selected_minute=None):
+    """
+    시간 선택을 위한 인터페이스를 생성합니다.
+    선택된 시간/분을 강조 표시합니다. (시간, 분) 선택 상태별로 캐시됩니다.
+    """
+    keyboard = []
+
+    # 현재 선택 상태 표시
+    current_time = f"선택된 시간: {selected_hour or '??'}:{selected_minute or '??'}"
+    keyboard.append([InlineKeyboardButton(current_time, callback_data="ignore")])
+
+    # 시간 선택 (1시간 단위, 4열로 배치)
+    keyboard.append([InlineKeyboardButton("🕐 시간 선택", callback_data="ignore")])
+    hour_row = []
+    for hour in HOURS:
+        hour_text = f"{hour:02d}"
+        if selected_hour == hour:
+            hour_text = f"✅ {hour_text}"
+        hour_row.append(InlineKeyboardButton(hour_text, callback_data=f"time_hour_{hour:02d}"))
+        if len(hour_row) == 4:
+            keyboard.append(hour_row)
+            hour_row = []
+    if hour_row:
+        keyboard.append(hour_row)
+
+    # 분 선택 (5분 단위, 6열로 배치)
+    keyboard.append([InlineKeyboardButton("🕑 분 선택", callback_data="ignore")])
+    minute_row = []
+    for minute in MINUTES:
+        minute_text = f"{minute:02d}"
+        if selected_minute == minute:
+            minute_text = f"✅ {minute_text}"
+        minute_row.append(InlineKeyboardButton(minute_text, callback_data=f"time_minute_{minute:02d}"))
+        if len(minute_row) == 6:
+            keyboard.append(minute_row)
+            minute_row = []
+    if minute_row:
+        keyboard.append(minute_row)
+
+    # 확인/취소 버튼
+    keyboard.append([
+        InlineKeyboardButton("✅ 확인", callback_data="time_confirm"),
+        InlineKeyboardButton("🔄 초기화", callback_data="time_reset"),
+        InlineKeyboardButton("❌ 취소", callback_data="time_cancel")
+    ])
+
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=1)
+def create_quick_routes():
+    """
+    빠른 경로 선택 키보드를 생성합니다.
+    """
+    keyboard = [
+        [InlineKeyboardButton("🚄 KTX: 서울 → 부산", callback_data="route_ktx_seoul_busan")],
+        [InlineKeyboardButton("🚄 KTX: 부산 → 서울", callback_data="route_ktx_busan_seoul")],
+        [InlineKeyboardButton("🚄 SRT: 서울(수서) → 부산", callback_data="route_seoul_busan")],
+        [InlineKeyboardButton("🚄 SRT: 부산 → 서울(수서)", callback_data="route_busan_seoul")],
+        [InlineKeyboardButton("직접 입력", callback_data="route_custom")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+def warm_up() -> None:
+    """자주 쓰는 키보드를 미리 만들어 둠 (이번 달/다음 달 달력, 모든 시간 선택 상태)"""
+    today = _today()
+    create_calendar(today.year, today.month)
+    next_month = (today.replace(day=1) + timedelta(days=32))
+    create_calendar(next_month.year, next_month.month)
+    create_quick_routes()
+    for hour in (None, *HOURS):
+        for minute in (None, *MINUTES):
+            create_time_selector(hour, minute)
@@ -0,0 +1,283 @@
+"""
+여러 봇 인스턴스 간 타겟 스캔 소유권 조정 - SQLite(WAL) 공유 저장소의 TTL 임대(lease)
+
+- 인스턴스마다 자신이 가진 타겟 키(`chat_id:target_id`)를 광고하고, 살아있는 인스턴스 수로 나눈 몫만큼 임대
+- 임대는 `ttl`초마다 갱신하지 않으면 만료되어 다른 인스턴스가 가져감 (장애 인스턴스의 타겟 인계)
+- 다른 인스턴스가 광고하지 않는 타겟(그 인스턴스만 가진 타겟)은 몫과 관계없이 항상 임대
+- 그룹 예매 상태는 compare-and-set으로만 바꿔 두 인스턴스가 같은 그룹을 동시에 예매하지 않음
+  (선점은 임대처럼 TTL을 두고 sync마다 갱신, 예매 완료가 확정되면 만료 없이 유지)
+"""
+import asyncio
+import logging
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, Set
+
+if TYPE_CHECKING:
+    from pipeline import TargetRegistry
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    owner TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS advertised (
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    PRIMARY KEY (key, owner)
+);
+CREATE INDEX IF NOT EXISTS advertised_owner ON advertised (owner);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leases_owner ON leases (owner);
+CREATE TABLE IF NOT EXISTS group_reservations (
+    group_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    reserved_at REAL NOT NULL,
+    expires_at REAL  -- NULL이면 예매 완료 확정
+);
+"""
+
+
+def default_instance_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseStore:
+    """SQLite 임대 저장소 (모든 메서드는 블로킹 - 이벤트 루프에서는 executor로 호출)"""
+
+    def __init__(
+        self,
+        path: str,
+        owner: Optional[str] = None,
+        ttl: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.owner = owner or default_instance_id()
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # 트랜잭션은 직접 BEGIN IMMEDIATE로 관리
+        self._conn = sqlite3.connect(path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._advertised: Optional[Set[str]] = None  # 마지막으로 광고한 키 (변경분만 기록)
+
+    def sync(self, keys: Iterable[str]) -> Set[str]:
+        """하트비트 + 광고 갱신 + 임대 갱신/반납/획득을 한 트랜잭션으로 수행하고 보유 임대 키 반환"""
+        keys = set(keys)
+        with self._lock:
+            conn = self._conn
+            now = self._clock()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO instances (owner, last_seen) VALUES (?, ?) "
+                    "ON CONFLICT(owner) DO UPDATE SET last_seen = excluded.last_seen",
+                    (self.owner, now),
+                )
+                self._advertise_locked(keys)
+
+                # 하트비트가 끊긴 인스턴스 정리 (임대는 만료 시각으로 자연히 풀림)
+                cutoff = now - self.ttl
+                conn.execute(
+                    "DELETE FROM advertised WHERE owner IN (SELECT owner FROM instances WHERE last_seen < ?)",
+                    (cutoff,),
+                )
+                conn.execute("DELETE FROM instances WHERE last_seen < ?", (cutoff,))
+
+                live = conn.execute("SELECT COUNT(*) FROM instances").fetchone()[0]
+                total = conn.execute("SELECT COUNT(DISTINCT key) FROM advertised").fetchone()[0]
+                quota = math.ceil(total / max(1, live))
+
+                expires_at = now + self.ttl
+                conn.execute("UPDATE leases SET expires_at = ? WHERE owner = ? AND expires_at >= ?",
+                             (expires_at, self.owner, now))
+                conn.execute("UPDATE group_reservations SET expires_at = ? WHERE owner = ? AND expires_at >= ?",
+                             (expires_at, self.owner, now))
+                holders = dict(conn.execute("SELECT key, owner FROM leases WHERE expires_at >= ?", (now,)))
+                shared = {key for (key,) in conn.execute(
+                    "SELECT DISTINCT key FROM advertised WHERE owner != ?", (self.owner,))}
+                owned = {key for key, owner in holders.items() if owner == self.owner}
+
+                if len(owned) > quota:
+                    # 새 인스턴스가 합류하면 다른 인스턴스도 가진 타겟부터 몫을 넘겨줌
+                    excess = [key for key in owned if key in shared][:len(owned) - quota]
+                    conn.executemany("DELETE FROM leases WHERE key = ? AND owner = ?",
+                                     [(key, self.owner) for key in excess])
+                    owned.difference_update(excess)
+                else:
+                    free = [key for key in keys if key not in holders]
+                    sole = [key for key in free if key not in shared]
+                    room = max(0, quota - len(owned) - len(sole))
+                    claims = sole + [key for key in free if key in shared][:room]
+                    conn.executemany(
+                        "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                        "WHERE leases.expires_at < ?",
+                        [(key, self.owner, expires_at, now) for key in claims],
+                    )
+                    owned.update(claims)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                self._advertised = None  # 다음 sync에서 광고 전체를 다시 기록
+                raise
+        return owned
+
+    def _advertise_locked(self, keys: Set[str]) -> None:
+        conn = self._conn
+        if self._advertised is None:
+            conn.execute("DELETE FROM advertised WHERE owner = ?", (self.owner,))
+            added, removed = keys, set()
+        else:
+            added, removed = keys - self._advertised, self._advertised - keys
+        conn.executemany("INSERT OR IGNORE INTO advertised (key, owner) VALUES (?, ?)",
+                         [(key, self.owner) for key in added])
+        conn.executemany("DELETE FROM advertised WHERE key = ? AND owner = ?",
+                         [(key, self.owner) for key in removed])
+        # 삭제/비활성화된 타겟의 임대는 바로 반납
+        conn.executemany("DELETE FROM leases WHERE key = ? AND owner = ?",
+                         [(key, self.owner) for key in removed])
+        self._advertised = keys
+
+    def release_all(self) -> None:
+        """종료 시 임대/그룹 선점/광고/하트비트 반납 (다른 인스턴스가 TTL을 기다리지 않고 인계)"""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+                conn.execute("DELETE FROM group_reservations WHERE owner = ? AND expires_at IS NOT NULL",
+                             (self.owner,))
+                conn.execute("DELETE FROM advertised WHERE owner = ?", (self.owner,))
+                conn.execute("DELETE FROM instances WHERE owner = ?", (self.owner,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._advertised = None
+
+    # ---- 그룹 예매 상태 ----
+
+    def is_group_reserved(self, group_id: str) -> bool:
+        """선점(만료 전) 또는 예매 완료 상태인지"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM group_reservations WHERE group_id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (group_id, self._clock()),
+            ).fetchone()
+        return row is not None
+
+    def compare_and_set_group(self, group_id: str, expected: bool, reserved: bool) -> bool:
+        """그룹 예매 상태가 `expected`일 때만 `reserved`로 바꾸고 성공 여부 반환
+
+        True로 바꾸면 TTL이 있는 선점이 되고 (만료된 다른 인스턴스의 선점은 덮어씀),
+        False로 바꾸면 이 인스턴스의 선점/완료 기록을 지움.
+        """
+        if expected == reserved:
+            return self.is_group_reserved(group_id) == expected
+        with self._lock:
+            now = self._clock()
+            if reserved:
+                cursor = self._conn.execute(
+                    "INSERT INTO group_reservations (group_id, owner, reserved_at, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(group_id) DO UPDATE SET owner = excluded.owner, "
+                    "reserved_at = excluded.reserved_at, expires_at = excluded.expires_at "
+                    "WHERE group_reservations.expires_at < ?",
+                    (group_id, self.owner, now, now + self.ttl, now),
+                )
+            else:
+                cursor = self._conn.execute(
+                    "DELETE FROM group_reservations WHERE group_id = ? AND owner = ?", (group_id, self.owner))
+        return cursor.rowcount == 1
+
+    def confirm_group(self, group_id: str) -> bool:
+        """이 인스턴스의 선점을 예매 완료로 확정 (만료 없음)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO group_reservations (group_id, owner, reserved_at, expires_at) VALUES (?, ?, ?, NULL) "
+                "ON CONFLICT(group_id) DO UPDATE SET expires_at = NULL "
+                "WHERE group_reservations.owner = excluded.owner OR group_reservations.expires_at < ?",
+                (group_id, self.owner, self._clock(), self._clock()),
+            )
+        return cursor.rowcount == 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class LeaseKeeper:
+    """레지스트리의 활성 타겟으로 주기적으로 sync 하고, 보유 임대를 레지스트리에 반영하는 워커"""
+
+    def __init__(self, store: LeaseStore, registry: 'TargetRegistry', renew_interval: Optional[float] = None) -> None:
+        self.store = store
+        self.registry = registry
+        self.renew_interval = renew_interval or store.ttl / 3
+        self._valid_until = 0.0
+        self._stop_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._logger = logging.getLogger(__name__ + ".LeaseKeeper")
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop_event.clear()
+        self._task = loop.create_task(self.run())
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.registry.set_leased_targets(set())
+        await asyncio.get_running_loop().run_in_executor(None, self.store.release_all)
+
+    async def sync_once(self) -> int:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        try:
+            owned = await loop.run_in_executor(None, self.store.sync, self.registry.lease_keys())
+        except sqlite3.Error as exc:
+            self._logger.error("Lease sync failed: %s", exc)
+            # 갱신하지 못한 임대는 만료 시각이 지나면 다른 인스턴스가 가져가므로 스캔 중단
+            if time.monotonic() >= self._valid_until:
+                self.registry.set_leased_targets(set())
+            return 0
+        self._valid_until = started + self.store.ttl
+        self.registry.set_leased_targets(owned)
+        return len(owned)
+
+    async def run(self) -> None:
+        while not self._stop_event.is_set():
+            await self.sync_once()
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self.renew_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+def open_lease_store_from_env() -> Optional[LeaseStore]:
+    """LEASE_DB_PATH가 설정되어 있으면 임대 저장소 생성 (INSTANCE_ID, LEASE_TTL 선택)"""
+    path = os.getenv('LEASE_DB_PATH')
+    if not path:
+        return None
+    return LeaseStore(path, owner=os.getenv('INSTANCE_ID'), ttl=float(os.getenv('LEASE_TTL', '30')))
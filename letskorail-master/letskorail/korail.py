@@ -4,8 +4,10 @@ import re
 import requests
 import base64
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Tuple, Optional, Generator, Iterable, Dict, Union
+from typing import Tuple, Optional, Iterable, Dict, Union
 
 from .exceptions import (
     result_checker,
@@ -13,7 +15,7 @@ from .exceptions import (
     SoldOutError,
     DiscountError,
 )
-from .train import Train, Trains, TrainType, Car, Cars
+from .train import Train, Trains, TrainType, Car, Cars, Seats
 from .passenger import AdultPsg, Passenger
 from .station import Station, Stations
 from .reservation import Reservation
@@ -205,16 +207,24 @@ class Korail(object):
         discnt_type: Optional[Discount] = None,
         train_type: TrainType = TrainType.ALL,
         include_soldout: bool = False,
+        time_limit: Optional[str] = None,
+        max_pages: int = 20,
     ) -> Trains:
         """See search_train
 
+        :param time_limit: (optional) The latest departure time (format: `hhmmss`).
+            Pagination stops at the first page that departs after it.
+
+        :param max_pages: (optional) The maximum number of schedule requests
+
         :return Trains
         """
         td = timedelta(minutes=1)
         trains = []
 
-        for _ in range(20):
+        for _ in range(max_pages):
             try:
+                # 매진 열차도 받아야 다음 페이지 시각을 이어갈 수 있음 (필터는 마지막에)
                 tr = self.search_train(
                     dpt,
                     arv,
@@ -223,14 +233,24 @@ class Korail(object):
                     passengers,
                     discnt_type,
                     train_type,
-                    include_soldout,
+                    True,
                 )
-                trains.extend(tr)
-
-                next_time = datetime.strptime(tr[-1].dpt_time, "%H%M%S") + td
-                time = next_time.strftime("%H%M%S")
             except NoResultsError:
                 break
+            trains.extend(tr)
+
+            last_time = tr[-1].dpt_time
+            if time_limit and last_time > time_limit:
+                break
+            next_time = (datetime.strptime(last_time, "%H%M%S") + td).strftime("%H%M%S")
+            if next_time <= last_time:
+                break  # 자정을 넘김
+            time = next_time
+
+        if time_limit:
+            trains = [t for t in trains if t.dpt_time <= time_limit]
+        if not include_soldout:
+            trains = [t for t in trains if t.has_seat()]
         return Trains(trains)
 
     def search_train(
@@ -351,30 +371,19 @@ class Korail(object):
 
         # Generator
         def car_seats(data):
-            res = self._sess.post(URL.CAR_DETAIL, data=data)
-            rst = res.json()
-            if result_checker(rst):
-                yield rst
+            yield self._car_detail(data)
 
         # Generator
         def cars_info(payload):
             cars = list()
 
             for data in payload:
-                res = self._sess.post(URL.CARS_INFO, data=data)
-                rst = res.json()
+                cars_ = self._cars_info(data)
 
-                if result_checker(rst):
-                    c_info = rst["srcar_infos"]["srcar_info"]
-                    cars_ = tuple(Car(c) for c in c_info)
-
-                    for c in cars_:
-                        tmp = dict(data)
-                        tmp.update({"txtSrcarNo": c.h_srcar_no})
+                for c in cars_:
+                    c._set_seats(car_seats(c._seats_payload))
 
-                        c._set_seats(car_seats(tmp))
-
-                    cars.extend(cars_)
+                cars.extend(cars_)
 
             yield Cars(cars)
 
@@ -411,10 +420,117 @@ class Korail(object):
                 tmp2.update({"txtPsrmClCd": "2"})
                 payload.append(tmp2)
 
+            t._cars_payload = tuple(payload)
             t._set_cars(cars_info(payload))
 
         return Trains(trains)
 
+    def _worker_session(self, cookies) -> requests.Session:
+        """fetch_cars 작업 스레드용 세션 - requests.Session은 스레드 간 공유가 안전하지 않으므로
+        헤더와 로그인 쿠키(cookies 사본)만 옮긴 별도 세션 사용"""
+        sess = requests.Session()
+        sess.headers.update(self._sess.headers)
+        sess.cookies.update(cookies)
+        return sess
+
+    def _cars_info(self, data: Dict, sess: Optional[requests.Session] = None) -> Tuple[Car]:
+        """CARS_INFO 1회 - 객실 등급 하나의 객차 목록"""
+        res = (sess or self._sess).post(URL.CARS_INFO, data=data)
+        rst = res.json()
+        cars = tuple()
+        if result_checker(rst):
+            cars = tuple(Car(c) for c in rst["srcar_infos"]["srcar_info"])
+            for c in cars:
+                c._seats_payload = dict(data, txtSrcarNo=c.h_srcar_no)
+        return cars
+
+    def _car_detail(self, data: Dict, sess: Optional[requests.Session] = None) -> Dict:
+        """CAR_DETAIL 1회 - 객차 하나의 좌석 배치"""
+        res = (sess or self._sess).post(URL.CAR_DETAIL, data=data)
+        rst = res.json()
+        result_checker(rst)
+        return rst
+
+    def car_detail(self, car: Car) -> Dict:
+        """Fetch the current seat map of a car (one CAR_DETAIL request).
+
+        Returns the raw response so pollers can read each seat's
+        `h_sale_psb_flg` without building `Seats`.
+        Pass it to `Seats(...)` to get the parsed seat map.
+
+        :param car: A car from `train.cars` or `fetch_cars`
+        """
+        return self._car_detail(car._seats_payload)
+
+    def fetch_cars(
+        self,
+        trains: Union[Train, Iterable[Train]],
+        max_workers: int = 8,
+    ) -> Tuple[Cars]:
+        """Fetch cars and seat maps of trains concurrently.
+
+        `train.cars` fetches lazily and one request at a time
+        (CARS_INFO per class, then CAR_DETAIL per car).
+        This sends the same requests through a thread pool of
+        `max_workers` and returns fully populated `Cars`
+        (every `car.seats` is already loaded).
+        Each worker thread uses its own session with a copy of the
+        login cookies; cookies set by these responses are not kept.
+
+        :param trains: A train or trains from `search_train`
+
+        :param max_workers: (optional) The maximum concurrent requests
+
+        :return Tuple[Cars] in the same order as `trains`
+        """
+        single = isinstance(trains, Train)
+        trains = (trains,) if single else tuple(trains)
+
+        cookies = self._sess.cookies.copy()
+        local = threading.local()
+        sessions = []
+        sessions_lock = threading.Lock()
+
+        def session() -> requests.Session:
+            sess = getattr(local, "sess", None)
+            if sess is None:
+                sess = local.sess = self._worker_session(cookies)
+                with sessions_lock:
+                    sessions.append(sess)
+            return sess
+
+        def cars_info(data):
+            return self._cars_info(data, session())
+
+        def car_detail(data):
+            return self._car_detail(data, session())
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+                # 1단계: 열차 x 객실 등급별 객차 목록
+                infos = [
+                    [pool.submit(cars_info, data) for data in getattr(t, "_cars_payload", ())]
+                    for t in trains
+                ]
+                train_cars = [[c for f in fs for c in f.result()] for fs in infos]
+
+                # 2단계: 모든 객차의 좌석 배치
+                details = [
+                    [pool.submit(car_detail, c._seats_payload) for c in cars]
+                    for cars in train_cars
+                ]
+                result = []
+                for t, cars, fs in zip(trains, train_cars, details):
+                    for c, f in zip(cars, fs):
+                        c._set_loaded_seats(Seats(f.result()))
+                    t._set_loaded_cars(Cars(cars))
+                    result.append(t._cars)
+        finally:
+            for sess in sessions:
+                sess.close()
+
+        return tuple(result)
+
     def _seat_type(self, train, option, ignore_soldout):
         seat_type = "1"
 
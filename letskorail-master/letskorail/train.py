@@ -1,9 +1,19 @@
 # coding=utf-8
 
-from typing import Generator, Tuple, Dict, List
+import re
+from typing import Generator, Tuple, Dict, List, Iterable, Optional, Union
 from .constants import window_side, seat_type
 from .exceptions import KorailError
 
+_SEAT_KEY = re.compile(r"^(\d+)([A-Z])$")
+
+
+def _int_flag(value, default: int = -1) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
 
 class TrainType:
     """type of train
@@ -73,6 +83,9 @@ class Seats(object):
         self.psb_seat = int(data.get("h_psb_seat_cnt", 0))
         self.arr_seat = int(data.get("h_seat_arr_info", 0))
         self.car_no = data.get("h_srcar_no")
+        # 클래스 속성 dict를 공유하면 객차끼리 좌석이 섞이므로 인스턴스마다 새로 만듦
+        self.seat_info = dict()
+        self._layout = None
 
         for s in data["seat_infos"]["seat_info"]:
             s_no = s["h_con_seat_no"]
@@ -134,6 +147,107 @@ class Seats(object):
             for i in range(count)
         ]
 
+    @property
+    def layout(self) -> Tuple[Tuple[str, ...], Dict[int, Dict[str, str]]]:
+        """(열 순서, 행 번호 -> {열: 좌석 키}) - 좌석 키 '12A'를 행/열로 나눈 인덱스 (한 번만 생성)"""
+        if self._layout is None:
+            rows: Dict[int, Dict[str, str]] = {}
+            columns = set()
+            for key in self.seat_info:
+                m = _SEAT_KEY.match(key)
+                if not m:
+                    continue
+                row, column = int(m.group(1)), m.group(2)
+                rows.setdefault(row, {})[column] = key
+                columns.add(column)
+            self._layout = (tuple(sorted(columns)), rows)
+        return self._layout
+
+    def select_block(
+        self,
+        count: int = 1,
+        position: Optional[Union[str, Iterable[str]]] = None,
+        direction: Optional[str] = None,
+        seat_types: Iterable[str] = ("일반석",),
+        h_psrm_cl_cd: str = "1",
+    ) -> Optional[Tuple[Tuple[int, int], List[Dict]]]:
+        """Find `count` adjacent seats in this car.
+
+        Return ((penalty, distance from the car centre), seats) or None.
+        penalty 0: same row, same side of the aisle / 1: same row across the aisle /
+        2: two consecutive rows on one side (facing or back to back) /
+        3: same row, not contiguous / 4: scattered in this car
+        """
+        si = self.seat_info
+        seat_types = tuple(seat_types)
+        positions = (position,) if isinstance(position, str) else position
+
+        def _ok(key):
+            o = si[key]
+            return (
+                o.sale_psb
+                and o.seat_type in seat_types
+                and (positions is None or o.near_wind in positions)
+                and (direction is None or o.direction == direction)
+            )
+
+        columns, rows = self.layout
+        half = len(columns) // 2 or 1
+        side_of = {c: (0 if i < half else 1) for i, c in enumerate(columns)}
+        centre = max(rows) / 2 if rows else 0
+        best = None
+        scattered = []
+
+        def _offer(penalty, row, keys):
+            nonlocal best
+            score = (penalty, int(abs(row - centre) * 2))
+            if best is None or score < best[0]:
+                best = (score, keys)
+
+        # 행별 판매 가능 좌석 (열 번호, 열, 좌석 키)
+        free_rows = {
+            row: [(i, c, row_map[c]) for i, c in enumerate(columns) if c in row_map and _ok(row_map[c])]
+            for row, row_map in rows.items()
+        }
+        # 행 순서대로 한 번만 훑으며 행 안 블록과 다음 행과의 블록을 함께 평가
+        for row in sorted(free_rows):
+            free = free_rows[row]
+            scattered.extend((abs(row - centre), k) for _, _, k in free)
+            if len(free) >= count:
+                for i in range(len(free) - count + 1):
+                    window = free[i:i + count]
+                    if window[-1][0] - window[0][0] == count - 1:
+                        across = side_of[window[0][1]] != side_of[window[-1][1]]
+                        _offer(1 if across else 0, row, [k for _, _, k in window])
+                _offer(3, row, [k for _, _, k in free[:count]])
+            nxt = free_rows.get(row + 1)
+            if count >= 2 and nxt:
+                for side in (0, 1):
+                    here = [k for _, c, k in free if side_of[c] == side]
+                    there = [k for _, c, k in nxt if side_of[c] == side]
+                    take = min(len(here), count - 1)
+                    if take and len(there) >= count - take:
+                        _offer(2, row, here[:take] + there[:count - take])
+            if best is not None and best[0] == (0, 0):
+                break
+
+        if best is None and len(scattered) >= count:
+            scattered.sort()
+            best = ((4, int(scattered[0][0] * 2)), [k for _, k in scattered[:count]])
+        if best is None:
+            return None
+
+        score, keys = best
+        return score, [
+            {
+                "car_no": self.car_no,
+                "seat_no": si[k].seat_no2,
+                "seat": k,
+                "psrm_cl_cd": h_psrm_cl_cd,
+            }
+            for k in keys
+        ]
+
 
 class Car(object):
     h_seat_cnt = None
@@ -161,6 +275,10 @@ class Car(object):
         assert isinstance(gen, Generator)
         self._gen = gen
 
+    def _set_loaded_seats(self, seats: Seats):
+        self._seats = seats
+        self._gen = iter(())
+
     @property
     def seats(self) -> Seats:
         try:
@@ -195,6 +313,13 @@ class Car(object):
 
         return data
 
+    def select_block(self, count: int = 1, **kwargs) -> Optional[Tuple[Tuple[int, int], List[Dict]]]:
+        """Get `count` adjacent seats in this car. See Seats.select_block"""
+        seats = self.seats
+        if seats is None:
+            return None
+        return seats.select_block(count, h_psrm_cl_cd=self.h_psrm_cl_cd, **kwargs)
+
 
 class Cars:
     def __init__(self, cars: Tuple[Car]):
@@ -213,6 +338,26 @@ class Cars:
     def car_list(self) -> List:
         return sorted([int(k) for k in self._cars.keys()])
 
+    def select_block(self, count: int = 1, h_psrm_cl_cd: Optional[str] = None, **kwargs) -> Optional[List[Dict]]:
+        """Get the best block of `count` adjacent seats over all cars
+
+        A party is always seated in one car (Korail assigns every passenger to the same car),
+        so cars without a block fall back to the next car, and scattered seats in one car come last.
+
+        :param h_psrm_cl_cd: (optional) 1: general, 2: special, None: any
+        """
+        best = None
+        for no in self.car_list():
+            car = self[no]
+            if h_psrm_cl_cd is not None and car.h_psrm_cl_cd != h_psrm_cl_cd:
+                continue
+            found = car.select_block(count, **kwargs)
+            if found is not None and (best is None or found[0] < best[0]):
+                best = found
+                if best[0] == (0, 0):
+                    break
+        return best[1] if best else None
+
 
 class Train(object):
     # 열차 타입 h_trn_clsf_cd
@@ -328,6 +473,8 @@ class Train(object):
         self.special_seat = data.get("h_spe_rsv_cd")
         # 일반 예약 가능 00: 일반칸 없음, 11,21: 가능, 13,23: 매진 h_gen_rsv_cd
         self.general_seat = data.get("h_gen_rsv_cd")
+        # 예약대기 h_wait_rsv_flg (-1: 불가, 0 이상: 가능)
+        self.wait_reserve_flag = _int_flag(data.get("h_wait_rsv_flg"))
         # 일반실 가격(할인 적용) h_rcvd_amt
         self.general_price = int(data.get("h_rcvd_amt", 0))
         # 특실 가격(할인 적용) h_rcvd_fare
@@ -366,10 +513,17 @@ class Train(object):
     def has_seat(self):
         return self.has_general_seat() or self.has_special_seat()
 
+    def has_waiting_list(self):
+        return self.wait_reserve_flag >= 0
+
     def _set_cars(self, gen: Generator):
         assert isinstance(gen, Generator)
         self._gen = gen
 
+    def _set_loaded_cars(self, cars: Cars):
+        self._cars = cars
+        self._gen = iter(())
+
     @property
     def cars(self) -> Cars:
         try:
@@ -1,10 +1,9 @@
 import sys
 import logging
 import asyncio
-import json
 import os
-import builtins
-import calendar
+import re
+import requests
 from datetime import datetime, timedelta
 from dotenv import load_dotenv  # 추가된 부분
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -16,10 +15,32 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'SRT-2.6.7'))
 
 from typing import Any, Dict, Optional
 from letskorail.passenger import ChildPsg
-from pipeline import TargetRegistry, ScannerWorker, ReservationExecutor, ReservationTask, TargetItem
+from pipeline import TargetRegistry, ScannerWorker, ReservationExecutor, ReservationTask, TargetItem, party_size
+from circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from telegram_outbox import TelegramOutbox
+from rate_limiter import TokenBucket
+from reservation_sessions import SessionManager
+from target_store import open_target_store_from_env
+from sharding import ShardCoordinator, ShardRuntime, build_shard_runtime
+from lease_store import LeaseKeeper, open_lease_store_from_env
+from group_strategy import SpeculativeGroupReservation
+from scoring import PreferenceProfile, rank_trains
+from availability_grid import AvailabilityGridBuilder, CellCache
+from seat_maps import SeatMapCache, SeatPreference
+from seat_watcher import SeatWatcher
+from search_cache import SearchCache
+from reserve_options import ktx_reserve_kwargs, srt_reserve_kwargs
+from availability_events import (
+    OPEN_KINDS, SEAT_CLOSED, SEAT_OPENED, STANDBY_OPENED,
+    AvailabilityBus, AvailabilityStats, AvailabilitySubscriber, AvailabilityTracker,
+)
+from webhook_server import run_webhook
+from callback_router import CallbackRouter, DateChoice, parse_calendar, parse_date, parse_int
+from keyboards import create_calendar, create_time_selector, create_quick_routes, warm_up as warm_up_keyboards
 
 from letskorail import Korail
 from letskorail.options import AdultPsg, SeatOption
+from letskorail.exceptions import NoResultsError
 from SRT import SRT, SeatType
 from functools import partial
 from datetime import datetime
@@ -44,13 +65,21 @@ if not validate_credentials():
     logger.error("필수 크리덴셜이 누락되었습니다. 환경변수를 확인해주세요.")
     sys.exit(1)
 
+# 스캔 적중 시 예매 실행기에 넘길 후보 열차 수 (1순위 예약 실패 시 재조회 없이 다음 후보로)
+MAX_RESERVATION_CANDIDATES = int(os.getenv('MAX_RESERVATION_CANDIDATES', '5'))
+
+# 조회 공유 캐시 신선도(초) - 스캔/다시검색은 짧게, 목록 보기/그리드는 길게
+SEARCH_CACHE_SCAN_TTL = float(os.getenv('SEARCH_CACHE_SCAN_TTL', '2'))
+SEARCH_CACHE_BROWSE_TTL = float(os.getenv('SEARCH_CACHE_BROWSE_TTL', '20'))
+
 # 대화 상태 정의
 DEPARTURE, DESTINATION, DATE, TIME, TRAIN_SERVICE = range(5)
 
-# 달력 생성을 위한 상수
-DAYS_OF_WEEK = ['월', '화', '수', '목', '금', '토', '일']
-MONTHS = ['', '1월', '2월', '3월', '4월', '5월', '6월',
-          '7월', '8월', '9월', '10월', '11월', '12월']
+def _is_upstream_failure(exc: Exception) -> bool:
+    """네트워크/서버 장애로 볼 수 있는 예외인지 판단 (매진, 검색 결과 없음 등은 정상 응답)"""
+    if isinstance(exc, requests.exceptions.RequestException):
+        return True
+    return "Failed to decode" in str(exc)
 
 
 class SRTAutoPayment:
@@ -312,76 +341,6 @@ class KorailAutoPayment:
 
             # 재예약 로직 추가 필요시 여기에 구현
 
-class StatusManager:
-    def __init__(self, status_file="reservation_status.json"):
-        self.status_file = status_file
-        self.current_status = None  # 메모리상의 상태
-        self.stop_event = asyncio.Event()  # 중단 이벤트 생성
-        self.initialize_status()
-
-    def initialize_status(self):
-        """상태 초기화"""
-        self.current_status = {
-            'is_running': False,
-            'should_stop': False,
-            'chat_id': None,
-            'last_check': datetime.now().isoformat()
-        }
-        self.stop_event.clear()  # 중단 이벤트 초기화
-        self._save_status(self.current_status)
-
-    def _save_status(self, status):
-        """상태 파일 저장"""
-        self.current_status = status
-        with builtins.open(self.status_file, 'w') as f:
-            json.dump(status, f)
-
-    def _load_status(self):
-        """상태 파일 로드"""
-        if not self.current_status:
-            if os.path.exists(self.status_file):
-                with builtins.open(self.status_file, 'r') as f:
-                    self.current_status = json.load(f)
-            else:
-                self.initialize_status()
-        return self.current_status
-
-    def start_reservation(self, chat_id):
-        """예약 시작"""
-        self.current_status = {
-            'is_running': True,
-            'should_stop': False,
-            'chat_id': chat_id,
-            'last_check': datetime.now().isoformat()
-        }
-        self.stop_event.clear()  # 중단 이벤트 초기화
-        self._save_status(self.current_status)
-        logger.info(f"예약 시작 - chat_id: {chat_id}")
-
-    def stop_reservation(self, chat_id):
-        """예약 중단"""
-        status = self._load_status()
-        if status and str(status['chat_id']) == str(chat_id):
-            status['should_stop'] = True
-            self.stop_event.set()  # 중단 이벤트 설정
-            self._save_status(status)
-            logger.info(f"예약 중단 요청 - chat_id: {chat_id}")
-            return True
-        return False
-
-    def should_stop(self, chat_id):
-        """중단 상태 확인"""
-        status = self._load_status()
-        return status and str(status['chat_id']) == str(chat_id) and status['should_stop']
-
-    def cleanup(self):
-        """상태 정리"""
-        try:
-            self.initialize_status()
-            logger.info("상태 초기화 완료")
-        except Exception as e:
-            logger.error(f"상태 초기화 중 오류 발생: {e}")
-
 class TrainReservation:
     def __init__(self):
         korail_user = get_credential('KORAIL_USER')
@@ -509,12 +468,38 @@ class TrainReservation:
 
         self.RATE_LIMIT_DELAY = 1.0
         self.ATTEMPTS_PER_CYCLE = 10
-        self.status_manager = StatusManager()
-        self.reservation_task = None
+        # 채팅별 단일 예약 세션 (여러 사용자가 동시에 예약 가능)
+        self.sessions = SessionManager()
+        # 모든 단일 예약 세션이 공유하는 업스트림 요청 속도 제한
+        self.single_booking_limiter = TokenBucket(rate=float(os.getenv('SINGLE_BOOKING_RATE', '2.0')))
+        # /grid 날짜×시간대 잔여석 조회 (셀 단위 캐시, 캐시에 없는 셀만 동시 조회)
+        self.grid_builder = AvailabilityGridBuilder(
+            self.count_available_trains,
+            TokenBucket(rate=float(os.getenv('GRID_SEARCH_RATE', '4.0'))),
+            CellCache(ttl=float(os.getenv('GRID_CACHE_TTL', '60'))),
+        )
+        # 창측만 등 엄격한 좌석 조건은 스캔 단계에서 열차별 좌석 배치로 확인 (짧은 TTL로 캐시)
+        self.seat_maps = SeatMapCache(
+            call=lambda func: self._call_upstream('KTX', 'seats', func),
+            load_cars=lambda train: self.korail.fetch_cars(train)[0],
+            ttl=float(os.getenv('SEAT_MAP_TTL', '30')),
+        )
+        # 대화형 조회/다시검색/스캔이 같은 조건을 연달아 조회하면 결과 공유 (신선도는 호출마다 TTL로 지정)
+        self.search_cache = SearchCache(
+            default_ttl=SEARCH_CACHE_SCAN_TTL,
+            max_age=max(SEARCH_CACHE_SCAN_TTL, SEARCH_CACHE_BROWSE_TTL),
+        )
+        # 스캔 결과를 노선/날짜별 이전 좌석 상태와 비교해 바뀐 열차만 이벤트로 발행 (예매 앞당김/분석이 구독)
+        self.availability = AvailabilityTracker()
+        self.availability_bus = AvailabilityBus()
+        self.availability_stats = AvailabilityStats()
         self.target_registry: Optional[TargetRegistry] = None
         self.scanner_worker: Optional[ScannerWorker] = None
         self.reservation_executor: Optional[ReservationExecutor] = None
         self.bot = None
+        self.outbox: Optional[TelegramOutbox] = None
+        # 업스트림 장애 시 타임아웃을 반복하지 않도록 엔드포인트 그룹별 서킷 브레이커 적용
+        self.circuit_breakers = CircuitBreakerRegistry()
 
         logger.info("TrainReservation 초기화 완료")
 
@@ -535,6 +520,50 @@ class TrainReservation:
             return False
 
 
+    async def _call_upstream(self, service: str, group: str, func):
+        """서킷 브레이커를 거쳐 블로킹 업스트림 호출을 executor에서 실행"""
+        breaker = self.circuit_breakers.get(service, group)
+        if not breaker.allow_request():
+            raise CircuitOpenError(breaker.name, breaker.retry_after())
+        loop = asyncio.get_event_loop()
+        succeeded = False
+        try:
+            result = await loop.run_in_executor(None, func)
+            succeeded = True
+            return result
+        except Exception as exc:
+            # 매진/결과 없음 등 업스트림이 정상 응답한 경우는 성공
+            succeeded = not _is_upstream_failure(exc)
+            raise
+        finally:
+            # 취소(CancelledError) 등 결과를 받지 못한 경우도 실패로 기록해 half_open 프로브를 반납
+            if succeeded:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+    def _relogin(self, service: str) -> None:
+        """Korail/SRT 세션 재설정 (login 서킷이 열려 있으면 즉시 CircuitOpenError)"""
+        breaker = self.circuit_breakers.get(service, 'login')
+        if not breaker.allow_request():
+            raise CircuitOpenError(breaker.name, breaker.retry_after())
+        try:
+            if service == 'KTX':
+                korail_user = os.environ.get('KORAIL_USER')
+                korail_pass = os.environ.get('KORAIL_PASS')
+                self.korail = Korail()
+                self.korail.login(korail_user.strip(), korail_pass.strip())
+            else:
+                srt_user = os.environ.get('SRT_USER_num')
+                srt_pass = os.environ.get('SRT_PASS')
+                self.srt = SRT(srt_user.strip(), srt_pass.strip())
+                self.srt.login()
+        except BaseException:
+            # 잘못된 계정 정보 등 업스트림 장애가 아닌 오류도 로그인 실패로 기록 (반복 로그인 시도를 막음)
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+
     def attach_pipeline(self, target_registry: TargetRegistry, scanner_worker: ScannerWorker, reservation_executor: ReservationExecutor) -> None:
         self.target_registry = target_registry
         self.scanner_worker = scanner_worker
@@ -543,6 +572,23 @@ class TrainReservation:
     def bind_bot(self, bot) -> None:
         self.bot = bot
 
+    def attach_outbox(self, outbox: TelegramOutbox) -> None:
+        self.outbox = outbox
+
+    async def _notify(self, context, chat_id: int, text: str) -> None:
+        """예약 경로 알림 - 발신 큐가 있으면 큐에 넣고 바로 반환"""
+        if self.outbox:
+            await self.outbox.send_message(chat_id=chat_id, text=text)
+        else:
+            await context.bot.send_message(chat_id=chat_id, text=text)
+
+    async def _notify_progress(self, context, chat_id: int, text: str) -> None:
+        """진행 상황 알림 - 발신 큐가 있으면 이전 진행 메시지를 수정"""
+        if self.outbox:
+            await self.outbox.send_progress(chat_id, 'reservation_progress', text)
+        else:
+            await context.bot.send_message(chat_id=chat_id, text=text)
+
     async def scan_for_available_train(self, target: TargetItem) -> Optional[Dict[str, Any]]:
         service = (target.service or '').upper()
         if service == 'KTX':
@@ -553,198 +599,334 @@ class TrainReservation:
         return None
 
     async def _scan_available_ktx(self, target: TargetItem) -> Optional[Dict[str, Any]]:
-        loop = asyncio.get_event_loop()
         try:
-            trains = await loop.run_in_executor(
-                None,
-                partial(
-                    self.korail.search_train,
-                    target.departure,
-                    target.arrival,
-                    target.date,
-                    target.time,
-                    include_soldout=False
-                )
+            # 시간 창 타겟은 창 끝을 넘는 페이지에서 조회 중단
+            trains = await self._korail_search(
+                target.departure, target.arrival, target.date, target.time,
+                party=self._party_size(target), time_limit=target.time_end, include_soldout=False,
             )
+        except CircuitOpenError as exc:
+            # 서킷이 열려 있으면 타임아웃 없이 즉시 실패, 서킷이 반개방될 때까지 스캔 보류
+            if self.target_registry:
+                await self.target_registry.mark_scan_failure(
+                    target.chat_id, target.target_id, backoff_seconds=max(1.0, exc.retry_after)
+                )
+            return None
         except Exception as exc:
             logger.debug("KTX 조회 실패(%s): %s", target.target_id, exc)
+            if isinstance(exc, NoResultsError):
+                # 조회 범위에 좌석 있는 열차가 하나도 없음
+                self._publish_availability('KTX', target, [])
             if self.target_registry:
                 await self.target_registry.mark_scan_failure(target.chat_id, target.target_id)
             return None
 
-        available = list(trains) if trains else []
-        if not available:
-            return None
-
-        train = available[0]
-        summary = (
-            f"{target.date[:4]}/{target.date[4:6]}/{target.date[6:]} "
-            f"{train.dpt_time[:2]}:{train.dpt_time[2:4]} → {train.arv_time[:2]}:{train.arv_time[2:4]} "
-            f"KTX {train.train_no}"
-        )
-        label = target.metadata.get('label')
-        if label:
-            summary = f"[{label}] {summary}"
-        return {
-            'service': 'KTX',
-            'train': train,
-            'summary': summary,
-        }
+        self._publish_availability('KTX', target, trains)
+        return await self._scan_payload('KTX', target, trains)
 
     async def _scan_available_srt(self, target: TargetItem) -> Optional[Dict[str, Any]]:
-        loop = asyncio.get_event_loop()
         try:
-            trains = await loop.run_in_executor(
-                None,
-                partial(
-                    self.srt.search_train,
-                    target.departure,
-                    target.arrival,
-                    target.date,
-                    target.time,
-                    available_only=True
-                )
+            trains = await self._srt_search(
+                target.departure, target.arrival, target.date, target.time,
+                party=self._party_size(target), time_limit=target.time_end, available_only=True,
             )
+        except CircuitOpenError as exc:
+            if self.target_registry:
+                await self.target_registry.mark_scan_failure(
+                    target.chat_id, target.target_id, backoff_seconds=max(1.0, exc.retry_after)
+                )
+            return None
         except Exception as exc:
             logger.debug("SRT 조회 실패(%s): %s", target.target_id, exc)
             if self.target_registry:
                 await self.target_registry.mark_scan_failure(target.chat_id, target.target_id)
             return None
 
-        available = list(trains) if trains else []
-        if not available:
+        self._publish_availability('SRT', target, trains)
+        return await self._scan_payload('SRT', target, trains)
+
+    async def _korail_search(self, dep: str, arr: str, date: str, time: str, party=(1, 0),
+                             time_limit: Optional[str] = None, include_soldout: bool = True,
+                             ttl: Optional[float] = None):
+        """Korail 조회 (공유 캐시 경유)
+
+        좌석 유무 필터는 letskorail에서도 응답을 받은 뒤 적용하므로 매진 포함 결과 하나를 캐시하고
+        include_soldout=False면 여기서 거름 (search_train과 같이 남는 열차가 없으면 NoResultsError).
+        """
+        if time_limit:
+            func = partial(self.korail.search_train_allday, dep, arr, date, time, passengers=self._korail_party(*party),
+                           include_soldout=True, time_limit=time_limit)
+        else:
+            func = partial(self.korail.search_train, dep, arr, date, time, passengers=self._korail_party(*party),
+                           include_soldout=True)
+        trains = await self.search_cache.get(
+            ('KTX', dep, arr, date, time, time_limit, tuple(party)),
+            lambda: self._call_upstream('KTX', 'search', func),
+            ttl=ttl,
+        )
+        if include_soldout:
+            return list(trains)
+        available = [train for train in trains if train.has_seat()]
+        if not available and not time_limit:
+            raise NoResultsError("조건에 맞는 열차가 없습니다.")
+        return available
+
+    async def _srt_search(self, dep: str, arr: str, date: str, time: str, party=(1, 0),
+                          time_limit: Optional[str] = None, available_only: bool = True,
+                          ttl: Optional[float] = None):
+        """SRT 조회 (공유 캐시 경유) - 매진 포함 결과를 캐시하고 available_only면 여기서 거름"""
+        func = partial(self.srt.search_train, dep, arr, date, time, time_limit=time_limit,
+                       available_only=False, passengers=self._srt_party(*party))
+        trains = await self.search_cache.get(
+            ('SRT', dep, arr, date, time, time_limit, tuple(party)),
+            lambda: self._call_upstream('SRT', 'search', func),
+            ttl=ttl,
+        )
+        if available_only:
+            return [train for train in trains if train.seat_available()]
+        return list(trains)
+
+    def _publish_availability(self, service: str, target: TargetItem, trains) -> None:
+        """좌석 있는 열차만 받은 스캔 결과를 이전 상태와 비교해 바뀐 열차의 이벤트 발행"""
+        events = self.availability.observe(
+            service, target.departure, target.arrival, target.date, trains or [],
+            window_start=target.time, window_end=target.time_end, available_only=True,
+            party=party_size(target),
+        )
+        if events:
+            self.availability_bus.publish(events)
+
+    async def _scan_payload(self, service: str, target: TargetItem, trains) -> Optional[Dict[str, Any]]:
+        """좌석이 있는 열차를 선호 조건으로 순위를 매겨 후보 목록과 함께 반환 (1순위가 payload['train'])"""
+        ranked = rank_trains(trains or [], service, PreferenceProfile.for_target(target))
+        if not ranked:
             return None
+        candidates = [
+            {
+                'train': candidate.train,
+                'summary': self._train_summary(service, target, candidate.train),
+                'seat_class': candidate.seat_class,
+                'score': round(candidate.score, 1),
+            }
+            for candidate in ranked[:MAX_RESERVATION_CANDIDATES]
+        ]
+        preference = SeatPreference.for_target(target)
+        if service == 'KTX' and preference.strict:
+            # 조건에 맞는 좌석이 실제로 있는 후보만 남기고, 고른 좌석을 그대로 예약에 사용
+            seats = await asyncio.gather(
+                *(self.seat_maps.find_seats(candidate['train'], preference) for candidate in candidates)
+            )
+            for candidate, seat_opt in zip(candidates, seats):
+                candidate['seat_opt'] = seat_opt
+            candidates = [candidate for candidate in candidates if candidate['seat_opt']]
+            if not candidates:
+                return None
+        best = candidates[0]
+        return {
+            'service': service,
+            'train': best['train'],
+            'summary': best['summary'],
+            'candidates': candidates,
+        }
 
-        train = available[0]
-        dep_time = train.dep_time.strftime('%H:%M')
-        arr_time = train.arr_time.strftime('%H:%M')
+    async def search_watch_trains(self, target: TargetItem, limit: int):
+        """좌석 감시(SeatWatcher) 대상 열차 - 매진 포함으로 조회해 타겟 시간 창 안의 앞쪽 열차 limit개"""
+        profile = PreferenceProfile.for_target(target)
+        trains = await self._korail_search(
+            target.departure, target.arrival, target.date, target.time,
+            party=self._party_size(target), time_limit=target.time_end, include_soldout=True,
+        )
+        in_window = [
+            train for train in trains
+            if (not profile.window_start or train.dpt_time >= profile.window_start)
+            and (not profile.window_end or train.dpt_time <= profile.window_end)
+        ]
+        return in_window[:limit]
+
+    async def fetch_watch_cars(self, trains):
+        """열차들의 객차/좌석 배치를 한 번에 조회 (Korail.fetch_cars)"""
+        return await self._call_upstream('KTX', 'seats', partial(self.korail.fetch_cars, trains))
+
+    async def fetch_car_detail(self, car):
+        """객차 하나의 좌석 판매 상태 원본 응답 (CAR_DETAIL만 조회)"""
+        return await self._call_upstream('KTX', 'seats', partial(self.korail.car_detail, car))
+
+    def seat_watch_payload(self, target: TargetItem, train, seat_opt) -> Dict[str, Any]:
+        """SeatWatcher가 고른 좌석으로 예매할 payload (후보는 그 열차 하나)"""
+        candidate = {
+            'train': train,
+            'summary': self._train_summary('KTX', target, train),
+            'seat_class': 'SPECIAL' if seat_opt[0].get('psrm_cl_cd') == '2' else 'GENERAL',
+            'seat_opt': seat_opt,
+        }
+        return {
+            'service': 'KTX',
+            'train': train,
+            'summary': candidate['summary'],
+            'candidates': [candidate],
+        }
+
+    @staticmethod
+    def _train_summary(service: str, target: TargetItem, train) -> str:
+        def hhmm(value) -> str:
+            if hasattr(value, 'strftime'):
+                return value.strftime('%H:%M')
+            return f"{value[:2]}:{value[2:4]}"
+
+        if service == 'KTX':
+            dep_time, arr_time, train_no = train.dpt_time, train.arv_time, train.train_no
+        else:
+            dep_time, arr_time, train_no = train.dep_time, train.arr_time, train.train_number
         summary = (
             f"{target.date[:4]}/{target.date[4:6]}/{target.date[6:]} "
-            f"{dep_time} → {arr_time} SRT {train.train_number}"
+            f"{hhmm(dep_time)} → {hhmm(arr_time)} {service} {train_no}"
         )
         label = target.metadata.get('label')
         if label:
             summary = f"[{label}] {summary}"
-        return {
-            'service': 'SRT',
-            'train': train,
-            'summary': summary,
-        }
+        return summary
+
+    async def count_available_trains(self, service: str, dep: str, arr: str, date: str,
+                                     time_start: str, time_end: str) -> int:
+        """시간대 안에 출발하는 좌석 있는 열차 수 (그리드 셀 하나). 검색 결과 없음은 0, 장애는 예외"""
+        try:
+            if service == 'KTX':
+                trains = await self._korail_search(dep, arr, date, time_start, time_limit=time_end,
+                                                   include_soldout=False, ttl=SEARCH_CACHE_BROWSE_TTL)
+            else:
+                trains = await self._srt_search(dep, arr, date, time_start, time_limit=time_end,
+                                                available_only=True, ttl=SEARCH_CACHE_BROWSE_TTL)
+        except CircuitOpenError:
+            raise
+        except Exception as exc:
+            if _is_upstream_failure(exc):
+                raise
+            return 0
+        return len(trains or [])
 
     async def execute_auto_reservation(self, reservation_task: ReservationTask, bot) -> bool:
         target = reservation_task.target
         payload = reservation_task.train_payload
         service = (target.service or '').upper()
-        if service == 'KTX':
-            return await self._execute_auto_reservation_ktx(target, payload, bot)
-        if service == 'SRT':
-            return await self._execute_auto_reservation_srt(target, payload, bot)
-        logger.warning("지원하지 않는 서비스로 예매 시도: %s", target.service)
-        return False
-
-    async def _execute_auto_reservation_ktx(self, target: TargetItem, payload: Dict[str, Any], bot) -> bool:
-        train = payload.get('train')
-        if train is None:
+        if service not in ('KTX', 'SRT'):
+            logger.warning("지원하지 않는 서비스로 예매 시도: %s", target.service)
             return False
 
-        seat_pref = str(target.metadata.get('seat', 'GENERAL_FIRST')).upper()
-        seat_option_map = {
-            'SPECIAL': SeatOption.SPECIAL_FIRST,
-            'SPECIAL_ONLY': SeatOption.SPECIAL_ONLY,
-            'GENERAL_ONLY': SeatOption.GENERAL_ONLY,
-            'GENERAL_FIRST': SeatOption.GENERAL_FIRST,
-        }
-        seat_option = seat_option_map.get(seat_pref, SeatOption.GENERAL_FIRST)
-
-        loop = asyncio.get_event_loop()
         try:
-            reservation = await loop.run_in_executor(
-                None,
-                partial(self.korail.reserve, train, seat_opt=seat_option)
-            )
+            reservation = await self.hold_reservation(target, payload)
             if reservation:
-                reservation_id = getattr(reservation, 'rsv_no', None) or getattr(reservation, 'pnr_no', None) or '확인 필요'
                 summary = payload.get('summary', '')
                 message = (
-                    "✅ KTX 자동 예매 성공\n"
+                    f"✅ {service} 자동 예매 성공\n"
                     f"{summary}\n"
-                    f"예약번호: {reservation_id}"
+                    f"예약번호: {self.reservation_number(service, reservation)}"
                 )
                 if bot:
                     await bot.send_message(chat_id=target.chat_id, text=message)
                 return True
         except Exception as exc:
-            logger.warning("KTX 자동 예매 실패(%s): %s", target.target_id, exc)
+            logger.warning("%s 자동 예매 실패(%s): %s", service, target.target_id, exc)
             if bot:
                 try:
-                    await bot.send_message(chat_id=target.chat_id, text=f"KTX 자동 예매 실패: {exc}")
+                    await bot.send_message(chat_id=target.chat_id, text=f"{service} 자동 예매 실패: {exc}")
                 except Exception:
-                    logger.debug("KTX 실패 알림 전송 실패 - chat %s", target.chat_id)
+                    logger.debug("%s 실패 알림 전송 실패 - chat %s", service, target.chat_id)
         return False
 
-    async def _execute_auto_reservation_srt(self, target: TargetItem, payload: Dict[str, Any], bot) -> bool:
-        train = payload.get('train')
-        if train is None:
-            return False
+    async def hold_reservation(self, target: TargetItem, payload: Dict[str, Any]):
+        """알림 없이 좌석만 예약 (결제 전 상태). 예약 객체 반환, 업스트림 오류는 예외로 전달
 
-        adult_count = int(target.metadata.get('adult_count', 1) or 0)
-        child_count = int(target.metadata.get('child_count', 0) or 0)
-        passengers = []
-        if adult_count > 0:
-            passengers.append(Adult(count=adult_count))
-        if child_count > 0:
+        payload에 후보 목록이 있으면 예약 실패 시 재조회 없이 다음 후보로 넘어가고,
+        성공한 후보의 열차/요약으로 payload['train'], payload['summary']를 갱신.
+        """
+        service = (target.service or '').upper()
+        if payload.get('train') is None or service not in ('KTX', 'SRT'):
+            return None
+        hold = self._hold_ktx if service == 'KTX' else self._hold_srt
+        candidates = payload.get('candidates') or [payload]
+        last_error: Optional[Exception] = None
+        for index, candidate in enumerate(candidates):
+            try:
+                reservation = await hold(target, candidate)
+            except CircuitOpenError:
+                raise  # 서킷이 열렸으면 다음 후보도 거부됨
+            except Exception as exc:
+                logger.info("%s 후보 %d/%d 예약 실패(%s): %s", service, index + 1, len(candidates), target.target_id, exc)
+                last_error = exc
+                continue
+            if reservation:
+                payload['train'] = candidate['train']
+                payload['summary'] = candidate.get('summary', payload.get('summary', ''))
+                payload['candidate_index'] = index
+                return reservation
+        if last_error is not None:
+            raise last_error
+        return None
+
+    async def cancel_reservation(self, target: TargetItem, reservation) -> bool:
+        """hold_reservation으로 잡은 예약 취소"""
+        service = (target.service or '').upper()
+        if service == 'KTX':
+            return bool(await self._call_upstream('KTX', 'cancel', partial(self.korail.cancel, reservation)))
+        if service == 'SRT':
+            return bool(await self._call_upstream('SRT', 'cancel', partial(self.srt.cancel, reservation)))
+        return False
+
+    @staticmethod
+    def reservation_number(service: str, reservation) -> str:
+        if service == 'KTX':
+            return getattr(reservation, 'rsv_no', None) or getattr(reservation, 'pnr_no', None) or '확인 필요'
+        return getattr(reservation, 'reservation_number', None) or '확인 필요'
+
+    async def _hold_ktx(self, target: TargetItem, payload: Dict[str, Any]):
+        # 스캔에서 고른 좌석/순위를 매긴 등급 그대로 예약 (가격 상한을 확인한 등급에서 벗어나지 않음)
+        return await self._call_upstream(
+            'KTX', 'reserve',
+            partial(self.korail.reserve, payload['train'], **ktx_reserve_kwargs(target, payload))
+        )
+
+    @staticmethod
+    def _party_size(target: TargetItem):
+        """타겟 메타데이터의 (어른, 어린이) 인원 - 없으면 어른 1명"""
+        return party_size(target)
+
+    def _korail_passengers(self, target: TargetItem):
+        """Korail 조회 인원 (조회 시 인원이 열차에 기록되어 예약에도 그대로 사용됨)"""
+        return self._korail_party(*self._party_size(target))
+
+    @staticmethod
+    def _korail_party(adult_count: int, child_count: int):
+        passengers = [AdultPsg(adult_count)] if adult_count else []
+        if child_count:
+            passengers.append(ChildPsg(child_count))
+        return passengers
+
+    def _srt_passengers(self, target: TargetItem):
+        return self._srt_party(*self._party_size(target))
+
+    @staticmethod
+    def _srt_party(adult_count: int, child_count: int):
+        passengers = [Adult(count=adult_count)] if adult_count else []
+        if child_count:
             passengers.append(Child(count=child_count))
+        return passengers
 
-        seat_pref = str(target.metadata.get('seat', 'GENERAL_FIRST')).upper()
-        seat_map = {
-            'SPECIAL': SeatType.SPECIAL_FIRST,
-            'SPECIAL_ONLY': SeatType.SPECIAL_ONLY,
-            'GENERAL_ONLY': SeatType.GENERAL_ONLY,
-            'GENERAL_FIRST': SeatType.GENERAL_FIRST,
-        }
-        seat_type = seat_map.get(seat_pref, SeatType.GENERAL_FIRST)
-        window_pref = bool(target.metadata.get('window_seat', False))
+    async def _hold_srt(self, target: TargetItem, payload: Dict[str, Any]):
+        passengers = self._srt_passengers(target)
+        return await self._call_upstream(
+            'SRT', 'reserve',
+            partial(self.srt.reserve, payload['train'], **srt_reserve_kwargs(target, payload, passengers))
+        )
 
-        loop = asyncio.get_event_loop()
-        try:
-            reservation = await loop.run_in_executor(
-                None,
-                partial(
-                    self.srt.reserve,
-                    train,
-                    passengers=passengers or None,
-                    special_seat=seat_type,
-                    window_seat=window_pref
-                )
-            )
-            if reservation:
-                reservation_id = getattr(reservation, 'reservation_number', None)
-                summary = payload.get('summary', '')
-                message = (
-                    "✅ SRT 자동 예매 성공\n"
-                    f"{summary}\n"
-                    f"예약번호: {reservation_id or '확인 필요'}"
-                )
-                if bot:
-                    await bot.send_message(chat_id=target.chat_id, text=message)
-                return True
-        except Exception as exc:
-            logger.warning("SRT 자동 예매 실패(%s): %s", target.target_id, exc)
-            if bot:
-                try:
-                    await bot.send_message(chat_id=target.chat_id, text=f"SRT 자동 예매 실패: {exc}")
-                except Exception:
-                    logger.debug("SRT 실패 알림 전송 실패 - chat %s", target.chat_id)
-        return False
     def search_and_reserve(self, dep, arr, date, time, service, chat_id, context):
         """예약 프로세스 시작"""
-        self.status_manager.start_reservation(chat_id)
+        session = self.sessions.start(chat_id)
         loop = asyncio.get_event_loop()
-        self.reservation_task = loop.create_task(
-            self._reserve_process(dep, arr, date, time, service, chat_id, context)
+        session.task = loop.create_task(
+            self._reserve_process(dep, arr, date, time, service, chat_id, context, session)
         )
 
-    async def _reserve_process(self, dep, arr, date, time, service, chat_id, context):
+    async def _reserve_process(self, dep, arr, date, time, service, chat_id, context, session):
         try:
             if service == 'KTX':
                 return await self.reserve_ktx(dep, arr, date, time, chat_id, context)
@@ -754,36 +936,38 @@ class TrainReservation:
                 return "잘못된 열차 서비스 선택입니다."
         except asyncio.CancelledError:
             logger.info("예약 프로세스가 취소되었습니다.")
-            await context.bot.send_message(chat_id=chat_id, text="예약 프로세스가 취소되었습니다.")
+            await self._notify(context, chat_id=chat_id, text="예약 프로세스가 취소되었습니다.")
             raise
         finally:
-            self.status_manager.cleanup()
+            self.sessions.finish(session)
+
+    def stop_reservation_task(self, chat_id) -> bool:
+        """채팅의 예약 태스크 중단 - 실행 중이던 예약이 있었으면 True"""
+        return self.sessions.stop(chat_id)
 
-    def stop_reservation_task(self):
-        if self.reservation_task:
-            self.reservation_task.cancel()
-            self.reservation_task = None
+    def _stop_event(self, chat_id) -> asyncio.Event:
+        session = self.sessions.get(chat_id)
+        return session.stop_event if session is not None else asyncio.Event()
 
     async def reserve_ktx(self, dep, arr, date, time, chat_id, context):
         total_attempt_count = 0
         loop = asyncio.get_event_loop()
+        stop_event = self._stop_event(chat_id)
 
-        while not self.status_manager.stop_event.is_set():
+        while not stop_event.is_set():
             for _ in range(self.ATTEMPTS_PER_CYCLE):
-                if self.status_manager.stop_event.is_set():
+                if stop_event.is_set():
                     logger.info("KTX 예약 중단 요청 감지")
                     return "사용자 요청으로 예약이 중단되었습니다."
 
                 total_attempt_count += 1
+                await self.single_booking_limiter.acquire()
 
                 # 500회마다 로그인 상태 체크 및 재로그인 (약 8-10분마다)
                 if total_attempt_count % 500 == 0:
                     logger.info(f"KTX 500회 도달, 정기 재로그인 진행 (시도 #{total_attempt_count})")
                     try:
-                        korail_user = os.environ.get('KORAIL_USER')
-                        korail_pass = os.environ.get('KORAIL_PASS')
-                        self.korail = Korail()
-                        self.korail.login(korail_user.strip(), korail_pass.strip())
+                        self._relogin('KTX')
                         logger.info("KTX 정기 재로그인 완료")
                         await asyncio.sleep(2.0)
                     except Exception as login_err:
@@ -800,7 +984,8 @@ class TrainReservation:
                     
                     if not trains:
                         logger.warning(f"검색된 열차 없음")
-                        await context.bot.send_message(
+                        await self._notify(
+                            context,
                             chat_id=chat_id,
                             text="검색된 열차가 없습니다."
                         )
@@ -885,7 +1070,7 @@ class TrainReservation:
                                 f"도착: {arr} ({train.arv_time[:2]}:{train.arv_time[2:4]})\n"
                                 f"예약번호: {reservation.rsv_no}"
                             )
-                            await context.bot.send_message(chat_id=chat_id, text=success_msg)
+                            await self._notify(context, chat_id=chat_id, text=success_msg)
 
                             # 예약 정보 반환 (결제 처리를 위해)
                             reservation_info = {
@@ -911,10 +1096,7 @@ class TrainReservation:
 
                             # 세션 재설정
                             try:
-                                korail_user = os.environ.get('KORAIL_USER')
-                                korail_pass = os.environ.get('KORAIL_PASS')
-                                self.korail = Korail()
-                                self.korail.login(korail_user.strip(), korail_pass.strip())
+                                self._relogin('KTX')
                                 logger.info("KTX 세션 재설정 완료")
                             except Exception as login_err:
                                 logger.error(f"KTX 세션 재설정 실패: {repr(login_err)}")
@@ -923,10 +1105,7 @@ class TrainReservation:
                             # 로그인 관련 오류인 경우 세션 재설정 후 재시도
                             logger.warning(f"KTX 로그인 오류 발생, 세션 재설정 후 재시도: {error_message}")
                             try:
-                                korail_user = os.environ.get('KORAIL_USER')
-                                korail_pass = os.environ.get('KORAIL_PASS')
-                                self.korail = Korail()
-                                self.korail.login(korail_user.strip(), korail_pass.strip())
+                                self._relogin('KTX')
                                 logger.info("KTX 세션 재설정 완료")
                                 await asyncio.sleep(5.0)
                             except Exception as login_err:
@@ -949,10 +1128,7 @@ class TrainReservation:
 
                         # 세션 재설정
                         try:
-                            korail_user = os.environ.get('KORAIL_USER')
-                            korail_pass = os.environ.get('KORAIL_PASS')
-                            self.korail = Korail()
-                            self.korail.login(korail_user.strip(), korail_pass.strip())
+                            self._relogin('KTX')
                             logger.info("KTX 세션 재설정 완료")
                         except Exception as login_err:
                             logger.error(f"KTX 세션 재설정 실패: {repr(login_err)}")
@@ -961,10 +1137,7 @@ class TrainReservation:
                         # 로그인 관련 오류인 경우 세션 재설정 후 재시도
                         logger.warning(f"KTX 로그인 오류 발생, 세션 재설정 후 재시도: {error_str}")
                         try:
-                            korail_user = os.environ.get('KORAIL_USER')
-                            korail_pass = os.environ.get('KORAIL_PASS')
-                            self.korail = Korail()
-                            self.korail.login(korail_user.strip(), korail_pass.strip())
+                            self._relogin('KTX')
                             logger.info("KTX 세션 재설정 완료")
                             await asyncio.sleep(5.0)
                         except Exception as login_err:
@@ -974,7 +1147,7 @@ class TrainReservation:
                         # 일반적인 오류는 짧은 대기 시간
                         await asyncio.sleep(self.RATE_LIMIT_DELAY)
             
-            if self.status_manager.stop_event.is_set():
+            if stop_event.is_set():
                 return "사용자 요청으로 예약이 중단되었습니다."
             
             logger.info(f"KTX 예약 진행 중... (시도 횟수: {total_attempt_count}회)")
@@ -985,24 +1158,23 @@ class TrainReservation:
     async def reserve_srt(self, dep, arr, date, time, chat_id, context):
         total_attempt_count = 0
         loop = asyncio.get_event_loop()
+        stop_event = self._stop_event(chat_id)
         
         # 무한 루프로 변경 (예약 성공할 때까지 계속 시도)
-        while not self.status_manager.stop_event.is_set():
+        while not stop_event.is_set():
             for _ in range(self.ATTEMPTS_PER_CYCLE):
-                if self.status_manager.stop_event.is_set():
+                if stop_event.is_set():
                     logger.info("SRT 예약 중단 요청 감지")
                     return "사용자 요청으로 예약이 중단되었습니다."
 
                 total_attempt_count += 1
+                await self.single_booking_limiter.acquire()
 
                 # 500회마다 로그인 상태 체크 및 재로그인 (약 8-10분마다)
                 if total_attempt_count % 500 == 0:
                     logger.info(f"SRT 500회 도달, 정기 재로그인 진행 (시도 #{total_attempt_count})")
                     try:
-                        srt_user = os.environ.get('SRT_USER_num')
-                        srt_pass = os.environ.get('SRT_PASS')
-                        self.srt = SRT(srt_user.strip(), srt_pass.strip())
-                        self.srt.login()
+                        self._relogin('SRT')
                         logger.info("SRT 정기 재로그인 완료")
                         await asyncio.sleep(2.0)
                     except Exception as login_err:
@@ -1061,7 +1233,7 @@ class TrainReservation:
                                 f"도착: {arr} ({train.arr_time[:2]}:{train.arr_time[2:4]})\n"
                                 f"예약번호: {reservation.reservation_number}"
                             )
-                            await context.bot.send_message(chat_id=chat_id, text=success_msg)
+                            await self._notify(context, chat_id=chat_id, text=success_msg)
                             
                             # 예약 정보 반환 (결제 처리를 위해)
                             reservation_info = {
@@ -1087,10 +1259,7 @@ class TrainReservation:
 
                             # 세션 재설정
                             try:
-                                srt_user = os.environ.get('SRT_USER_num')
-                                srt_pass = os.environ.get('SRT_PASS')
-                                self.srt = SRT(srt_user.strip(), srt_pass.strip())
-                                self.srt.login()
+                                self._relogin('SRT')
                                 logger.info("SRT 세션 재설정 완료")
                             except Exception as login_err:
                                 logger.error(f"SRT 세션 재설정 실패: {repr(login_err)}")
@@ -1099,10 +1268,7 @@ class TrainReservation:
                             # 로그인 관련 오류인 경우 세션 재설정 후 재시도
                             logger.warning(f"SRT 로그인 오류 발생, 세션 재설정 후 재시도: {error_message}")
                             try:
-                                srt_user = os.environ.get('SRT_USER_num')
-                                srt_pass = os.environ.get('SRT_PASS')
-                                self.srt = SRT(srt_user.strip(), srt_pass.strip())
-                                self.srt.login()
+                                self._relogin('SRT')
                                 logger.info("SRT 세션 재설정 완료")
                                 await asyncio.sleep(5.0)
                             except Exception as login_err:
@@ -1125,10 +1291,7 @@ class TrainReservation:
 
                         # 세션 재설정
                         try:
-                            srt_user = os.environ.get('SRT_USER_num')
-                            srt_pass = os.environ.get('SRT_PASS')
-                            self.srt = SRT(srt_user.strip(), srt_pass.strip())
-                            self.srt.login()
+                            self._relogin('SRT')
                             logger.info("SRT 세션 재설정 완료")
                         except Exception as login_err:
                             logger.error(f"SRT 세션 재설정 실패: {repr(login_err)}")
@@ -1137,10 +1300,7 @@ class TrainReservation:
                         # 로그인 관련 오류인 경우 세션 재설정 후 재시도
                         logger.warning(f"SRT 로그인 오류 발생, 세션 재설정 후 재시도: {error_str}")
                         try:
-                            srt_user = os.environ.get('SRT_USER_num')
-                            srt_pass = os.environ.get('SRT_PASS')
-                            self.srt = SRT(srt_user.strip(), srt_pass.strip())
-                            self.srt.login()
+                            self._relogin('SRT')
                             logger.info("SRT 세션 재설정 완료")
                             await asyncio.sleep(5.0)
                         except Exception as login_err:
@@ -1150,7 +1310,7 @@ class TrainReservation:
                         # 일반적인 오류는 짧은 대기 시간
                         await asyncio.sleep(self.RATE_LIMIT_DELAY)
             
-            if self.status_manager.stop_event.is_set():
+            if stop_event.is_set():
                 return "사용자 요청으로 예약이 중단되었습니다."
             
             logger.info(f"SRT 예약 진행 중... (시도 횟수: {total_attempt_count}회)")
@@ -1192,16 +1352,17 @@ class TrainReservation:
             reply_markup=reply_markup
         )
 
-    async def search_and_show_trains(self, dep, arr, date, time, service, chat_id, context):
-        """열차 검색 및 목록 표시"""
+    async def search_and_show_trains(self, dep, arr, date, time, service, chat_id, context,
+                                     cache_ttl: Optional[float] = None):
+        """열차 검색 및 목록 표시 (cache_ttl초 안에 같은 조건을 조회한 결과가 있으면 재사용)"""
         logger.info(f"열차 검색 시작: {dep} → {arr}, {date}, {time}, {service}")
 
         try:
             # 서비스에 따라 검색
             if service == 'KTX':
-                trains = await self._search_ktx_trains(dep, arr, date, time)
+                trains = await self._search_ktx_trains(dep, arr, date, time, ttl=cache_ttl)
             elif service == 'SRT':
-                trains = await self._search_srt_trains(dep, arr, date, time)
+                trains = await self._search_srt_trains(dep, arr, date, time, ttl=cache_ttl)
             else:
                 await context.bot.send_message(chat_id=chat_id, text="❌ 지원하지 않는 서비스입니다.")
                 return
@@ -1257,14 +1418,13 @@ class TrainReservation:
             logger.error(f"열차 검색 중 오류: {str(e)}")
             await context.bot.send_message(chat_id=chat_id, text=f"❌ 열차 검색 중 오류가 발생했습니다: {str(e)}")
 
-    async def _search_ktx_trains(self, dep, arr, date, time):
+    async def _search_ktx_trains(self, dep, arr, date, time, ttl: Optional[float] = None):
         """KTX 열차 검색"""
-        loop = asyncio.get_event_loop()
-        trains = await loop.run_in_executor(None, partial(
-            self.korail.search_train,
+        trains = await self._korail_search(
             dep, arr, date, time,
-            include_soldout=True  # 매진된 열차도 포함
-        ))
+            include_soldout=True,  # 매진된 열차도 포함
+            ttl=SEARCH_CACHE_BROWSE_TTL if ttl is None else ttl,
+        )
 
         # 지정 시간 이후의 열차만 필터링
         target_time_str = time  # HHMMSS 형식
@@ -1320,9 +1480,9 @@ class TrainReservation:
             ))
             return
 
-        # StatusManager 상태 설정
-        self.status_manager.start_reservation(chat_id)
-        logger.info(f"예약 상태 관리 시작 - chat_id: {chat_id}")
+        # 채팅별 예약 세션 시작
+        session = self.sessions.start(chat_id)
+        logger.info(f"예약 세션 시작 - chat_id: {chat_id}")
 
         # 예약 옵션 설정
         seat_type = user_data.get('seat_type', SeatType.GENERAL_FIRST)
@@ -1336,11 +1496,12 @@ class TrainReservation:
             task = asyncio.create_task(self._reserve_selected_train_async(
                 selected_train, seat_type, window_seat, user_data, chat_id, context
             ))
-            self.reservation_task = task
+            session.task = task
             logger.info("비동기 예약 태스크 생성 및 시작")
 
             # 태스크 예외 처리를 위한 콜백 추가
             def task_done_callback(task):
+                self.sessions.finish(session)
                 try:
                     result = task.result()
                     logger.info(f"예약 태스크 완료: {result}")
@@ -1373,40 +1534,39 @@ class TrainReservation:
         """선택된 열차 비동기 예약"""
         attempt_count = 0
         logger.info("비동기 예약 프로세스 시작")
+        stop_event = self._stop_event(chat_id)
 
-        while not self.status_manager.stop_event.is_set():  # /stop 명령어로만 중단
+        while not stop_event.is_set():  # /stop 명령어로만 중단
             try:
                 attempt_count += 1
+                await self.single_booking_limiter.acquire()
                 logger.info(f"예약 시도 #{attempt_count}")
 
                 # 500회마다 로그인 상태 체크 및 재로그인 (약 8-10분마다)
                 if attempt_count % 500 == 0:
                     logger.info(f"500회 도달, 로그인 상태 체크 및 재로그인 진행 (시도 #{attempt_count})")
-                    await context.bot.send_message(
+                    await self._notify(
+                        context,
                         chat_id=chat_id,
                         text=f"🔄 정기 로그인 갱신 중... (시도 #{attempt_count}회)"
                     )
                     try:
                         if hasattr(selected_train, 'train_no'):  # KTX
-                            korail_user = os.environ.get('KORAIL_USER')
-                            korail_pass = os.environ.get('KORAIL_PASS')
-                            self.korail = Korail()
-                            self.korail.login(korail_user.strip(), korail_pass.strip())
+                            self._relogin('KTX')
                             logger.info("KTX 정기 재로그인 완료")
                         else:  # SRT
-                            srt_user = os.environ.get('SRT_USER_num')
-                            srt_pass = os.environ.get('SRT_PASS')
-                            self.srt = SRT(srt_user.strip(), srt_pass.strip())
-                            self.srt.login()
+                            self._relogin('SRT')
                             logger.info("SRT 정기 재로그인 완료")
-                        await context.bot.send_message(
+                        await self._notify(
+                            context,
                             chat_id=chat_id,
                             text="✅ 로그인 갱신 완료, 예약 시도 계속합니다"
                         )
                         await asyncio.sleep(2.0)  # 재로그인 후 잠시 대기
                     except Exception as login_err:
                         logger.error(f"정기 재로그인 실패: {str(login_err)}")
-                        await context.bot.send_message(
+                        await self._notify(
+                            context,
                             chat_id=chat_id,
                             text="⚠️ 로그인 갱신 실패, 계속 시도합니다"
                         )
@@ -1445,7 +1605,7 @@ class TrainReservation:
                                 f"도착: {user_data['destination']} ({selected_train.arv_time[:2]}:{selected_train.arv_time[2:4]})\n"
                                 f"예약번호: {rsv_no}"
                             )
-                            await context.bot.send_message(chat_id=chat_id, text=success_msg)
+                            await self._notify(context, chat_id=chat_id, text=success_msg)
 
                             # 결제 진행
                             reservation_info = {
@@ -1466,7 +1626,7 @@ class TrainReservation:
                                 f"도착: {user_data['destination']} ({selected_train.arv_time[:2]}:{selected_train.arv_time[2:4]})\n"
                                 f"예약번호: 속성 오류로 확인 불가"
                             )
-                            await context.bot.send_message(chat_id=chat_id, text=success_msg)
+                            await self._notify(context, chat_id=chat_id, text=success_msg)
 
                             # 가짜 예약 정보로 결제 프로세스 진행
                             reservation_info = {
@@ -1504,7 +1664,7 @@ class TrainReservation:
                             f"도착: {user_data['destination']} ({selected_train.arr_time.strftime('%H:%M')})\n"
                             f"예약번호: {reservation.reservation_number}"
                         )
-                        await context.bot.send_message(chat_id=chat_id, text=success_msg)
+                        await self._notify(context, chat_id=chat_id, text=success_msg)
 
                         # 결제 진행
                         reservation_info = {
@@ -1519,7 +1679,7 @@ class TrainReservation:
                 # 주기적으로 사용자에게 진행 상황 알림
                 if attempt_count % 30 == 0:  # 30회마다 (약 30초마다)
                     progress_msg = f"🔄 예약 시도 중... (시도 #{attempt_count}회)\n계속 시도하고 있습니다. 중단하려면 /stop 명령어를 사용하세요."
-                    await context.bot.send_message(chat_id=chat_id, text=progress_msg)
+                    await self._notify_progress(context, chat_id, progress_msg)
 
                 # 1분에 60회 이내로 제한 (약 1초에 1회)
                 await asyncio.sleep(1.0)
@@ -1538,7 +1698,7 @@ class TrainReservation:
                         f"도착: {user_data['destination']} ({selected_train.arv_time[:2]}:{selected_train.arv_time[2:4]})\n"
                         f"기존 예약이 있어 중복 예약이 불가능한 상태입니다."
                     )
-                    await context.bot.send_message(chat_id=chat_id, text=success_msg)
+                    await self._notify(context, chat_id=chat_id, text=success_msg)
 
                     # 가짜 예약 정보로 결제 프로세스 진행
                     reservation_info = {
@@ -1566,16 +1726,10 @@ class TrainReservation:
                     try:
                         # 세션 재설정
                         if hasattr(selected_train, 'train_no'):  # KTX
-                            korail_user = os.environ.get('KORAIL_USER')
-                            korail_pass = os.environ.get('KORAIL_PASS')
-                            self.korail = Korail()
-                            self.korail.login(korail_user.strip(), korail_pass.strip())
+                            self._relogin('KTX')
                             logger.info("KTX 세션 재설정 완료")
                         else:  # SRT
-                            srt_user = os.environ.get('SRT_USER_num')
-                            srt_pass = os.environ.get('SRT_PASS')
-                            self.srt = SRT(srt_user.strip(), srt_pass.strip())
-                            self.srt.login()
+                            self._relogin('SRT')
                             logger.info("SRT 세션 재설정 완료")
                         await asyncio.sleep(5.0)
                         continue
@@ -1587,7 +1741,8 @@ class TrainReservation:
                     # 기타 오류도 재시도 (단, 경고 메시지 출력)
                     logger.warning(f"예상치 못한 오류 발생, 재시도 중: {error_str}")
                     if attempt_count % 10 == 0:  # 10회마다 사용자에게 알림
-                        await context.bot.send_message(
+                        await self._notify(
+                            context,
                             chat_id=chat_id,
                             text=f"⚠️ 예약 시도 중 오류가 발생했지만 계속 시도하고 있습니다 (시도 #{attempt_count})"
                         )
@@ -1597,14 +1752,13 @@ class TrainReservation:
         # 이 지점에 도달하면 /stop에 의해 중단된 것임
         logger.info("예약 프로세스가 사용자에 의해 중단되었습니다.")
 
-    async def _search_srt_trains(self, dep, arr, date, time):
+    async def _search_srt_trains(self, dep, arr, date, time, ttl: Optional[float] = None):
         """SRT 열차 검색"""
-        loop = asyncio.get_event_loop()
-        trains = await loop.run_in_executor(None, partial(
-            self.srt.search_train,
+        trains = await self._srt_search(
             dep, arr, date, time,
-            available_only=True  # 잔여석 있는 것만
-        ))
+            available_only=True,  # 잔여석 있는 것만
+            ttl=SEARCH_CACHE_BROWSE_TTL if ttl is None else ttl,
+        )
 
         # 지정 시간 이후의 열차만 필터링
         target_time_str = time  # HHMMSS 형식
@@ -1722,115 +1876,6 @@ class TrainReservation:
             reply_markup=reply_markup
         )
 
-def create_calendar(year=None, month=None):
-    """
-    지정된 년월에 대한 달력 인라인 키보드를 생성합니다.
-    """
-    if year is None or month is None:
-        now = datetime.now()
-        year = now.year
-        month = now.month
-
-    # 달력 데이터 생성
-    cal = calendar.monthcalendar(year, month)
-
-    # 키보드 생성
-    keyboard = []
-
-    # 월/년 헤더
-    header = f"{year}년 {month}월"
-    keyboard.append([InlineKeyboardButton(header, callback_data="ignore")])
-
-    # 요일 헤더
-    weekday_header = [InlineKeyboardButton(day, callback_data="ignore") for day in DAYS_OF_WEEK]
-    keyboard.append(weekday_header)
-
-    # 날짜 버튼들
-    for week in cal:
-        week_buttons = []
-        for day in week:
-            if day == 0:
-                # 빈 칸
-                week_buttons.append(InlineKeyboardButton(" ", callback_data="ignore"))
-            else:
-                date_str = f"{day:02d}"
-                callback_data = f"date_{year}{month:02d}{day:02d}"
-                week_buttons.append(InlineKeyboardButton(str(day), callback_data=callback_data))
-        keyboard.append(week_buttons)
-
-    # 내비게이션 버튼 (이전/다음 달, 오늘/내일/모레)
-    nav_row = [
-        InlineKeyboardButton("◀ 이전", callback_data=f"cal_{year}_{month-1 if month > 1 else 12}_{year if month > 1 else year-1}"),
-        InlineKeyboardButton("오늘", callback_data="date_today"),
-        InlineKeyboardButton("내일", callback_data="date_tomorrow"),
-        InlineKeyboardButton("모레", callback_data="date_day_after"),
-        InlineKeyboardButton("다음 ▶", callback_data=f"cal_{year}_{month+1 if month < 12 else 1}_{year if month < 12 else year+1}")
-    ]
-    keyboard.append(nav_row)
-
-    return InlineKeyboardMarkup(keyboard)
-
-def create_time_selector(selected_hour=None, selected_minute=None):
-    """
-    시간 선택을 위한 인터페이스를 생성합니다.
-    선택된 시간/분을 강조 표시합니다.
-    """
-    keyboard = []
-
-    # 현재 선택 상태 표시
-    current_time = f"선택된 시간: {selected_hour or '??'}:{selected_minute or '??'}"
-    keyboard.append([InlineKeyboardButton(current_time, callback_data="ignore")])
-
-    # 시간 선택 (1시간 단위, 4열로 배치)
-    keyboard.append([InlineKeyboardButton("🕐 시간 선택", callback_data="ignore")])
-    hour_row = []
-    for hour in range(6, 22):  # 06:00 ~ 21:00
-        hour_text = f"{hour:02d}"
-        if selected_hour == hour:
-            hour_text = f"✅ {hour_text}"
-        hour_row.append(InlineKeyboardButton(hour_text, callback_data=f"time_hour_{hour:02d}"))
-        if len(hour_row) == 4:
-            keyboard.append(hour_row)
-            hour_row = []
-    if hour_row:
-        keyboard.append(hour_row)
-
-    # 분 선택 (5분 단위, 6열로 배치)
-    keyboard.append([InlineKeyboardButton("🕑 분 선택", callback_data="ignore")])
-    minute_row = []
-    for minute in range(0, 60, 5):
-        minute_text = f"{minute:02d}"
-        if selected_minute == minute:
-            minute_text = f"✅ {minute_text}"
-        minute_row.append(InlineKeyboardButton(minute_text, callback_data=f"time_minute_{minute:02d}"))
-        if len(minute_row) == 6:
-            keyboard.append(minute_row)
-            minute_row = []
-    if minute_row:
-        keyboard.append(minute_row)
-
-    # 확인/취소 버튼
-    keyboard.append([
-        InlineKeyboardButton("✅ 확인", callback_data="time_confirm"),
-        InlineKeyboardButton("🔄 초기화", callback_data="time_reset"),
-        InlineKeyboardButton("❌ 취소", callback_data="time_cancel")
-    ])
-
-    return InlineKeyboardMarkup(keyboard)
-
-def create_quick_routes():
-    """
-    빠른 경로 선택 키보드를 생성합니다.
-    """
-    keyboard = [
-        [InlineKeyboardButton("🚄 KTX: 서울 → 부산", callback_data="route_ktx_seoul_busan")],
-        [InlineKeyboardButton("🚄 KTX: 부산 → 서울", callback_data="route_ktx_busan_seoul")],
-        [InlineKeyboardButton("🚄 SRT: 서울(수서) → 부산", callback_data="route_seoul_busan")],
-        [InlineKeyboardButton("🚄 SRT: 부산 → 서울(수서)", callback_data="route_busan_seoul")],
-        [InlineKeyboardButton("직접 입력", callback_data="route_custom")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
 # TrainReservation 객체 생성 (로그인 포함)
 try:
     logger.info("TrainReservation 객체 생성 중...")
@@ -1844,12 +1889,80 @@ except Exception as e:
 
 # 파이프라인 시스템 초기화
 logger.info("파이프라인 시스템 초기화 중...")
-target_registry = TargetRegistry()
-reservation_executor = ReservationExecutor(train_reservation, target_registry)
-scanner_worker = ScannerWorker(target_registry, reservation_executor, train_reservation)
+# SCANNER_SHARDS가 2 이상이면 스캔/자동 예매는 chat_id 해시로 나눈 워커 프로세스에서 실행
+SCANNER_SHARDS = int(os.getenv('SCANNER_SHARDS', '0'))
+
 
-# TrainReservation과 파이프라인 연결
-train_reservation.attach_pipeline(target_registry, scanner_worker, reservation_executor)
+# 그룹 예매 방식: best(기본, 최우선 코스 하나만 예약)
+# speculative는 선택 사항 - 좌석 있는 코스를 모두 동시에 예약 후 최우선만 유지 (나머지 예약은 취소하므로 예약/취소 요청이 늘어남)
+GROUP_RESERVATION_STRATEGY = os.getenv('GROUP_RESERVATION_STRATEGY', 'best').lower()
+
+
+def create_group_strategy(train_reservation, registry) -> Optional[SpeculativeGroupReservation]:
+    if GROUP_RESERVATION_STRATEGY == 'speculative':
+        return SpeculativeGroupReservation(train_reservation, registry)
+    return None
+
+
+def create_pipeline_workers(train_reservation, registry, scanner) -> list:
+    """스캐너/실행기와 함께 시작하고 멈추는 보조 워커 (start(loop)/stop()/is_running())"""
+    seat_watcher = SeatWatcher(
+        registry,
+        scanner.dispatch,
+        train_reservation,
+        TokenBucket(rate=float(os.getenv('SEAT_WATCH_RATE', '4.0'))),
+        poll_interval=float(os.getenv('SEAT_WATCH_INTERVAL', '2')),
+        max_trains=int(os.getenv('SEAT_WATCH_MAX_TRAINS', '3')),
+    )
+    bus = train_reservation.availability_bus
+    return [
+        # metadata['seat_watch'] KTX 타겟의 좌석 단위 취소표 감지
+        seat_watcher,
+        # 좌석이 열리면 같은 노선/날짜의 다른 타겟도 다음 주기를 기다리지 않고 바로 스캔
+        AvailabilitySubscriber(bus, lambda event: registry.expedite(*event.route), kinds=OPEN_KINDS, name='expedite'),
+        AvailabilitySubscriber(bus, train_reservation.availability_stats.record, name='stats'),
+    ]
+
+
+def create_shard_runtime(shard_index: int, outbox, on_chat_changed) -> ShardRuntime:
+    """샤드 워커 프로세스에서 호출 - 워커가 이 모듈을 import하며 로그인한 train_reservation 사용"""
+    store = open_target_store_from_env(suffix=f".shard{shard_index}")
+    return build_shard_runtime(train_reservation, store, outbox, on_chat_changed,
+                               group_strategy_factory=create_group_strategy,
+                               workers_factory=create_pipeline_workers)
+
+
+scanner_worker: Optional[ScannerWorker] = None
+pipeline_workers: list = []
+reservation_executor: Optional[ReservationExecutor] = None
+lease_keeper: Optional[LeaseKeeper] = None
+if SCANNER_SHARDS > 1:
+    # 타겟 저장소는 워커별로 TARGET_STORE_PATH.shardN에 기록
+    target_registry = ShardCoordinator(SCANNER_SHARDS, create_shard_runtime)
+else:
+    # TARGET_STORE_PATH가 설정되면 타겟을 WAL/스냅샷으로 저장하고 재시작 시 복구
+    # LEASE_DB_PATH가 설정되면 같은 DB를 쓰는 인스턴스들이 타겟을 나눠 임대해 스캔
+    lease_store = open_lease_store_from_env()
+    target_registry = TargetRegistry(store=open_target_store_from_env(), lease_store=lease_store)
+    restored_count = target_registry.restore_from_store()
+    if restored_count:
+        logger.info(f"저장된 모니터링 타겟 {restored_count}개 복구")
+    if lease_store is not None:
+        logger.info(f"타겟 임대 저장소 사용: {lease_store.path} (인스턴스 {lease_store.owner})")
+        lease_keeper = LeaseKeeper(lease_store, target_registry)
+    reservation_executor = ReservationExecutor(
+        train_reservation, target_registry,
+        group_strategy=create_group_strategy(train_reservation, target_registry),
+    )
+    scanner_worker = ScannerWorker(target_registry, reservation_executor, train_reservation)
+    pipeline_workers = create_pipeline_workers(train_reservation, target_registry, scanner_worker)
+
+    # TrainReservation과 파이프라인 연결
+    train_reservation.attach_pipeline(target_registry, scanner_worker, reservation_executor)
+
+# 텔레그램 발신 큐 (예약 경로의 알림은 모두 큐를 거쳐 발송)
+telegram_outbox = TelegramOutbox()
+train_reservation.attach_outbox(telegram_outbox)
 logger.info("파이프라인 시스템 초기화 완료")
 
 async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -1914,9 +2027,7 @@ async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     chat_id = update.effective_chat.id
     logger.info(f"Stop 명령어 수신 from user {chat_id}")
 
-    train_reservation.stop_reservation_task()
-
-    if train_reservation.status_manager.stop_reservation(chat_id):
+    if train_reservation.stop_reservation_task(chat_id):
         await update.message.reply_text('예약을 중단합니다. 잠시만 기다려주세요...')
     else:
         await update.message.reply_text('현재 실행 중인 예약이 없습니다.')
@@ -1927,8 +2038,7 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """예약 상태 확인 명령어 처리"""
     chat_id = update.effective_chat.id
 
-    status_info = train_reservation.status_manager._load_status()
-    if status_info and status_info.get('is_running') and str(status_info.get('chat_id')) == str(chat_id):
+    if train_reservation.sessions.is_running(chat_id):
         await update.message.reply_text('🔄 현재 예약이 진행 중입니다. 중단하려면 /stop 명령어를 사용하세요.')
     else:
         await update.message.reply_text('⏹️ 현재 실행 중인 예약이 없습니다.')
@@ -1957,19 +2067,99 @@ async def add_multi_course(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
 💡 팁:
 - 우선순위는 1이 가장 높음
+- 시간에 170000-200000처럼 범위를 쓰면 그 사이 출발 열차를 한 코스로 모니터링
 - 먼저 표가 발견된 시간대로 예매 진행
 - /multi_status로 현재 상태 확인 가능
 - /stop_multi로 다중 코스 모니터링 중단
 """
     await update.message.reply_text(help_text)
 
+
+async def availability_grid(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/grid 출발 도착 날짜 [±일수] [KTX|SRT] - 날짜×시간대 잔여석 표"""
+    args = list(context.args or [])
+    service = 'KTX'
+    if args and args[-1].upper() in ('KTX', 'SRT'):
+        service = args.pop().upper()
+    usage = '사용법: /grid 출발역 도착역 날짜(YYYYMMDD) [±일수, 기본 3] [KTX/SRT]\n예) /grid 서울 부산 20250105 3 SRT'
+    if len(args) not in (3, 4) or len(args[2]) != 8 or not args[2].isdigit() or (len(args) == 4 and not args[3].isdigit()):
+        await update.message.reply_text(usage)
+        return
+    departure, arrival, center = args[:3]
+    days = min(int(args[3]) if len(args) == 4 else 3, 7)
+    try:
+        datetime.strptime(center, '%Y%m%d')  # 20251340 같은 없는 날짜
+    except ValueError:
+        await update.message.reply_text(usage)
+        return
+
+    builder = train_reservation.grid_builder
+    dates = builder.date_range(center, days)
+    if not dates:
+        await update.message.reply_text('❌ 조회할 수 있는 날짜가 없습니다 (지난 날짜).')
+        return
+    message = await update.message.reply_text(f'🔎 {departure}→{arrival} {service} {len(dates)}일 잔여석 조회 중...')
+    grid, stats = await builder.build(service, departure, arrival, dates)
+    text = grid.render(f"📅 {departure}→{arrival} {service} 잔여석")
+    text += f"\n조회 {stats.searched}건 · 캐시 {stats.cached}건 · 실패 {stats.failed}건 · {stats.elapsed:.1f}초"
+    await message.edit_text(text)
+
+
+def format_target_time(target: TargetItem) -> str:
+    text = f"{target.time[:2]}:{target.time[2:4]}"
+    if target.time_end:
+        text += f"~{target.time_end[:2]}:{target.time_end[2:4]}"
+    return text
+
+
+def format_circuit_status(snapshot: Dict[str, Dict[str, Any]]) -> str:
+    """서킷 브레이커 상태를 /multi_status 출력용 문자열로 변환"""
+    if not snapshot:
+        return ""
+    icons = {'closed': '🟢', 'half_open': '🟡', 'open': '🔴'}
+    text = "\n🔌 업스트림 상태\n"
+    for name, info in snapshot.items():
+        line = f"  {icons.get(info['state'], '⚪')} {name} {info['state']} 오류율:{info['failure_rate'] * 100:.0f}%"
+        if info['state'] == 'open':
+            line += f" 재시도:{info['retry_after']:.0f}초 후"
+        text += line + "\n"
+    return text
+
+def format_availability_activity(targets) -> str:
+    """타겟 노선/날짜별 최근 1시간 좌석 변화 이벤트 수 (/multi_status 출력용)"""
+    lines = []
+    for route in dict.fromkeys(((t.service or '').upper(), t.departure, t.arrival, t.date) for t in targets):
+        recent = train_reservation.availability_stats.recent(*route)
+        if not recent:
+            continue
+        service, dep, arr, date = route
+        lines.append(
+            f"  {dep}→{arr} {date[4:6]}/{date[6:]} ({service}) "
+            f"열림 {recent.get(SEAT_OPENED, 0)} · 매진 {recent.get(SEAT_CLOSED, 0)} · 예약대기 {recent.get(STANDBY_OPENED, 0)}"
+        )
+    if not lines:
+        return ""
+    return "\n📈 최근 1시간 좌석 변화\n" + "\n".join(lines) + "\n"
+
+def format_search_cache_status(cache: SearchCache) -> str:
+    """조회 공유 캐시 적중률 (/multi_status 출력용)"""
+    stats = cache.stats
+    if not stats.misses:
+        return ""
+    return (
+        f"🔎 조회 캐시 적중 {stats.hit_rate * 100:.0f}% "
+        f"(캐시 {stats.hits} · 합류 {stats.joined} · 업스트림 {stats.misses})\n"
+    )
+
 async def multi_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """다중 코스 상태 확인"""
     chat_id = update.effective_chat.id
     targets = await target_registry.list_targets(chat_id)
 
     if not targets:
-        await update.message.reply_text('📭 현재 등록된 코스가 없습니다.')
+        await update.message.reply_text(
+            '📭 현재 등록된 코스가 없습니다.\n' + format_circuit_status(train_reservation.circuit_breakers.snapshot())
+        )
         return
 
     # 그룹별로 정리
@@ -1993,7 +2183,7 @@ async def multi_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             mode = "🔍 확인중" if target.scan_only else "🎫 예매중"
             status = "🟢 활성" if target.is_active else "🔴 비활성"
             next_scan = target.next_scan.strftime('%H:%M:%S') if target.next_scan else "대기"
-            status_text += f"  {target.priority}. {target.departure}→{target.arrival} {target.time[:2]}:{target.time[2:4]} ({target.service}) {mode} {status} 다음:{next_scan}\n"
+            status_text += f"  {target.priority}. {target.departure}→{target.arrival} {format_target_time(target)} ({target.service}) {mode} {status} 다음:{next_scan}\n"
         status_text += "\n"
 
     # 개별 코스들
@@ -2003,7 +2193,11 @@ async def multi_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             mode = "🔍 확인중" if target.scan_only else "🎫 예매중"
             status = "🟢 활성" if target.is_active else "🔴 비활성"
             next_scan = target.next_scan.strftime('%H:%M:%S') if target.next_scan else "대기"
-            status_text += f"  {target.departure}→{target.arrival} {target.time[:2]}:{target.time[2:4]} ({target.service}) {mode} {status} 다음:{next_scan}\n"
+            status_text += f"  {target.departure}→{target.arrival} {format_target_time(target)} ({target.service}) {mode} {status} 다음:{next_scan}\n"
+
+    status_text += format_availability_activity(targets)
+    status_text += format_circuit_status(train_reservation.circuit_breakers.snapshot())
+    status_text += format_search_cache_status(train_reservation.search_cache)
 
     await update.message.reply_text(status_text)
 
@@ -2047,8 +2241,13 @@ async def handle_multi_course_input(update: Update, context: ContextTypes.DEFAUL
                 await update.message.reply_text(f'❌ 잘못된 날짜 형식: {date} (YYYYMMDD 형식 필요)')
                 return
 
-            if len(time) != 6 or not time.isdigit():
-                await update.message.reply_text(f'❌ 잘못된 시간 형식: {time} (HHMMSS 형식 필요)')
+            # HHMMSS-HHMMSS 형식이면 그 사이에 출발하는 모든 열차를 한 타겟으로 조회
+            time, _, time_end = time.partition('-')
+            if any(len(t) != 6 or not t.isdigit() for t in filter(None, (time, time_end))) or not time:
+                await update.message.reply_text(f'❌ 잘못된 시간 형식: {parts[3]} (HHMMSS 또는 HHMMSS-HHMMSS 형식 필요)')
+                return
+            if time_end and time_end < time:
+                await update.message.reply_text(f'❌ 시간 창의 끝이 시작보다 빠릅니다: {parts[3]}')
                 return
 
             if service.upper() not in ['KTX', 'SRT']:
@@ -2067,6 +2266,7 @@ async def handle_multi_course_input(update: Update, context: ContextTypes.DEFAUL
                 'arrival': arrival,
                 'date': date,
                 'time': time,
+                'time_end': time_end or None,
                 'priority': priority_num
             })
 
@@ -2128,6 +2328,469 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         except Exception:
             pass
 
+# 인라인 버튼 콜백 라우터 (기능별로 핸들러 등록)
+callback_router = CallbackRouter()
+
+
+def _train_list_text(header: str, available_trains) -> str:
+    text = header
+    for i, train_info in enumerate(available_trains):
+        text += f"[{i+1}] {train_info['display_text'].replace(chr(10), ' | ')}\n\n"
+    return text
+
+
+def _multi_select_markup(train_count: int, selected_set) -> InlineKeyboardMarkup:
+    """다중 모니터링 체크박스 키보드"""
+    keyboard = []
+    row = []
+    for i in range(train_count):
+        button_text = f"✅ {i+1}번" if i in selected_set else f"☐ {i+1}번"
+        row.append(InlineKeyboardButton(button_text, callback_data=f"multi_toggle_{i}"))
+        if len(row) == 3:  # 3열로 배치
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+
+    # 하단 버튼들
+    start_text = f"✅ 선택완료 ({len(selected_set)}개 모니터링 시작)" if selected_set else "✅ 선택완료 (모니터링 시작)"
+    keyboard.append([
+        InlineKeyboardButton(start_text, callback_data="multi_start"),
+        InlineKeyboardButton("🔙 단일 모드로", callback_data="single_booking_mode")
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+
+# 달력 관련 콜백
+@callback_router.prefix("cal_", parse_calendar)
+async def on_calendar_nav(update: Update, context: ContextTypes.DEFAULT_TYPE, year_month) -> None:
+    """달력 내비게이션: cal_year_month_year"""
+    year, month = year_month
+    await update.callback_query.edit_message_reply_markup(reply_markup=create_calendar(year, month))
+
+
+@callback_router.prefix("date_", parse_date)
+async def on_date_selected(update: Update, context: ContextTypes.DEFAULT_TYPE, choice: DateChoice) -> None:
+    context.user_data['date'] = choice.value.strftime("%Y%m%d")
+
+    # 시간 선택기로 이동
+    time_markup = create_time_selector()
+    await update.callback_query.edit_message_text(f"📅 {choice.label} 선택됨\n출발 시간을 선택해주세요:", reply_markup=time_markup)
+
+
+# 시간 관련 콜백
+@callback_router.prefix("time_hour_", parse_int)
+async def on_time_hour(update: Update, context: ContextTypes.DEFAULT_TYPE, hour: int) -> None:
+    context.user_data['selected_hour'] = hour
+    # 분 선택 유지하면서 시간 업데이트
+    selected_minute = context.user_data.get('selected_minute')
+    time_markup = create_time_selector(hour, selected_minute)
+    await update.callback_query.edit_message_reply_markup(reply_markup=time_markup)
+
+
+@callback_router.prefix("time_minute_", parse_int)
+async def on_time_minute(update: Update, context: ContextTypes.DEFAULT_TYPE, minute: int) -> None:
+    context.user_data['selected_minute'] = minute
+    # 시간 선택 유지하면서 분 업데이트
+    selected_hour = context.user_data.get('selected_hour')
+    time_markup = create_time_selector(selected_hour, minute)
+    await update.callback_query.edit_message_reply_markup(reply_markup=time_markup)
+
+
+@callback_router.exact("time_confirm")
+async def on_time_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    query = update.callback_query
+    selected_hour = context.user_data.get('selected_hour')
+    selected_minute = context.user_data.get('selected_minute')
+
+    if selected_hour is None or selected_minute is None:
+        await query.answer("시간과 분을 모두 선택해주세요!")
+        return
+
+    time_str = f"{selected_hour:02d}{selected_minute:02d}00"
+    context.user_data['time'] = time_str
+
+    await query.edit_message_text(f"🕐 {selected_hour:02d}:{selected_minute:02d} 선택됨\n\n🔍 열차를 검색합니다...")
+
+    # 열차 검색 및 표시
+    dep = context.user_data.get('departure')
+    arr = context.user_data.get('destination')
+    date = context.user_data.get('date')
+    service = context.user_data.get('service')
+
+    if all([dep, arr, date, service]):
+        await train_reservation.search_and_show_trains(
+            dep, arr, date, time_str, service,
+            update.effective_chat.id, context
+        )
+    else:
+        await query.edit_message_text("❌ 검색 정보가 부족합니다. 다시 시도해주세요.")
+
+
+@callback_router.exact("time_reset")
+async def on_time_reset(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    # 시간 선택 초기화
+    context.user_data.pop('selected_hour', None)
+    context.user_data.pop('selected_minute', None)
+    await update.callback_query.edit_message_reply_markup(reply_markup=create_time_selector())
+
+
+@callback_router.exact("time_cancel")
+async def on_time_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    await update.callback_query.edit_message_text("시간 선택이 취소되었습니다. 다시 시도해주세요.")
+
+
+# 빠른 경로 관련 콜백: callback_data -> (출발, 도착, 서비스, 안내 문구)
+QUICK_ROUTES = {
+    "route_ktx_seoul_busan": ('서울', '부산', 'KTX', '🚄 KTX: 서울 → 부산'),
+    "route_ktx_busan_seoul": ('부산', '서울', 'KTX', '🚄 KTX: 부산 → 서울'),
+    "route_seoul_busan": ('수서', '부산', 'SRT', '🚄 SRT: 서울(수서) → 부산'),  # SRT는 수서역에서 출발
+    "route_busan_seoul": ('부산', '수서', 'SRT', '🚄 SRT: 부산 → 서울(수서)'),  # SRT는 수서역으로 도착
+}
+
+
+async def on_quick_route(update: Update, context: ContextTypes.DEFAULT_TYPE, data: str) -> None:
+    departure_station, destination_station, service, title = QUICK_ROUTES[data]
+    context.user_data['departure'] = departure_station
+    context.user_data['destination'] = destination_station
+    context.user_data['service'] = service
+    await update.callback_query.edit_message_text(f'{title}\n여행 날짜를 선택해주세요:', reply_markup=create_calendar())
+
+
+for _route_data in QUICK_ROUTES:
+    callback_router.add_exact(_route_data, on_quick_route)
+
+
+@callback_router.exact("route_custom")
+async def on_route_custom(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> int:
+    await update.callback_query.edit_message_text("직접 입력 방식을 선택하셨습니다.\n출발지를 입력해주세요:")
+    return DEPARTURE
+
+
+# 열차 선택 콜백
+@callback_router.prefix("select_train_", parse_int)
+async def on_select_train(update: Update, context: ContextTypes.DEFAULT_TYPE, train_index: int) -> None:
+    query = update.callback_query
+    available_trains = context.user_data.get('available_trains', [])
+
+    if 0 <= train_index < len(available_trains):
+        selected_train_info = available_trains[train_index]
+        context.user_data['selected_train'] = selected_train_info['train']
+        context.user_data['selected_train_info'] = selected_train_info
+
+        await query.edit_message_text(f"✅ 선택된 열차:\n{selected_train_info['display_text']}\n\n이제 인원수를 선택해주세요:")
+
+        # 인원수 선택으로 진행
+        await train_reservation.ask_passenger_count(update, context)
+    else:
+        await query.answer("잘못된 열차 선택입니다.")
+
+
+# 정렬 옵션 콜백
+@callback_router.exact("sort_time")
+async def on_sort_time(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    # 시간순 정렬 (이미 구현되어 있음)
+    await update.callback_query.answer("이미 시간순으로 정렬되어 있습니다.")
+
+
+@callback_router.exact("sort_price")
+async def on_sort_price(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    # 가격순 정렬 (추후 구현)
+    await update.callback_query.answer("가격순 정렬은 추후 지원 예정입니다.")
+
+
+@callback_router.exact("search_again")
+async def on_search_again(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    query = update.callback_query
+    dep = context.user_data.get('departure')
+    arr = context.user_data.get('destination')
+    date = context.user_data.get('date')
+    time = context.user_data.get('time')
+    service = context.user_data.get('service')
+
+    if all([dep, arr, date, time, service]):
+        await query.edit_message_text("🔄 열차를 다시 검색합니다...")
+        # 다시검색은 스캔과 같은 짧은 TTL (연달아 누르면 요청 하나로 합쳐지되 결과는 최신)
+        await train_reservation.search_and_show_trains(dep, arr, date, time, service, update.effective_chat.id, context,
+                                                       cache_ttl=SEARCH_CACHE_SCAN_TTL)
+    else:
+        await query.answer("검색 정보가 부족합니다.")
+
+
+# 다중/단일 모드 선택 콜백
+@callback_router.exact("multi_monitor_mode")
+async def on_multi_monitor_mode(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    query = update.callback_query
+    available_trains = context.user_data.get('available_trains', [])
+    if not available_trains:
+        await query.answer("열차 정보가 없습니다. 다시 검색해주세요.")
+        return
+
+    # 다중 모니터링을 위한 열차 선택 UI로 변경
+    train_list_text = _train_list_text(
+        "🎯 다중 모니터링 모드\n\n원하는 열차들을 선택하세요 (여러 개 선택 가능):\n\n", available_trains)
+    selected_set = context.user_data.setdefault('selected_for_multi', set())
+    await query.edit_message_text(train_list_text, reply_markup=_multi_select_markup(len(available_trains), selected_set))
+
+
+@callback_router.exact("single_booking_mode")
+async def on_single_booking_mode(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    query = update.callback_query
+    available_trains = context.user_data.get('available_trains', [])
+    if not available_trains:
+        await query.answer("열차 정보가 없습니다. 다시 검색해주세요.")
+        return
+
+    train_list_text = _train_list_text("🎫 단일 예매 모드\n\n예매할 열차를 1개 선택하세요:\n\n", available_trains)
+
+    # 단일 선택 버튼들
+    keyboard = []
+    row = []
+    for i in range(len(available_trains)):
+        row.append(InlineKeyboardButton(f"{i+1}번", callback_data=f"select_train_{i}"))
+        if len(row) == 4:  # 4열로 배치
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+
+    keyboard.append([InlineKeyboardButton("🎯 다중 모드로", callback_data="multi_monitor_mode")])
+
+    await query.edit_message_text(train_list_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+# 다중 모니터링 체크박스 토글
+@callback_router.prefix("multi_toggle_", parse_int)
+async def on_multi_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE, train_index: int) -> None:
+    selected_set = context.user_data.get('selected_for_multi', set())
+    selected_set ^= {train_index}
+    context.user_data['selected_for_multi'] = selected_set
+
+    # UI 업데이트
+    available_trains = context.user_data.get('available_trains', [])
+    reply_markup = _multi_select_markup(len(available_trains), selected_set)
+    await update.callback_query.edit_message_reply_markup(reply_markup=reply_markup)
+
+
+def _extract_dep_time(train_info: Dict[str, Any]) -> str:
+    """열차 정보에서 출발 시간(HHMMSS) 추출 - 실패하면 기본값 060000"""
+    dep_time = "060000"  # 기본값
+    train = train_info.get('train')
+
+    if train and hasattr(train, 'dep_time') and train.dep_time:
+        try:
+            dep_time = train.dep_time.strftime('%H%M%S')
+        except Exception as time_err:
+            logger.warning(f"시간 변환 실패: {time_err}")
+
+    # 시간이 여전히 기본값이면 display_text에서 추출 시도
+    if dep_time == "060000" and 'display_text' in train_info:
+        try:
+            # display_text에서 시간 패턴 찾기 (예: "08:00" 형태)
+            time_match = re.search(r'(\d{1,2}):(\d{2})', train_info['display_text'])
+            if time_match:
+                hour = time_match.group(1).zfill(2)
+                minute = time_match.group(2)
+                dep_time = f"{hour}{minute}00"
+                logger.info(f"Display text에서 시간 추출: {dep_time}")
+        except Exception as extract_err:
+            logger.warning(f"Display text 시간 추출 실패: {extract_err}")
+    return dep_time
+
+
+@callback_router.exact("multi_start")
+async def on_multi_start(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    query = update.callback_query
+    selected_set = context.user_data.get('selected_for_multi', set())
+    available_trains = context.user_data.get('available_trains', [])
+
+    if not selected_set:
+        await query.answer("먼저 모니터링할 열차를 선택해주세요.")
+        return
+
+    # 선택된 열차들로 다중 타겟 생성
+    chat_id = update.effective_chat.id
+    dep = context.user_data.get('departure')
+    arr = context.user_data.get('destination')
+    date = context.user_data.get('date')
+    service = context.user_data.get('service')
+
+    courses = []
+    for i, train_index in enumerate(sorted(selected_set)):
+        try:
+            if train_index < len(available_trains):
+                train_info = available_trains[train_index]
+                dep_time = _extract_dep_time(train_info)
+
+                course = {
+                    'service': service,
+                    'departure': dep,
+                    'arrival': arr,
+                    'date': date,
+                    'time': dep_time,
+                    'priority': i + 1,
+                    'scan_only': True,
+                    # 선택한 열차만 대상으로 (더 늦은 열차로 넘어가지 않음)
+                    'metadata': {
+                        'train_info': train_info,
+                        'preference': PreferenceProfile(window_start=dep_time, window_end=dep_time).to_dict(),
+                    }
+                }
+
+                courses.append(course)
+                logger.info(f"다중 코스 {i+1} 추가: {dep}→{arr} {dep_time} ({service})")
+
+        except Exception as course_err:
+            logger.error(f"코스 {i+1} 처리 중 오류: {course_err}")
+            continue
+
+    if not courses:
+        await query.answer("열차 정보 처리 중 오류가 발생했습니다.")
+        return
+
+    # 타겟 그룹 추가
+    targets = await target_registry.add_target_group(
+        chat_id=chat_id,
+        targets_data=courses
+    )
+
+    group_id = targets[0].group_id if targets else "unknown"
+
+    message_text = (
+        f"🎯 다중 모니터링 시작!\n\n"
+        f"📋 등록된 열차: {len(courses)}개\n"
+        f"🆔 그룹 ID: {group_id[:8]}...\n"
+        f"🔍 모니터링 중... 표가 나오면 우선순위에 따라 자동 예매됩니다.\n\n"
+        f"📊 상태 확인: /multi_status\n"
+        f"🛑 중단: /stop_multi"
+    )
+
+    await query.edit_message_text(message_text)
+
+
+# 인원수 선택 콜백
+@callback_router.exact("adult_manual")
+async def on_adult_manual(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    await update.callback_query.edit_message_text("어른 인원수를 숫자로 입력해주세요:")
+    context.user_data['expect_input'] = 'adult_count'
+
+
+@callback_router.prefix("adult_", parse_int)
+async def on_adult_count(update: Update, context: ContextTypes.DEFAULT_TYPE, adult_count: int) -> None:
+    context.user_data['adult_count'] = adult_count
+    await update.callback_query.edit_message_text(f"어른 {adult_count}명 선택됨")
+    # 어린이 수 선택으로 진행
+    await train_reservation.ask_child_count(update, context)
+
+
+@callback_router.exact("child_manual")
+async def on_child_manual(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    await update.callback_query.edit_message_text("어린이 인원수를 숫자로 입력해주세요:")
+    context.user_data['expect_input'] = 'child_count'
+
+
+@callback_router.prefix("child_", parse_int)
+async def on_child_count(update: Update, context: ContextTypes.DEFAULT_TYPE, child_count: int) -> None:
+    context.user_data['child_count'] = child_count
+    await update.callback_query.edit_message_text(f"어린이 {child_count}명 선택됨")
+    # 창가 자리 선택으로 진행
+    await train_reservation.ask_window_seat(update, context)
+
+
+# 창가/좌석 선택 콜백: callback_data -> (window_seat, window_only, 안내 문구)
+WINDOW_OPTIONS = {
+    "window_priority": (True, False, "창가 우선으로 설정되었습니다."),
+    "window_only": (True, True, "창가만으로 설정되었습니다."),
+    "window_no": (False, False, "좌석 무관으로 설정되었습니다."),
+}
+
+
+async def on_window_option(update: Update, context: ContextTypes.DEFAULT_TYPE, data: str) -> None:
+    window_seat, window_only, reply_text = WINDOW_OPTIONS[data]
+    context.user_data['window_seat'] = window_seat
+    context.user_data['window_only'] = window_only
+
+    await update.callback_query.edit_message_text(reply_text)
+    # 좌석 타입 선택 요청
+    await train_reservation.ask_seat_type(update, context)
+
+
+for _window_data in WINDOW_OPTIONS:
+    callback_router.add_exact(_window_data, on_window_option)
+
+
+async def on_seat_type(update: Update, context: ContextTypes.DEFAULT_TYPE, data: str) -> None:
+    query = update.callback_query
+    if data == "seat_special":
+        context.user_data['seat_type'] = SeatType.SPECIAL_ONLY
+        reply_text = "특실로 예약을 시도합니다."
+    else:
+        context.user_data['seat_type'] = SeatType.GENERAL_ONLY
+        reply_text = "일반실로 예약을 시도합니다."
+
+    await query.edit_message_text(reply_text)
+
+    # 모든 정보 수집 완료, 예약 시작
+    await query.message.reply_text('예약을 시작합니다. 중단하려면 /stop 명령어를 사용하세요.')
+
+    # 선택된 열차로 예약 진행
+    selected_train = context.user_data.get('selected_train')
+    if selected_train:
+        # 선택된 열차 정보로 예약
+        train_reservation.reserve_selected_train(
+            selected_train,
+            context.user_data,
+            update.effective_chat.id,
+            context
+        )
+    else:
+        # 기존 방식으로 예약 (하위 호환성)
+        train_reservation.search_and_reserve(
+            context.user_data['departure'],
+            context.user_data['destination'],
+            context.user_data['date'],
+            context.user_data['time'],
+            context.user_data['service'],
+            update.effective_chat.id,
+            context
+        )
+
+
+callback_router.add_exact("seat_special", on_seat_type)
+callback_router.add_exact("seat_general", on_seat_type)
+
+
+@callback_router.fallback
+async def on_unknown_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _data: str) -> None:
+    # ignore 버튼 등 처리할 필요 없는 콜백
+    await update.callback_query.answer()
+
+
+_pipeline_shut_down = False
+
+
+async def shutdown_pipeline(_application=None) -> None:
+    """파이프라인 정리 - 이벤트 루프가 도는 동안 워커를 멈추고 남은 상태를 기록 (Application.post_shutdown)"""
+    global _pipeline_shut_down
+    if _pipeline_shut_down:
+        return
+    _pipeline_shut_down = True
+    logger.info("파이프라인 워커 정리 중...")
+    if isinstance(target_registry, ShardCoordinator):
+        await target_registry.stop()
+    else:
+        await scanner_worker.stop()
+        for worker in pipeline_workers:
+            await worker.stop()
+        await reservation_executor.stop()
+        if lease_keeper is not None:
+            await lease_keeper.stop()
+        # 타겟 저장소 기록 스레드에 남은 WAL/스냅샷 기록을 마저 씀
+        await asyncio.get_running_loop().run_in_executor(None, target_registry.close_store)
+    await telegram_outbox.stop()
+    await train_reservation.sessions.flush()
+
+
 def main():
     # 이벤트 루프 설정
     loop = asyncio.new_event_loop()
@@ -2141,7 +2804,7 @@ def main():
         logger.error("TELEGRAM_BOT_TOKEN이 설정되지 않았습니다.")
         sys.exit(1)
 
-    application = Application.builder().token(telegram_bot_token).build()
+    application = Application.builder().token(telegram_bot_token).post_shutdown(shutdown_pipeline).build()
 
     # 에러 핸들러 등록
     application.add_error_handler(error_handler)
@@ -2159,6 +2822,7 @@ def main():
     application.add_handler(CommandHandler('add_multi_course', add_multi_course))
     application.add_handler(CommandHandler('multi_status', multi_status))
     application.add_handler(CommandHandler('stop_multi', stop_multi))
+    application.add_handler(CommandHandler('grid', availability_grid))
 
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start_search)],
@@ -2211,477 +2875,73 @@ def main():
             except ValueError:
                 await update.message.reply_text("올바른 숫자를 입력해주세요:")
             
-    # 콜백 쿼리 핸들러 추가
-    async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """콜백 쿼리 처리 핸들러"""
-        query = update.callback_query
-        choice = query.data
-
-        # 달력 관련 콜백
-        if choice.startswith("cal_"):
-            # 달력 내비게이션: cal_year_month_year
-            parts = choice.split("_")
-            year = int(parts[1])
-            month = int(parts[2])
-            new_calendar = create_calendar(year, month)
-            await query.edit_message_reply_markup(reply_markup=new_calendar)
-
-        elif choice.startswith("date_"):
-            if choice == "date_today":
-                selected_date = datetime.now().strftime("%Y%m%d")
-                date_text = "오늘"
-            elif choice == "date_tomorrow":
-                selected_date = (datetime.now() + timedelta(days=1)).strftime("%Y%m%d")
-                date_text = "내일"
-            elif choice == "date_day_after":
-                selected_date = (datetime.now() + timedelta(days=2)).strftime("%Y%m%d")
-                date_text = "모레"
-            else:
-                # date_YYYYMMDD 형식
-                selected_date = choice[5:]  # date_ 제거
-                date_obj = datetime.strptime(selected_date, "%Y%m%d")
-                date_text = date_obj.strftime("%Y년 %m월 %d일")
-
-            context.user_data['date'] = selected_date
-
-            # 시간 선택기로 이동
-            time_markup = create_time_selector()
-            await query.edit_message_text(f"📅 {date_text} 선택됨\n출발 시간을 선택해주세요:", reply_markup=time_markup)
-
-        # 시간 관련 콜백
-        elif choice.startswith("time_"):
-            if choice.startswith("time_hour_"):
-                hour = int(choice.split("_")[2])
-                context.user_data['selected_hour'] = hour
-                # 분 선택 유지하면서 시간 업데이트
-                selected_minute = context.user_data.get('selected_minute')
-                time_markup = create_time_selector(hour, selected_minute)
-                await query.edit_message_reply_markup(reply_markup=time_markup)
-
-            elif choice.startswith("time_minute_"):
-                minute = int(choice.split("_")[2])
-                context.user_data['selected_minute'] = minute
-                # 시간 선택 유지하면서 분 업데이트
-                selected_hour = context.user_data.get('selected_hour')
-                time_markup = create_time_selector(selected_hour, minute)
-                await query.edit_message_reply_markup(reply_markup=time_markup)
-
-            elif choice == "time_confirm":
-                selected_hour = context.user_data.get('selected_hour')
-                selected_minute = context.user_data.get('selected_minute')
-
-                if selected_hour is not None and selected_minute is not None:
-                    time_str = f"{selected_hour:02d}{selected_minute:02d}00"
-                    context.user_data['time'] = time_str
-
-                    await query.edit_message_text(f"🕐 {selected_hour:02d}:{selected_minute:02d} 선택됨\n\n🔍 열차를 검색합니다...")
-
-                    # 열차 검색 및 표시
-                    dep = context.user_data.get('departure')
-                    arr = context.user_data.get('destination')
-                    date = context.user_data.get('date')
-                    service = context.user_data.get('service')
-
-                    if all([dep, arr, date, service]):
-                        await train_reservation.search_and_show_trains(
-                            dep, arr, date, time_str, service,
-                            update.effective_chat.id, context
-                        )
-                    else:
-                        await query.edit_message_text("❌ 검색 정보가 부족합니다. 다시 시도해주세요.")
-                else:
-                    await query.answer("시간과 분을 모두 선택해주세요!")
-
-            elif choice == "time_reset":
-                # 시간 선택 초기화
-                if 'selected_hour' in context.user_data:
-                    del context.user_data['selected_hour']
-                if 'selected_minute' in context.user_data:
-                    del context.user_data['selected_minute']
-                time_markup = create_time_selector()
-                await query.edit_message_reply_markup(reply_markup=time_markup)
-
-            elif choice == "time_cancel":
-                await query.edit_message_text("시간 선택이 취소되었습니다. 다시 시도해주세요.")
-
-        # 빠른 경로 관련 콜백
-        elif choice.startswith("route_"):
-            if choice == "route_ktx_seoul_busan":
-                context.user_data['departure'] = '서울'
-                context.user_data['destination'] = '부산'
-                context.user_data['service'] = 'KTX'
-                calendar_markup = create_calendar()
-                await query.edit_message_text('🚄 KTX: 서울 → 부산\n여행 날짜를 선택해주세요:', reply_markup=calendar_markup)
-
-            elif choice == "route_ktx_busan_seoul":
-                context.user_data['departure'] = '부산'
-                context.user_data['destination'] = '서울'
-                context.user_data['service'] = 'KTX'
-                calendar_markup = create_calendar()
-                await query.edit_message_text('🚄 KTX: 부산 → 서울\n여행 날짜를 선택해주세요:', reply_markup=calendar_markup)
-
-            elif choice == "route_seoul_busan":
-                context.user_data['departure'] = '수서'  # SRT는 수서역에서 출발
-                context.user_data['destination'] = '부산'
-                context.user_data['service'] = 'SRT'
-                calendar_markup = create_calendar()
-                await query.edit_message_text('🚄 SRT: 서울(수서) → 부산\n여행 날짜를 선택해주세요:', reply_markup=calendar_markup)
-
-            elif choice == "route_busan_seoul":
-                context.user_data['departure'] = '부산'
-                context.user_data['destination'] = '수서'  # SRT는 수서역으로 도착
-                context.user_data['service'] = 'SRT'
-                calendar_markup = create_calendar()
-                await query.edit_message_text('🚄 SRT: 부산 → 서울(수서)\n여행 날짜를 선택해주세요:', reply_markup=calendar_markup)
-
-            elif choice == "route_custom":
-                await query.edit_message_text("직접 입력 방식을 선택하셨습니다.\n출발지를 입력해주세요:")
-                return DEPARTURE
-
-        # 열차 선택 콜백
-        elif choice.startswith("select_train_"):
-            train_index = int(choice.split("_")[2])
-            available_trains = context.user_data.get('available_trains', [])
-
-            if 0 <= train_index < len(available_trains):
-                selected_train_info = available_trains[train_index]
-                context.user_data['selected_train'] = selected_train_info['train']
-                context.user_data['selected_train_info'] = selected_train_info
-
-                await query.edit_message_text(f"✅ 선택된 열차:\n{selected_train_info['display_text']}\n\n이제 인원수를 선택해주세요:")
-
-                # 인원수 선택으로 진행
-                await train_reservation.ask_passenger_count(update, context)
-            else:
-                await query.answer("잘못된 열차 선택입니다.")
-
-        # 정렬 옵션 콜백
-        elif choice == "sort_time":
-            # 시간순 정렬 (이미 구현되어 있음)
-            await query.answer("이미 시간순으로 정렬되어 있습니다.")
-
-        elif choice == "sort_price":
-            # 가격순 정렬 (추후 구현)
-            await query.answer("가격순 정렬은 추후 지원 예정입니다.")
-
-        elif choice == "search_again":
-            # 다시 검색
-            dep = context.user_data.get('departure')
-            arr = context.user_data.get('destination')
-            date = context.user_data.get('date')
-            time = context.user_data.get('time')
-            service = context.user_data.get('service')
-
-            if all([dep, arr, date, time, service]):
-                await query.edit_message_text("🔄 열차를 다시 검색합니다...")
-                await train_reservation.search_and_show_trains(dep, arr, date, time, service, update.effective_chat.id, context)
-            else:
-                await query.answer("검색 정보가 부족합니다.")
-
-        # 다중/단일 모드 선택 콜백
-        elif choice == "multi_monitor_mode":
-            # 다중 모니터링 모드로 전환
-            available_trains = context.user_data.get('available_trains', [])
-            if not available_trains:
-                await query.answer("열차 정보가 없습니다. 다시 검색해주세요.")
-                return
-
-            # 다중 모니터링을 위한 열차 선택 UI로 변경
-            train_list_text = "🎯 다중 모니터링 모드\n\n원하는 열차들을 선택하세요 (여러 개 선택 가능):\n\n"
-
-            dep = context.user_data.get('departure')
-            arr = context.user_data.get('destination')
-            date = context.user_data.get('date')
-            service = context.user_data.get('service')
-
-            for i, train_info in enumerate(available_trains):
-                train_list_text += f"[{i+1}] {train_info['display_text'].replace(chr(10), ' | ')}\n\n"
-
-            # 체크박스 스타일 버튼들
-            keyboard = []
-            context.user_data['selected_for_multi'] = context.user_data.get('selected_for_multi', set())
-
-            row = []
-            for i in range(len(available_trains)):
-                selected = i in context.user_data['selected_for_multi']
-                button_text = f"✅ {i+1}번" if selected else f"☐ {i+1}번"
-                row.append(InlineKeyboardButton(button_text, callback_data=f"multi_toggle_{i}"))
-                if len(row) == 3:  # 3열로 배치
-                    keyboard.append(row)
-                    row = []
-            if row:
-                keyboard.append(row)
-
-            # 하단 버튼들
-            keyboard.append([
-                InlineKeyboardButton("✅ 선택완료 (모니터링 시작)", callback_data="multi_start"),
-                InlineKeyboardButton("🔙 단일 모드로", callback_data="single_booking_mode")
-            ])
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(train_list_text, reply_markup=reply_markup)
-
-        elif choice == "single_booking_mode":
-            # 단일 예매 모드 (기존 방식)
-            available_trains = context.user_data.get('available_trains', [])
-            if not available_trains:
-                await query.answer("열차 정보가 없습니다. 다시 검색해주세요.")
-                return
-
-            train_list_text = "🎫 단일 예매 모드\n\n예매할 열차를 1개 선택하세요:\n\n"
-
-            for i, train_info in enumerate(available_trains):
-                train_list_text += f"[{i+1}] {train_info['display_text'].replace(chr(10), ' | ')}\n\n"
-
-            # 단일 선택 버튼들
-            keyboard = []
-            row = []
-            for i in range(len(available_trains)):
-                row.append(InlineKeyboardButton(f"{i+1}번", callback_data=f"select_train_{i}"))
-                if len(row) == 4:  # 4열로 배치
-                    keyboard.append(row)
-                    row = []
-            if row:
-                keyboard.append(row)
-
-            keyboard.append([InlineKeyboardButton("🎯 다중 모드로", callback_data="multi_monitor_mode")])
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(train_list_text, reply_markup=reply_markup)
-
-        # 다중 모니터링 체크박스 토글
-        elif choice.startswith("multi_toggle_"):
-            train_index = int(choice.split("_")[2])
-            selected_set = context.user_data.get('selected_for_multi', set())
-
-            if train_index in selected_set:
-                selected_set.remove(train_index)
-            else:
-                selected_set.add(train_index)
-
-            context.user_data['selected_for_multi'] = selected_set
-
-            # UI 업데이트
-            available_trains = context.user_data.get('available_trains', [])
-            train_list_text = "🎯 다중 모니터링 모드\n\n원하는 열차들을 선택하세요 (여러 개 선택 가능):\n\n"
-
-            for i, train_info in enumerate(available_trains):
-                train_list_text += f"[{i+1}] {train_info['display_text'].replace(chr(10), ' | ')}\n\n"
-
-            # 체크박스 스타일 버튼들 업데이트
-            keyboard = []
-            row = []
-            for i in range(len(available_trains)):
-                selected = i in selected_set
-                button_text = f"✅ {i+1}번" if selected else f"☐ {i+1}번"
-                row.append(InlineKeyboardButton(button_text, callback_data=f"multi_toggle_{i}"))
-                if len(row) == 3:
-                    keyboard.append(row)
-                    row = []
-            if row:
-                keyboard.append(row)
-
-            # 하단 버튼들
-            start_text = f"✅ 선택완료 ({len(selected_set)}개 모니터링 시작)" if selected_set else "✅ 선택완료 (모니터링 시작)"
-            keyboard.append([
-                InlineKeyboardButton(start_text, callback_data="multi_start"),
-                InlineKeyboardButton("🔙 단일 모드로", callback_data="single_booking_mode")
-            ])
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_reply_markup(reply_markup=reply_markup)
-
-        elif choice == "multi_start":
-            # 다중 모니터링 시작
-            selected_set = context.user_data.get('selected_for_multi', set())
-            available_trains = context.user_data.get('available_trains', [])
-
-            if not selected_set:
-                await query.answer("먼저 모니터링할 열차를 선택해주세요.")
-                return
-
-            # 선택된 열차들로 다중 타겟 생성
-            chat_id = update.effective_chat.id
-            dep = context.user_data.get('departure')
-            arr = context.user_data.get('destination')
-            date = context.user_data.get('date')
-            service = context.user_data.get('service')
-
-            courses = []
-            for i, train_index in enumerate(sorted(selected_set)):
-                try:
-                    if train_index < len(available_trains):
-                        train_info = available_trains[train_index]
-                        train = train_info.get('train')
-
-                        # 열차 시간 추출 - 더 안전한 방식
-                        dep_time = "060000"  # 기본값
-
-                        if train and hasattr(train, 'dep_time') and train.dep_time:
-                            try:
-                                dep_time = train.dep_time.strftime('%H%M%S')
-                            except Exception as time_err:
-                                logger.warning(f"시간 변환 실패: {time_err}")
-
-                        # 시간이 여전히 기본값이면 display_text에서 추출 시도
-                        if dep_time == "060000" and 'display_text' in train_info:
-                            try:
-                                # display_text에서 시간 패턴 찾기 (예: "08:00" 형태)
-                                import re
-                                time_match = re.search(r'(\d{1,2}):(\d{2})', train_info['display_text'])
-                                if time_match:
-                                    hour = time_match.group(1).zfill(2)
-                                    minute = time_match.group(2)
-                                    dep_time = f"{hour}{minute}00"
-                                    logger.info(f"Display text에서 시간 추출: {dep_time}")
-                            except Exception as extract_err:
-                                logger.warning(f"Display text 시간 추출 실패: {extract_err}")
-
-                        course = {
-                            'service': service,
-                            'departure': dep,
-                            'arrival': arr,
-                            'date': date,
-                            'time': dep_time,
-                            'priority': i + 1,
-                            'scan_only': True,
-                            'metadata': {'train_info': train_info}
-                        }
-
-                        courses.append(course)
-                        logger.info(f"다중 코스 {i+1} 추가: {dep}→{arr} {dep_time} ({service})")
-
-                except Exception as course_err:
-                    logger.error(f"코스 {i+1} 처리 중 오류: {course_err}")
-                    continue
-
-            if courses:
-                # 타겟 그룹 추가
-                targets = await target_registry.add_target_group(
-                    chat_id=chat_id,
-                    targets_data=courses
-                )
-
-                group_id = targets[0].group_id if targets else "unknown"
-
-                message_text = (
-                    f"🎯 다중 모니터링 시작!\n\n"
-                    f"📋 등록된 열차: {len(courses)}개\n"
-                    f"🆔 그룹 ID: {group_id[:8]}...\n"
-                    f"🔍 모니터링 중... 표가 나오면 우선순위에 따라 자동 예매됩니다.\n\n"
-                    f"📊 상태 확인: /multi_status\n"
-                    f"🛑 중단: /stop_multi"
-                )
-
-                await query.edit_message_text(message_text)
-            else:
-                await query.answer("열차 정보 처리 중 오류가 발생했습니다.")
-
-        # 인원수 선택 콜백
-        elif choice.startswith("adult_"):
-            if choice == "adult_manual":
-                await query.edit_message_text("어른 인원수를 숫자로 입력해주세요:")
-                context.user_data['expect_input'] = 'adult_count'
-                return
-            else:
-                adult_count = int(choice.split("_")[1])
-                context.user_data['adult_count'] = adult_count
-                await query.edit_message_text(f"어른 {adult_count}명 선택됨")
-                # 어린이 수 선택으로 진행
-                await train_reservation.ask_child_count(update, context)
-
-        elif choice.startswith("child_"):
-            if choice == "child_manual":
-                await query.edit_message_text("어린이 인원수를 숫자로 입력해주세요:")
-                context.user_data['expect_input'] = 'child_count'
-                return
-            else:
-                child_count = int(choice.split("_")[1])
-                context.user_data['child_count'] = child_count
-                await query.edit_message_text(f"어린이 {child_count}명 선택됨")
-                # 창가 자리 선택으로 진행
-                await train_reservation.ask_window_seat(update, context)
-
-        # 기존 창가/좌석 선택 콜백
-        elif choice in ["window_priority", "window_only", "window_no"]:
-            # 창가 자리 선택 처리
-            if choice == "window_priority":
-                context.user_data['window_seat'] = True
-                context.user_data['window_only'] = False
-                reply_text = "창가 우선으로 설정되었습니다."
-            elif choice == "window_only":
-                context.user_data['window_seat'] = True
-                context.user_data['window_only'] = True
-                reply_text = "창가만으로 설정되었습니다."
-            else:  # window_no
-                context.user_data['window_seat'] = False
-                context.user_data['window_only'] = False
-                reply_text = "좌석 무관으로 설정되었습니다."
-
-            await query.edit_message_text(reply_text)
-            # 좌석 타입 선택 요청
-            await train_reservation.ask_seat_type(update, context)
-        elif choice in ["seat_special", "seat_general"]:
-            # 좌석 타입 선택 처리
-            if choice == "seat_special":
-                context.user_data['seat_type'] = SeatType.SPECIAL_ONLY
-                reply_text = "특실로 예약을 시도합니다."
-            else:
-                context.user_data['seat_type'] = SeatType.GENERAL_ONLY
-                reply_text = "일반실로 예약을 시도합니다."
-
-            await query.edit_message_text(reply_text)
-
-            # 모든 정보 수집 완료, 예약 시작
-            await update.callback_query.message.reply_text('예약을 시작합니다. 중단하려면 /stop 명령어를 사용하세요.')
-
-            # 선택된 열차로 예약 진행
-            selected_train = context.user_data.get('selected_train')
-            if selected_train:
-                # 선택된 열차 정보로 예약
-                train_reservation.reserve_selected_train(
-                    selected_train,
-                    context.user_data,
-                    update.effective_chat.id,
-                    context
-                )
-            else:
-                # 기존 방식으로 예약 (하위 호환성)
-                train_reservation.search_and_reserve(
-                    context.user_data['departure'],
-                    context.user_data['destination'],
-                    context.user_data['date'],
-                    context.user_data['time'],
-                    context.user_data['service'],
-                    update.effective_chat.id,
-                    context
-                )
-        else:
-            await query.answer()
-    
     # 메시지 핸들러와 콜백 쿼리 핸들러 등록
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_input))
-    application.add_handler(CallbackQueryHandler(handle_callback_query))
+    application.add_handler(CallbackQueryHandler(callback_router.dispatch))
 
     # 높은 우선순위로 stop, status 핸들러 다시 등록
     application.add_handler(CommandHandler('stop', stop), group=1)
     application.add_handler(CommandHandler('status', status), group=1)
 
-    # 파이프라인에 봇 연결
-    reservation_executor.bind_bot(application.bot)
+    # 파이프라인에 봇 연결 (발신 큐를 봇 대신 주입)
+    telegram_outbox.bind_bot(application.bot)
+    if isinstance(target_registry, ShardCoordinator):
+        target_registry.bind_outbox(telegram_outbox)
+    else:
+        reservation_executor.bind_bot(telegram_outbox)
+
+    # 자주 쓰는 인라인 키보드 미리 생성
+    warm_up_keyboards()
 
     # 파이프라인 시작
     logger.info("파이프라인 워커 시작...")
-    scanner_worker.start(loop)
-    reservation_executor.start(loop)
+    telegram_outbox.start(loop)
+    if isinstance(target_registry, ShardCoordinator):
+        logger.info(f"스캐너 샤드 워커 {SCANNER_SHARDS}개 시작")
+        target_registry.start(loop)
+        pipeline_checks = {'shards': target_registry.is_running}
+    else:
+        if lease_keeper is not None:
+            lease_keeper.start(loop)
+        scanner_worker.start(loop)
+        for worker in pipeline_workers:
+            worker.start(loop)
+        reservation_executor.start(loop)
+        pipeline_checks = {
+            'scanner': scanner_worker.is_running,
+            'workers': lambda: all(worker.is_running() for worker in pipeline_workers),
+            'executor': reservation_executor.is_running,
+        }
+        if lease_keeper is not None:
+            pipeline_checks['leases'] = lease_keeper.is_running
+
+    # BOT_MODE=webhook 이면 Render 웹 서비스 포트에서 웹훅으로 업데이트 수신
+    bot_mode = os.getenv('BOT_MODE', 'polling').lower()
+    webhook_url = os.getenv('WEBHOOK_URL') or os.getenv('RENDER_EXTERNAL_URL')
 
     try:
-        application.run_polling()
+        if bot_mode == 'webhook':
+            if not webhook_url:
+                logger.error("웹훅 모드에는 WEBHOOK_URL(또는 RENDER_EXTERNAL_URL)이 필요합니다.")
+                sys.exit(1)
+            port = int(os.getenv('PORT', '10000'))
+            logger.info(f"웹훅 모드로 시작 (포트 {port})")
+            loop.run_until_complete(run_webhook(
+                application,
+                webhook_url=webhook_url,
+                port=port,
+                secret_token=os.getenv('WEBHOOK_SECRET'),
+                readiness_checks={
+                    **pipeline_checks,
+                    'outbox': telegram_outbox.is_running,
+                },
+            ))
+        else:
+            application.run_polling()
     finally:
-        # 파이프라인 정리
-        logger.info("파이프라인 워커 정리 중...")
-        loop.create_task(scanner_worker.stop())
-        loop.create_task(reservation_executor.stop())
+        # 정상 종료 시에는 post_shutdown에서 이미 정리됨 (중단되어 건너뛴 경우만 여기서 루프를 다시 돌려 정리)
+        if not loop.is_closed():
+            loop.run_until_complete(shutdown_pipeline(application))
 
 if __name__ == '__main__':
     main()
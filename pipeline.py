@@ -1,10 +1,18 @@
 ﻿import asyncio
 import logging
+import time
 import uuid
 from collections import defaultdict
-from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from group_state import GroupStateMachine
+
+if TYPE_CHECKING:
+    from lease_store import LeaseStore
+    from target_store import TargetStore
 
 
 @dataclass
@@ -31,6 +39,7 @@ class TargetItem:
     group_id: Optional[str] = None  # 같은 그룹의 코스들을 식별
     priority: int = 1  # 우선순위 (낮을수록 높은 우선순위)
     scan_only: bool = False  # True면 확인만, False면 확인 후 예매
+    time_end: Optional[str] = None  # HHMMSS, 있으면 time~time_end 사이 출발 열차를 한 타겟으로 조회
 
 
 @dataclass
@@ -38,17 +47,174 @@ class ReservationTask:
     target: TargetItem
     train_payload: Dict[str, Any]
     created_at: datetime = field(default_factory=lambda: datetime.utcnow())
+    group_token: Optional[str] = None  # 그룹 예매면 claim_group이 돌려준 선점 토큰
+
+
+def party_size(target: TargetItem) -> Tuple[int, int]:
+    """타겟 metadata의 (어른, 어린이) 조회 인원 - 없으면 어른 1명"""
+    adult_count = int(target.metadata.get('adult_count', 1) or 0)
+    child_count = int(target.metadata.get('child_count', 0) or 0)
+    if adult_count + child_count <= 0:
+        adult_count = 1
+    return adult_count, child_count
+
+
+@dataclass
+class ChatAllocation:
+    """채팅별 활성 엔티티 수 (그룹은 1개로 계산) - 타겟 활성/비활성 시 증분 갱신"""
+    individual: int = 0
+    groups: Dict[str, int] = field(default_factory=dict)  # group_id -> 활성 타겟 수
+
+    @property
+    def entities(self) -> int:
+        return self.individual + len(self.groups)
+
+    def add(self, target: TargetItem) -> None:
+        if target.group_id:
+            self.groups[target.group_id] = self.groups.get(target.group_id, 0) + 1
+        else:
+            self.individual += 1
+
+    def discard(self, target: TargetItem) -> None:
+        if target.group_id:
+            remaining = self.groups.get(target.group_id, 0) - 1
+            if remaining > 0:
+                self.groups[target.group_id] = remaining
+            else:
+                self.groups.pop(target.group_id, None)
+        else:
+            self.individual = max(0, self.individual - 1)
+
+
+@dataclass
+class LockStats:
+    """레지스트리 락 경합 지표"""
+    acquisitions: int = 0
+    contended: int = 0  # 이미 잠겨 있어 대기한 횟수
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    def record_wait(self, waited: float) -> None:
+        self.contended += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'contention_rate': self.contended / self.acquisitions if self.acquisitions else 0.0,
+            'avg_wait_ms': self.wait_seconds / self.contended * 1000 if self.contended else 0.0,
+            'max_wait_ms': self.max_wait_seconds * 1000,
+        }
+
+
+def _scan_interval(rate_per_minute: float) -> float:
+    return max(1.0, 60.0 / rate_per_minute) if rate_per_minute > 0 else 60.0
 
 
 class TargetRegistry:
-    def __init__(self) -> None:
+    # 안전율을 적용한 채팅당 전체 제한: 95회/분
+    TOTAL_RATE_LIMIT = 95.0
+
+    def __init__(
+        self,
+        store: Optional['TargetStore'] = None,
+        lock_shards: Optional[int] = None,
+        lease_store: Optional['LeaseStore'] = None,
+    ) -> None:
         self._targets: Dict[int, Dict[str, TargetItem]] = defaultdict(dict)
-        self._lock = asyncio.Lock()
-        self._group_reservation_locks: Dict[str, asyncio.Lock] = {}  # 그룹별 예매 락
-        self._group_reserved: Dict[str, bool] = {}  # 그룹별 예매 완료 상태
+        # 채팅별 락 (lock_shards를 주면 chat_id 해시로 그만큼의 락을 공유, 1이면 전역 락)
+        self._lock_shards = lock_shards
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._lock_waiters: Dict[int, int] = defaultdict(int)  # 락별 acquire 대기 중인 작업 수
+        self.lock_stats = LockStats()
+        self.groups = GroupStateMachine()  # 그룹별 예매 상태 (idle → claiming → reserving → reserved/failed)
+        self._store = store  # 설정되면 모든 변경을 WAL에 기록 (재시작 시 복구)
+        self._allocations: Dict[int, ChatAllocation] = defaultdict(ChatAllocation)
+        # 여러 인스턴스 배포 시 이 인스턴스가 임대한 타겟만 스캔하고 그룹 예매 상태는 공유 저장소에서 CAS
+        self._lease_store = lease_store
+        self._leased: Optional[Set[Tuple[int, str]]] = None if lease_store is None else set()
         self._logger = logging.getLogger(__name__ + ".TargetRegistry")
 
-    async def add_target(
+    def restore_from_store(self) -> int:
+        """저장소에서 타겟/그룹 상태 복구 (이벤트 루프 시작 전 호출)"""
+        if self._store is None:
+            return 0
+        targets, group_reserved = self._store.load()
+        self._targets.clear()
+        self._allocations.clear()
+        for target in targets:
+            self._targets[target.chat_id][target.target_id] = target
+            if target.is_active:
+                self._allocations[target.chat_id].add(target)
+        self.groups.restore(group_id for group_id, reserved in group_reserved.items() if reserved)
+        for target in targets:
+            self._apply_rate_locked(target)
+        # 재생한 로그가 길면 바로 압축해 다음 부팅의 재생 비용을 줄임
+        self._maybe_compact_locked()
+        self._logger.info("Restored %d targets for %d chats", len(targets), len(self._targets))
+        return len(targets)
+
+    def close_store(self) -> None:
+        """저장소 기록 스레드의 남은 기록을 모두 쓰고 닫음 (종료 시 호출, 블로킹)"""
+        if self._store is not None:
+            self._store.close()
+
+    def _lock_key(self, chat_id: int) -> int:
+        return chat_id if self._lock_shards is None else hash(chat_id) % self._lock_shards
+
+    def _lock_for(self, chat_id: int) -> asyncio.Lock:
+        key = self._lock_key(chat_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def _locked(self, chat_id: int):
+        """채팅 락 획득 (경합 시 대기 시간 기록)"""
+        key = self._lock_key(chat_id)
+        lock = self._lock_for(chat_id)
+        self.lock_stats.acquisitions += 1
+        # 해제 직후 깨어날 대기자가 남아 있어도 locked()는 False이므로 직접 센 대기 수도 확인
+        if lock.locked() or self._lock_waiters[key]:
+            started = time.perf_counter()
+            self._lock_waiters[key] += 1
+            try:
+                await lock.acquire()
+            finally:
+                self._lock_waiters[key] -= 1
+            self.lock_stats.record_wait(time.perf_counter() - started)
+        else:
+            await lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def _iter_targets(self):
+        for chat_targets in self._targets.values():
+            yield from chat_targets.values()
+
+    def _persist_locked(self, *targets: TargetItem) -> None:
+        if self._store is None:
+            return
+        for target in targets:
+            self._store.put(target)
+        self._maybe_compact_locked()
+
+    def _maybe_compact_locked(self) -> None:
+        if self._store is not None and self._store.needs_compaction():
+            self._store.compact(self._iter_targets(), self.groups.reserved_groups())
+
+    # 일괄 수정에서 변경 가능한 필드
+    UPDATABLE_FIELDS = frozenset({
+        'departure', 'arrival', 'date', 'time', 'user_limit', 'metadata',
+        'priority', 'scan_only', 'is_active', 'time_end',
+    })
+
+    def _new_target(
         self,
         chat_id: int,
         service: str,
@@ -61,8 +227,9 @@ class TargetRegistry:
         group_id: Optional[str] = None,
         priority: int = 1,
         scan_only: bool = False,
+        time_end: Optional[str] = None,
     ) -> TargetItem:
-        target = TargetItem(
+        return TargetItem(
             target_id=str(uuid.uuid4())[:8],
             chat_id=chat_id,
             service=service.upper(),
@@ -75,32 +242,171 @@ class TargetRegistry:
             group_id=group_id,
             priority=priority,
             scan_only=scan_only,
+            time_end=time_end,
         )
-        async with self._lock:
-            self._targets[chat_id][target.target_id] = target
-            self._recompute_rates_locked(chat_id)
-        self._logger.info("Target added %s for chat %s", target.target_id, chat_id)
-        return target
+
+    async def add_target(
+        self,
+        chat_id: int,
+        service: str,
+        departure: str,
+        arrival: str,
+        date: str,
+        time: str,
+        user_limit: Optional[float] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        group_id: Optional[str] = None,
+        priority: int = 1,
+        scan_only: bool = False,
+        time_end: Optional[str] = None,
+    ) -> TargetItem:
+        targets = await self.add_targets(chat_id, [dict(
+            service=service,
+            departure=departure,
+            arrival=arrival,
+            date=date,
+            time=time,
+            user_limit=user_limit,
+            metadata=metadata,
+            group_id=group_id,
+            priority=priority,
+            scan_only=scan_only,
+            time_end=time_end,
+        )])
+        return targets[0]
+
+    async def add_targets(self, chat_id: int, targets_data: List[Dict[str, Any]]) -> List[TargetItem]:
+        """여러 타겟을 한 번의 락 구간과 한 번의 할당량 재계산으로 추가"""
+        targets = [self._new_target(chat_id=chat_id, **data) for data in targets_data]
+        if not targets:
+            return []
+        async with self._locked(chat_id):
+            chat_targets = self._targets[chat_id]
+            allocation = self._allocations[chat_id]
+            for target in targets:
+                chat_targets[target.target_id] = target
+                allocation.add(target)
+            for target in targets:
+                self._apply_rate_locked(target)
+            self._rescale_pending_locked(chat_id)
+            self._persist_locked(*targets)
+        self._logger.info("Targets added for chat %s: %s", chat_id, ", ".join(t.target_id for t in targets))
+        return targets
 
     async def remove_target(self, chat_id: int, target_id: str) -> bool:
-        async with self._lock:
-            if target_id in self._targets.get(chat_id, {}):
-                del self._targets[chat_id][target_id]
-                self._recompute_rates_locked(chat_id)
-                self._logger.info("Target %s removed for chat %s", target_id, chat_id)
-                return True
-        return False
+        return await self.remove_targets(chat_id, [target_id]) > 0
+
+    async def remove_targets(self, chat_id: int, target_ids: List[str]) -> int:
+        """여러 타겟을 한 번에 제거하고 제거된 개수 반환"""
+        async with self._locked(chat_id):
+            chat_targets = self._targets.get(chat_id, {})
+            removed = []
+            for target_id in target_ids:
+                target = chat_targets.pop(target_id, None)
+                if target is None:
+                    continue
+                if target.is_active:
+                    self._allocations[chat_id].discard(target)
+                removed.append(target_id)
+            if not removed:
+                return 0
+            if self._store is not None:
+                for target_id in removed:
+                    self._store.remove(chat_id, target_id)
+                self._maybe_compact_locked()
+        self._logger.info("Targets removed for chat %s: %s", chat_id, ", ".join(removed))
+        return len(removed)
+
+    async def update_targets(self, chat_id: int, updates: Dict[str, Dict[str, Any]]) -> List[TargetItem]:
+        """{target_id: {필드: 값}} 형태의 변경을 한 번에 적용하고 변경된 타겟 반환"""
+        for changes in updates.values():
+            unknown = set(changes) - self.UPDATABLE_FIELDS
+            if unknown:
+                raise ValueError(f"Cannot update target fields: {sorted(unknown)}")
+        async with self._locked(chat_id):
+            chat_targets = self._targets.get(chat_id, {})
+            updated = []
+            activated = False
+            for target_id, changes in updates.items():
+                target = chat_targets.get(target_id)
+                if target is None:
+                    continue
+                for name, value in changes.items():
+                    if name == 'is_active':
+                        activated |= bool(value) and not target.is_active
+                        self._set_active_locked(target, bool(value))
+                    else:
+                        setattr(target, name, value)
+                updated.append(target)
+            if updated:
+                for target in updated:
+                    self._apply_rate_locked(target)
+                if activated:
+                    self._rescale_pending_locked(chat_id)
+                self._persist_locked(*updated)
+        return updated
 
     async def clear_targets(self, chat_id: int) -> int:
-        async with self._lock:
+        async with self._locked(chat_id):
             count = len(self._targets.get(chat_id, {}))
             if count:
                 self._targets.pop(chat_id, None)
+                self._allocations.pop(chat_id, None)
+                if self._store is not None:
+                    self._store.clear(chat_id)
+                    self._maybe_compact_locked()
             return count
 
+    def chat_ids(self) -> List[int]:
+        """타겟이 등록된 채팅 목록"""
+        return [chat_id for chat_id, targets in self._targets.items() if targets]
+
+    async def export_chat(self, chat_id: int) -> Tuple[List[TargetItem], List[str]]:
+        """채팅의 타겟과 예매 완료된 그룹 ID (다른 샤드로 옮길 때 사용)"""
+        targets = list(self._targets.get(chat_id, {}).values())
+        group_ids = {t.group_id for t in targets if t.group_id}
+        return targets, sorted(g for g in group_ids if self.groups.state(g) == GroupStateMachine.RESERVED)
+
+    async def import_chat(self, chat_id: int, targets: List[TargetItem], reserved_groups: List[str]) -> int:
+        """채팅의 타겟을 주어진 목록으로 교체 (타겟 ID와 스캔 일정은 그대로 유지)"""
+        async with self._locked(chat_id):
+            self._targets.pop(chat_id, None)
+            self._allocations.pop(chat_id, None)
+            if self._store is not None:
+                self._store.clear(chat_id)
+            if targets:
+                chat_targets = self._targets[chat_id]
+                allocation = self._allocations[chat_id]
+                for target in targets:
+                    # 옮기는 동안 진행 중이던 예매는 이어갈 수 없음
+                    target.pending = False
+                    chat_targets[target.target_id] = target
+                    if target.is_active:
+                        allocation.add(target)
+                for target in targets:
+                    self._apply_rate_locked(target)
+            for group_id in reserved_groups:
+                self.groups.mark_reserved(group_id)
+                if self._store is not None:
+                    self._store.set_group_reserved(group_id, True)
+            self._persist_locked(*targets)
+        self._logger.info("Imported %d targets for chat %s", len(targets), chat_id)
+        return len(targets)
+
     async def list_targets(self, chat_id: int) -> List[TargetItem]:
-        async with self._lock:
-            return list(self._targets.get(chat_id, {}).values())
+        """락 없이 현재 타겟 목록의 스냅샷 반환 (상태 조회용)
+
+        현재 할당량을 반영한 사본을 돌려주고 원본은 바꾸지 않음 (원본 할당량은 락을 잡은 스캔 시점에만 갱신).
+        """
+        targets = []
+        for target in self._targets.get(chat_id, {}).values():
+            if target.is_active:
+                rate = self.rate_for(target)
+                target = replace(target, rate_per_minute=rate, scan_interval=_scan_interval(rate))
+            else:
+                target = replace(target)
+            targets.append(target)
+        return targets
 
     async def add_target_group(
         self,
@@ -112,31 +418,28 @@ class TargetRegistry:
         if not group_id:
             group_id = str(uuid.uuid4())[:8]
 
-        added_targets = []
+        group_data = []
         for i, target_data in enumerate(targets_data):
-            target = await self.add_target(
-                chat_id=chat_id,
-                group_id=group_id,
-                priority=target_data.get('priority', i + 1),
-                scan_only=target_data.get('scan_only', True),  # 기본적으로 확인만
-                **{k: v for k, v in target_data.items()
-                   if k not in ['priority', 'scan_only', 'group_id']}
-            )
-            added_targets.append(target)
+            data = {k: v for k, v in target_data.items()
+                    if k not in ['priority', 'scan_only', 'group_id']}
+            data['group_id'] = group_id
+            data['priority'] = target_data.get('priority', i + 1)
+            data['scan_only'] = target_data.get('scan_only', True)  # 기본적으로 확인만
+            group_data.append(data)
+        added_targets = await self.add_targets(chat_id, group_data)
 
         self._logger.info("Target group %s added with %d targets for chat %s",
                          group_id, len(added_targets), chat_id)
         return added_targets
 
     async def get_targets_by_group(self, chat_id: int, group_id: str) -> List[TargetItem]:
-        """그룹 ID로 타겟들 조회"""
-        async with self._lock:
-            targets = self._targets.get(chat_id, {}).values()
-            return [t for t in targets if t.group_id == group_id]
+        """그룹 ID로 타겟들 조회 (락 없이 스냅샷)"""
+        targets = list(self._targets.get(chat_id, {}).values())
+        return [t for t in targets if t.group_id == group_id]
 
     async def activate_best_target_in_group(self, chat_id: int, group_id: str) -> Optional[TargetItem]:
         """그룹 내에서 가장 우선순위가 높은 타겟을 예매 모드로 활성화"""
-        async with self._lock:
+        async with self._locked(chat_id):
             group_targets = [t for t in self._targets.get(chat_id, {}).values()
                            if t.group_id == group_id and t.is_active]
             if not group_targets:
@@ -151,14 +454,70 @@ class TargetRegistry:
 
             # 선택된 타겟만 예매 모드로 설정
             best_target.scan_only = False
+            self._persist_locked(*group_targets)
 
             self._logger.info("Activated target %s for reservation in group %s",
                             best_target.target_id, group_id)
             return best_target
 
+    def lease_keys(self) -> List[str]:
+        """임대 대상 키 (활성 타겟의 `chat_id:target_id`)"""
+        return [f"{t.chat_id}:{t.target_id}" for t in self._iter_targets() if t.is_active]
+
+    def set_leased_targets(self, keys: Iterable[str]) -> None:
+        """LeaseKeeper가 갱신한 보유 임대 반영"""
+        leased = set()
+        for key in keys:
+            chat_id, _, target_id = key.partition(':')
+            leased.add((int(chat_id), target_id))
+        self._leased = leased
+
+    def can_dispatch(self, target: TargetItem) -> bool:
+        """이 인스턴스가 지금 예매를 넘길 수 있는 타겟인지 (쿨다운/다음 스캔 시각은 보지 않음)"""
+        if not target.is_active or target.pending:
+            return False
+        if self._leased is not None and (target.chat_id, target.target_id) not in self._leased:
+            return False
+        if target.group_id is not None and target.group_id in self.groups.busy_groups:
+            return False
+        return True
+
+    def is_dispatching(self, target: TargetItem) -> bool:
+        """예매를 넘겨 결과를 기다리는 중인지 (단일 타겟은 pending, 그룹 타겟은 그룹 선점 중)"""
+        if target.pending:
+            return True
+        return target.group_id is not None and target.group_id in self.groups.busy_groups
+
+    def watch_targets(self, predicate: Callable[[TargetItem], bool]) -> List[TargetItem]:
+        """락 없이 훑은 이 인스턴스의 활성 타겟 중 조건에 맞는 것 (SeatWatcher 감시 대상 선정용)
+
+        예매 중인 타겟도 포함 (감시는 유지하고 예매를 넘길 수 있는지는 can_dispatch로 확인).
+        """
+        leased = self._leased
+        return [
+            t for t in self._iter_targets()
+            if t.is_active and predicate(t) and (leased is None or (t.chat_id, t.target_id) in leased)
+        ]
+
+    def _is_due(self, target: TargetItem, now: datetime) -> bool:
+        if not self.can_dispatch(target):
+            return False
+        if target.cooldown_until and target.cooldown_until > now:
+            return False
+        return target.next_scan <= now
+
     async def fetch_next_target(self) -> Optional[TargetItem]:
-        now = datetime.utcnow()
-        async with self._lock:
+        # 기한이 지난 그룹 선점 회수 (다른 인스턴스도 다시 선점할 수 있도록 저장소 기록도 해제)
+        for group_id in self.groups.expire():
+            if self._lease_store is not None:
+                await self._run_lease_store(self._lease_store.compare_and_set_group, group_id, True, False)
+
+        # 후보 선택은 락 없이 훑고, 선택된 채팅의 락을 잡은 뒤 다시 확인
+        for _ in range(3):
+            now = datetime.utcnow()
+            leased = self._leased
+            # 예매가 진행 중이거나 끝난 그룹의 타겟은 스캔해도 쓸 곳이 없으므로 건너뜀
+            busy_groups = self.groups.busy_groups or None
             candidate: Optional[TargetItem] = None
             for chat_targets in self._targets.values():
                 for target in chat_targets.values():
@@ -168,34 +527,72 @@ class TargetRegistry:
                         continue
                     if target.next_scan > now:
                         continue
+                    if leased is not None and (target.chat_id, target.target_id) not in leased:
+                        continue
+                    if busy_groups is not None and target.group_id in busy_groups:
+                        continue
                     if candidate is None or target.next_scan < candidate.next_scan:
                         candidate = target
-            if candidate:
+            if candidate is None:
+                return None
+
+            chat_id = candidate.chat_id
+            async with self._locked(chat_id):
+                current = self._targets.get(chat_id, {}).get(candidate.target_id)
+                if current is not candidate or not self._is_due(candidate, now):
+                    continue  # 락을 기다리는 동안 다른 작업이 먼저 처리함
+                self._apply_rate_locked(candidate)
                 candidate.last_scan = now
                 candidate.next_scan = now + timedelta(seconds=candidate.scan_interval)
+                if self._store is not None:
+                    self._store.record_scan(candidate)
+                    self._maybe_compact_locked()
                 return candidate
         return None
 
     async def set_pending(self, chat_id: int, target_id: str, pending: bool) -> None:
-        async with self._lock:
+        async with self._locked(chat_id):
             target = self._targets.get(chat_id, {}).get(target_id)
             if not target:
                 return
             target.pending = pending
             if not pending:
                 target.cooldown_until = None
-            self._recompute_rates_locked(chat_id)
 
     async def mark_scan_failure(self, chat_id: int, target_id: str, backoff_seconds: float = 30.0) -> None:
-        async with self._lock:
+        async with self._locked(chat_id):
             target = self._targets.get(chat_id, {}).get(target_id)
             if not target:
                 return
             target.failure_count += 1
             target.cooldown_until = datetime.utcnow() + timedelta(seconds=backoff_seconds)
+            self._persist_locked(target)
+
+    async def expedite(self, service: str, departure: str, arrival: str, date: str,
+                       party: Tuple[int, int] = (1, 0)) -> int:
+        """같은 노선/날짜/조회 인원의 타겟을 바로 스캔하도록 다음 스캔 시각을 앞당김 (좌석이 열렸다는 이벤트 구독용)
+
+        쿨다운 중이거나 예매를 넘길 수 없는 타겟은 그대로 둠. 앞당긴 타겟 수 반환.
+        """
+        now = datetime.utcnow()
+        service = service.upper()
+        matches = [
+            t for t in self._iter_targets()
+            if (t.service or '').upper() == service and t.departure == departure
+            and t.arrival == arrival and t.date == date and t.next_scan > now
+            and party_size(t) == tuple(party)
+        ]
+        count = 0
+        for target in matches:
+            async with self._locked(target.chat_id):
+                if not self.can_dispatch(target) or (target.cooldown_until and target.cooldown_until > now):
+                    continue
+                target.next_scan = now
+                count += 1
+        return count
 
     async def handle_reservation_result(self, chat_id: int, target_id: str, success: bool) -> None:
-        async with self._lock:
+        async with self._locked(chat_id):
             target = self._targets.get(chat_id, {}).get(target_id)
             if not target:
                 return
@@ -203,7 +600,7 @@ class TargetRegistry:
             now = datetime.utcnow()
             if success:
                 target.last_success = now
-                target.is_active = False
+                self._set_active_locked(target, False)
                 target.cooldown_until = now + timedelta(minutes=5)
 
                 # 예매 성공 시 같은 그룹의 다른 타겟들도 모두 비활성화
@@ -215,7 +612,7 @@ class TargetRegistry:
                 target.failure_count += 1
                 cooldown = min(120, 10 * target.failure_count)
                 target.cooldown_until = now + timedelta(seconds=cooldown)
-            self._recompute_rates_locked(chat_id)
+            self._persist_locked(target)
 
     async def _deactivate_group_targets_locked(self, chat_id: int, group_id: str, exclude_target_id: Optional[str] = None) -> int:
         """그룹의 모든 타겟을 비활성화 (특정 타겟 제외 가능)"""
@@ -226,106 +623,134 @@ class TargetRegistry:
             if (target.group_id == group_id and
                 target.target_id != exclude_target_id and
                 target.is_active):
-                target.is_active = False
+                self._set_active_locked(target, False)
                 target.pending = False
                 target.cooldown_until = datetime.utcnow() + timedelta(minutes=5)
                 deactivated_count += 1
+                self._persist_locked(target)
                 self._logger.info("Deactivated target %s in group %s", target.target_id, group_id)
 
         return deactivated_count
 
     async def deactivate_group(self, chat_id: int, group_id: str) -> int:
         """그룹 전체 비활성화 (외부에서 호출 가능)"""
-        async with self._lock:
+        async with self._locked(chat_id):
             return await self._deactivate_group_targets_locked(chat_id, group_id)
 
-    async def _get_group_lock(self, group_id: str) -> asyncio.Lock:
-        """그룹별 락 가져오기 (없으면 생성)"""
-        if group_id not in self._group_reservation_locks:
-            self._group_reservation_locks[group_id] = asyncio.Lock()
-        return self._group_reservation_locks[group_id]
-
-    async def is_group_already_reserved(self, group_id: str) -> bool:
-        """그룹이 이미 예매되었는지 확인"""
-        return self._group_reserved.get(group_id, False)
-
-    async def mark_group_reserved(self, group_id: str) -> None:
-        """그룹을 예매 완료로 표시"""
-        self._group_reserved[group_id] = True
-        self._logger.info("Group %s marked as reserved", group_id)
-
-    async def try_reserve_group(self, group_id: str) -> bool:
-        """그룹 예매 시도 (이미 예매되었으면 False 반환)"""
-        if await self.is_group_already_reserved(group_id):
-            return False
-        await self.mark_group_reserved(group_id)
-        return True
+    async def _run_lease_store(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def group_state(self, group_id: str) -> str:
+        return self.groups.state(group_id)
+
+    async def claim_group(self, group_id: str) -> Optional[str]:
+        """그룹 선점 (idle일 때만 성공). 이후 전이에 쓸 토큰 반환, 실패하면 None"""
+        token = self.groups.claim(group_id)
+        if token is None:
+            return None
+        if self._lease_store is not None:
+            # 다른 인스턴스와의 경쟁은 저장소 CAS 한 번으로 결정
+            acquired = await self._run_lease_store(self._lease_store.compare_and_set_group, group_id, False, True)
+            if not acquired:
+                self.groups.release(group_id, token)
+                return None
+        return token
+
+    async def begin_group_reservation(self, group_id: str, token: str, target_id: str) -> bool:
+        """claiming → reserving (선점이 회수되었으면 False)"""
+        return self.groups.begin_reserving(group_id, token, target_id)
+
+    async def start_group_reservation(self, group_id: str, token: str) -> bool:
+        """예매 실행기가 작업을 꺼낼 때 reserving 기한 시작 (선점이 이미 끝났으면 False)"""
+        return self.groups.start_reserving(group_id, token)
+
+    async def release_group_claim(self, group_id: str, token: str) -> None:
+        """예매를 시작하지 않고 선점 포기"""
+        if self.groups.release(group_id, token) and self._lease_store is not None:
+            await self._run_lease_store(self._lease_store.compare_and_set_group, group_id, True, False)
+
+    async def finish_group_reservation(self, group_id: str, token: str, success: bool) -> None:
+        """reserving → reserved / failed (실패한 그룹은 잠시 뒤 idle로 돌아가 다시 선점 가능)"""
+        # 이 예매가 실패해도 회수된 이전 선점의 늦은 성공으로 그룹은 reserved일 수 있음
+        reserved = self.groups.complete(group_id, token, success)
+        if reserved is None:
+            return
+        if reserved:
+            if self._store is not None:
+                self._store.set_group_reserved(group_id, True)
+                self._maybe_compact_locked()
+            if self._lease_store is not None:
+                await self._run_lease_store(self._lease_store.confirm_group, group_id)
+            self._logger.info("Group %s marked as reserved", group_id)
+        elif self._lease_store is not None:
+            await self._run_lease_store(self._lease_store.compare_and_set_group, group_id, True, False)
 
     async def activate_target(self, chat_id: int, target_id: str) -> Optional[TargetItem]:
-        async with self._lock:
+        async with self._locked(chat_id):
             target = self._targets.get(chat_id, {}).get(target_id)
             if not target:
                 return None
-            target.is_active = True
+            self._set_active_locked(target, True)
             target.pending = False
             target.cooldown_until = None
             target.next_scan = datetime.utcnow()
-            self._recompute_rates_locked(chat_id)
+            self._apply_rate_locked(target)
+            self._rescale_pending_locked(chat_id)
+            self._persist_locked(target)
             return target
 
-    def _recompute_rates_locked(self, chat_id: int) -> None:
-        targets = self._targets.get(chat_id, {})
-        active = [t for t in targets.values() if t.is_active]
-        count = len(active)
-        if not count:
+    def _set_active_locked(self, target: TargetItem, active: bool) -> None:
+        """활성 상태 변경과 채팅별 엔티티 수를 함께 갱신"""
+        if target.is_active == active:
             return
-
-        # 안전율을 적용한 전체 제한: 95회/분
-        total_limit = 95.0
-
-        # 그룹별로 타겟을 분류하여 처리
-        groups = defaultdict(list)
-        individual_targets = []
-
-        for target in active:
-            if target.group_id:
-                groups[target.group_id].append(target)
-            else:
-                individual_targets.append(target)
-
-        # 전체 엔티티 수 계산 (그룹은 1개로 계산)
-        total_entities = len(groups) + len(individual_targets)
-
-        if total_entities == 0:
+        target.is_active = active
+        allocation = self._allocations[target.chat_id]
+        if active:
+            allocation.add(target)
+        else:
+            allocation.discard(target)
+
+    def rate_for(self, target: TargetItem) -> float:
+        """현재 채팅의 활성 엔티티 수 기준 타겟의 분당 스캔 할당량 (O(1))"""
+        allocation = self._allocations.get(target.chat_id)
+        if allocation is None or not allocation.entities:
+            return 0.0
+
+        # 엔티티당 기본 할당량 (그룹은 1개로 계산하고, 그룹 내에서는 동등하게 분배)
+        rate = self.TOTAL_RATE_LIMIT / allocation.entities
+        if target.group_id:
+            rate /= max(1, allocation.groups.get(target.group_id, 1))
+        user_limit = target.user_limit if target.user_limit and target.user_limit > 0 else self.TOTAL_RATE_LIMIT
+        return min(rate, user_limit)
+
+    def _rescale_pending_locked(self, chat_id: int) -> int:
+        """채팅 할당량이 줄었을 때 (엔티티/그룹 코스 증가) 이미 잡혀 있던 다음 스캔 시각을 새 간격으로 늦춤
+
+        이전 간격으로 잡힌 next_scan을 그대로 두면 한 주기 동안 채팅 전체가 할당량을 넘어 스캔하므로,
+        마지막 스캔 + 새 간격으로 다시 잡음. 타겟 추가/활성화 때만 호출 (채팅 타겟 수만큼, 스캔마다 아님).
+        """
+        rescaled = 0
+        for target in self._targets.get(chat_id, {}).values():
+            if not target.is_active or target.last_scan is None:
+                continue
+            old_interval = target.scan_interval
+            self._apply_rate_locked(target)
+            if target.scan_interval <= old_interval:
+                continue
+            next_scan = target.last_scan + timedelta(seconds=target.scan_interval)
+            if next_scan > target.next_scan:
+                target.next_scan = next_scan
+                rescaled += 1
+                if self._store is not None:
+                    self._store.record_scan(target)
+        return rescaled
+
+    def _apply_rate_locked(self, target: TargetItem) -> None:
+        """할당량은 스캔/조회 시점에 해당 타겟에만 반영 (전체 재계산 없음)"""
+        if not target.is_active:
             return
-
-        # 엔티티당 기본 할당량
-        per_entity_rate = total_limit / total_entities
-        now = datetime.utcnow()
-
-        # 개별 타겟들 처리
-        for target in individual_targets:
-            user_limit = target.user_limit if target.user_limit and target.user_limit > 0 else total_limit
-            target.rate_per_minute = min(per_entity_rate, user_limit)
-            target.scan_interval = max(1.0, 60.0 / target.rate_per_minute) if target.rate_per_minute > 0 else 60.0
-            if target.next_scan < now:
-                target.next_scan = now
-
-        # 그룹별 타겟들 처리
-        for group_id, group_targets in groups.items():
-            group_size = len(group_targets)
-            # 그룹 내에서는 동등하게 분배
-            per_target_in_group = per_entity_rate / group_size if group_size > 0 else per_entity_rate
-
-            for target in group_targets:
-                user_limit = target.user_limit if target.user_limit and target.user_limit > 0 else total_limit
-                target.rate_per_minute = min(per_target_in_group, user_limit)
-                target.scan_interval = max(1.0, 60.0 / target.rate_per_minute) if target.rate_per_minute > 0 else 60.0
-                if target.next_scan < now:
-                    target.next_scan = now
-
-        self._logger.info("Rate recomputed for chat %s: %d groups, %d individual targets, %.2f rate per entity",
-                         chat_id, len(groups), len(individual_targets), per_entity_rate)
+        target.rate_per_minute = self.rate_for(target)
+        target.scan_interval = _scan_interval(target.rate_per_minute)
 
 
 class ScannerWorker:
@@ -349,6 +774,9 @@ class ScannerWorker:
         self._stop_event.clear()
         self._task = loop.create_task(self.run())
 
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
     async def stop(self) -> None:
         self._stop_event.set()
         if self._task:
@@ -368,53 +796,64 @@ class ScannerWorker:
                 train_payload = await self.train_reservation.scan_for_available_train(target)
                 if not train_payload:
                     continue
-
-                # scan_only 모드인 경우 표가 발견되면 같은 그룹의 최적 타겟을 예매 모드로 활성화
-                if target.scan_only and target.group_id:
-                    self._logger.info("Available train found in scan_only mode for target %s, checking group %s",
-                                    target.target_id, target.group_id)
-
-                    # 그룹별 락 획득
-                    group_lock = await self.registry._get_group_lock(target.group_id)
-                    async with group_lock:
-                        # 이미 예매된 그룹인지 확인
-                        if await self.registry.is_group_already_reserved(target.group_id):
-                            self._logger.info("Group %s already reserved, skipping", target.group_id)
-                            continue
-
-                        # 그룹 예매 시도
-                        if not await self.registry.try_reserve_group(target.group_id):
-                            self._logger.info("Failed to reserve group %s, skipping", target.group_id)
-                            continue
-
-                        self._logger.info("Successfully reserved group %s, activating best target", target.group_id)
-                        best_target = await self.registry.activate_best_target_in_group(
-                            target.chat_id, target.group_id
-                        )
-                        if best_target:
-                            # 최적 타겟으로 예매 진행
-                            await self.registry.set_pending(best_target.chat_id, best_target.target_id, True)
-                            await self.reservation_executor.enqueue(
-                                ReservationTask(target=best_target, train_payload=train_payload)
-                            )
-                    continue
-
-                # 일반 예매 모드 (scan_only=False 또는 단일 타겟)
-                await self.registry.set_pending(target.chat_id, target.target_id, True)
-                await self.reservation_executor.enqueue(
-                    ReservationTask(target=target, train_payload=train_payload)
-                )
+                await self.dispatch(target, train_payload)
             except asyncio.CancelledError:
                 raise
             except Exception as exc:
                 self._logger.exception("Scanner worker error: %s", exc)
                 await asyncio.sleep(2.0)
 
+    async def dispatch(self, target: TargetItem, train_payload: Dict[str, Any]) -> None:
+        """표를 찾은 타겟을 예매 실행기에 넘김 (스캔 외에 SeatWatcher도 이 경로로 넘김)"""
+        if target.group_id:
+            await self._reserve_for_group(target, train_payload)
+            return
+
+        # 그룹에 속하지 않은 단일 타겟
+        await self.registry.set_pending(target.chat_id, target.target_id, True)
+        await self.reservation_executor.enqueue(
+            ReservationTask(target=target, train_payload=train_payload)
+        )
+
+    async def _reserve_for_group(self, target: TargetItem, train_payload: Dict[str, Any]) -> None:
+        """그룹을 선점하고 예매할 타겟을 정해 실행기에 넘김
+
+        scan_only 타겟이 표를 찾으면 그룹에서 우선순위가 가장 높은 타겟을 예매 모드로 활성화해 예매하고,
+        예매 모드 타겟은 자기 자신을 예매함 (실행기에 그룹 전략이 있으면 전략이 코스를 고름).
+        선점은 예매 결과가 보고될 때 reserved/failed로 끝남.
+        """
+        group_id = target.group_id
+        token = await self.registry.claim_group(group_id)
+        if token is None:
+            self._logger.info("Group %s is %s, skipping", group_id, self.registry.group_state(group_id))
+            return
+
+        if target.scan_only and self.reservation_executor.group_strategy is None:
+            self._logger.info("Available train found in scan_only mode for target %s, claimed group %s",
+                              target.target_id, group_id)
+            reserve_target = await self.registry.activate_best_target_in_group(target.chat_id, group_id)
+        else:
+            # 그룹 전략이 있으면 표를 찾은 타겟을 기점으로 전략이 그룹 전체를 처리
+            reserve_target = target
+        if reserve_target is None:
+            await self.registry.release_group_claim(group_id, token)
+            return
+        if not await self.registry.begin_group_reservation(group_id, token, reserve_target.target_id):
+            self._logger.warning("Claim on group %s expired before reservation started", group_id)
+            return
+
+        await self.registry.set_pending(reserve_target.chat_id, reserve_target.target_id, True)
+        await self.reservation_executor.enqueue(
+            ReservationTask(target=reserve_target, train_payload=train_payload, group_token=token)
+        )
+
 
 class ReservationExecutor:
-    def __init__(self, train_reservation, registry: TargetRegistry) -> None:
+    def __init__(self, train_reservation, registry: TargetRegistry, group_strategy=None) -> None:
         self.train_reservation = train_reservation
         self.registry = registry
+        # 설정되면 그룹 타겟은 전략의 execute(task, bot)로 예매 (예: SpeculativeGroupReservation)
+        self.group_strategy = group_strategy
         self.queue: asyncio.Queue[ReservationTask] = asyncio.Queue()
         self._stop_event = asyncio.Event()
         self._task: Optional[asyncio.Task] = None
@@ -430,6 +869,9 @@ class ReservationExecutor:
         self._stop_event.clear()
         self._task = loop.create_task(self.run())
 
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
     async def stop(self) -> None:
         self._stop_event.set()
         if self._task:
@@ -454,11 +896,26 @@ class ReservationExecutor:
 
     async def _process_task(self, reservation_task: ReservationTask) -> None:
         target = reservation_task.target
+        if target.group_id and reservation_task.group_token:
+            # 그룹 예매 기한은 큐에서 꺼낸 지금부터 (대기 중에 선점이 회수/종료되었으면 예매하지 않음)
+            if not await self.registry.start_group_reservation(target.group_id, reservation_task.group_token):
+                self._logger.warning("Group %s claim ended while queued, skipping target %s",
+                                     target.group_id, target.target_id)
+                await self.registry.set_pending(target.chat_id, target.target_id, False)
+                self.queue.task_done()
+                return
+        result_target = target  # 예매 결과를 기록할 타겟 (그룹 전략은 다른 코스로 예매할 수 있음)
         success = False
         try:
-            success = await self.train_reservation.execute_auto_reservation(
-                reservation_task, self.bot
-            )
+            if self.group_strategy is not None and target.group_id:
+                winner = await self.group_strategy.execute(reservation_task, self.bot)
+                success = winner is not None
+                if winner is not None:
+                    result_target = winner
+            else:
+                success = await self.train_reservation.execute_auto_reservation(
+                    reservation_task, self.bot
+                )
 
             # 예매 성공 시 그룹 정보와 함께 추가 알림
             if success and target.group_id and self.bot:
@@ -466,7 +923,7 @@ class ReservationExecutor:
                     # 같은 그룹의 다른 타겟들 확인
                     group_targets = await self.registry.get_targets_by_group(target.chat_id, target.group_id)
                     other_active_count = sum(1 for t in group_targets
-                                           if t.target_id != target.target_id and t.is_active)
+                                           if t.target_id != result_target.target_id and t.is_active)
 
                     if other_active_count > 0:
                         additional_msg = (
@@ -491,12 +948,9 @@ class ReservationExecutor:
                 except Exception:
                     self._logger.debug("Failed to notify chat %s", target.chat_id)
 
-            # 예매 실패 시 그룹 예매 상태 리셋
-            if not success and target.group_id:
-                # 그룹 예매 상태를 False로 리셋하여 다른 타겟이 시도할 수 있도록 함
-                self.registry._group_reserved[target.group_id] = False
-                self._logger.info("Reset group reservation status for group %s due to failure", target.group_id)
-
         finally:
-            await self.registry.handle_reservation_result(target.chat_id, target.target_id, success)
+            # 성공/실패 반환/예외 모두 그룹 선점을 reserved 또는 failed로 끝냄 (실패 그룹은 다시 시도 가능)
+            if target.group_id and reservation_task.group_token:
+                await self.registry.finish_group_reservation(target.group_id, reservation_task.group_token, success)
+            await self.registry.handle_reservation_result(result_target.chat_id, result_target.target_id, success)
             self.queue.task_done()
@@ -0,0 +1,46 @@
+"""
+비동기 토큰 버킷 레이트 리미터
+"""
+import asyncio
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """초당 `rate`개의 토큰이 채워지고 최대 `capacity`개까지 쌓이는 토큰 버킷"""
+
+    def __init__(self, rate: float, capacity: float = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """토큰이 있으면 즉시 소비하고 True, 없으면 False"""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay_for(self, tokens: float = 1.0) -> float:
+        """`tokens`개가 모일 때까지 남은 시간(초)"""
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """토큰이 모일 때까지 대기 후 소비 (요청 순서대로 처리)"""
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.delay_for(tokens))
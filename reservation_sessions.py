@@ -0,0 +1,130 @@
+"""
+채팅별 단일 예약 세션 관리 - 여러 사용자가 동시에 /start 예약을 진행할 수 있도록 분리
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from status_store import DebouncedJsonWriter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReservationSession:
+    chat_id: int
+    stop_event: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+    state: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self.state.get('is_running')) and not self.stop_event.is_set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'chat_id': self.chat_id, **self.state}
+
+
+class SessionManager:
+    """채팅별 ReservationSession 보관소
+
+    - 채팅마다 자신의 stop_event, 예약 태스크, 상태를 가짐
+    - 같은 채팅에서 새 예약을 시작하면 이전 세션만 중단 (다른 채팅에는 영향 없음)
+    - 끝난 세션은 `ttl_seconds` 동안 상태 조회용으로 남겨둔 뒤 제거
+    - 상태 조회는 메모리에서만, 파일 기록은 DebouncedJsonWriter가 루프 밖에서 모아서 수행
+    """
+
+    def __init__(
+        self,
+        status_file: str = "reservation_status.json",
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.status_file = status_file
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._sessions: Dict[int, ReservationSession] = {}
+        self._writer = DebouncedJsonWriter(status_file)
+
+    def get(self, chat_id: int) -> Optional[ReservationSession]:
+        return self._sessions.get(chat_id)
+
+    def start(self, chat_id: int) -> ReservationSession:
+        """예약 시작 - 같은 채팅의 이전 세션은 중단"""
+        self.evict_expired()
+        previous = self._sessions.get(chat_id)
+        if previous is not None:
+            self._halt(previous)
+        session = ReservationSession(chat_id=chat_id, updated_at=self._clock())
+        session.state = {
+            'is_running': True,
+            'should_stop': False,
+            'last_check': datetime.now().isoformat(),
+        }
+        self._sessions[chat_id] = session
+        self._save_status()
+        logger.info(f"예약 시작 - chat_id: {chat_id} (활성 세션 {self.active_count()}개)")
+        return session
+
+    def stop(self, chat_id: int) -> bool:
+        """예약 중단 - 실행 중인 세션이 있었으면 True"""
+        session = self._sessions.get(chat_id)
+        if session is None or not session.is_running:
+            return False
+        session.state['should_stop'] = True
+        self._halt(session)
+        self._save_status()
+        logger.info(f"예약 중단 요청 - chat_id: {chat_id}")
+        return True
+
+    def finish(self, session: ReservationSession) -> None:
+        """세션 종료 처리 (태스크 종료 시 호출, 이미 새 세션으로 교체됐으면 무시)"""
+        session.state['is_running'] = False
+        session.state['last_check'] = datetime.now().isoformat()
+        session.updated_at = self._clock()
+        if self._sessions.get(session.chat_id) is session:
+            self._save_status()
+
+    def is_running(self, chat_id: int) -> bool:
+        session = self._sessions.get(chat_id)
+        return session is not None and session.is_running
+
+    def should_stop(self, chat_id: int) -> bool:
+        session = self._sessions.get(chat_id)
+        return session is not None and session.stop_event.is_set()
+
+    def active_count(self) -> int:
+        return sum(1 for session in self._sessions.values() if session.is_running)
+
+    def evict_expired(self) -> int:
+        """종료 후 TTL이 지난 세션 제거"""
+        cutoff = self._clock() - self.ttl_seconds
+        expired = [
+            chat_id for chat_id, session in self._sessions.items()
+            if not session.is_running and session.updated_at < cutoff
+        ]
+        for chat_id in expired:
+            del self._sessions[chat_id]
+        if expired:
+            self._save_status()
+        return len(expired)
+
+    def _halt(self, session: ReservationSession) -> None:
+        session.stop_event.set()
+        session.state['is_running'] = False
+        session.updated_at = self._clock()
+        if session.task is not None and not session.task.done():
+            session.task.cancel()
+
+    def _save_status(self) -> None:
+        """세션 상태 파일 저장 예약 (chat_id별)"""
+        status = {str(chat_id): session.to_dict() for chat_id, session in self._sessions.items()}
+        self._writer.update(status)
+
+    async def flush(self) -> None:
+        """대기 중인 상태 기록을 즉시 수행"""
+        await self._writer.flush()
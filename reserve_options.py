@@ -0,0 +1,52 @@
+"""
+예약 요청 인자 - 스캔에서 순위를 매긴 좌석 등급을 그대로 예약 (다른 등급으로 넘어가지 않도록 *_ONLY 사용)
+"""
+from typing import Any, Dict, List, Optional
+
+from letskorail.options import SeatOption
+from SRT import SeatType
+
+from scoring import GENERAL, SPECIAL
+
+_KTX_CLASS_OPTIONS = {GENERAL: SeatOption.GENERAL_ONLY, SPECIAL: SeatOption.SPECIAL_ONLY}
+_SRT_CLASS_TYPES = {GENERAL: SeatType.GENERAL_ONLY, SPECIAL: SeatType.SPECIAL_ONLY}
+
+# 후보에 등급이 없을 때 (순위를 매기지 않은 payload) 타겟 metadata['seat'] 기준
+_KTX_SEAT_OPTIONS = {
+    'SPECIAL': SeatOption.SPECIAL_FIRST,
+    'SPECIAL_ONLY': SeatOption.SPECIAL_ONLY,
+    'GENERAL_ONLY': SeatOption.GENERAL_ONLY,
+    'GENERAL_FIRST': SeatOption.GENERAL_FIRST,
+}
+_SRT_SEAT_TYPES = {
+    'SPECIAL': SeatType.SPECIAL_FIRST,
+    'SPECIAL_ONLY': SeatType.SPECIAL_ONLY,
+    'GENERAL_ONLY': SeatType.GENERAL_ONLY,
+    'GENERAL_FIRST': SeatType.GENERAL_FIRST,
+}
+
+
+def _seat_pref(target) -> str:
+    return str(target.metadata.get('seat', 'GENERAL_FIRST')).upper()
+
+
+def ktx_reserve_kwargs(target, candidate: Dict[str, Any]) -> Dict[str, Any]:
+    """Korail.reserve 인자 - 좌석 배치로 고른 좌석 > 후보 등급 > 타겟 설정 순"""
+    seat_opt = candidate.get('seat_opt')
+    if not seat_opt:
+        seat_opt = _KTX_CLASS_OPTIONS.get(candidate.get('seat_class'))
+    if not seat_opt:
+        seat_opt = _KTX_SEAT_OPTIONS.get(_seat_pref(target), SeatOption.GENERAL_FIRST)
+    return {'seat_opt': seat_opt}
+
+
+def srt_reserve_kwargs(target, candidate: Dict[str, Any], passengers: Optional[List[Any]] = None) -> Dict[str, Any]:
+    """SRT.reserve 인자 - 후보 등급 > 타겟 설정 순"""
+    seat_type = _SRT_CLASS_TYPES.get(candidate.get('seat_class'))
+    if seat_type is None:
+        seat_type = _SRT_SEAT_TYPES.get(_seat_pref(target), SeatType.GENERAL_FIRST)
+    return {
+        'passengers': passengers or None,
+        'special_seat': seat_type,
+        'window_seat': bool(target.metadata.get('window_seat', False)),
+    }
@@ -0,0 +1,146 @@
+"""
+열차 후보 점수 계산 - 조회 결과 중 좌석이 있는 열차를 타겟의 선호 조건으로 걸러 순위를 매김
+"""
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Iterable, List, Optional
+
+GENERAL = "GENERAL"
+SPECIAL = "SPECIAL"
+
+
+def _hhmm_minutes(value: Any) -> Optional[int]:
+    """'HHMMSS' / 'HHMM' 문자열 또는 datetime/time을 자정 기준 분으로 변환"""
+    if value is None:
+        return None
+    if hasattr(value, 'hour') and hasattr(value, 'minute'):
+        return value.hour * 60 + value.minute
+    text = str(value).strip().replace(':', '')
+    if len(text) < 4 or not text[:4].isdigit():
+        return None
+    return int(text[:2]) * 60 + int(text[2:4])
+
+
+@dataclass
+class PreferenceProfile:
+    """타겟별 선호 조건 (target.metadata['preference']에 dict로 저장)
+
+    시간 창/소요 시간/가격 상한/좌석 등급은 조건을 벗어나는 열차를 후보에서 제외하고,
+    남은 후보는 선호 출발 시각과의 차이, 소요 시간, 가격의 가중 합이 작은 순으로 정렬.
+    """
+
+    preferred_time: Optional[str] = None  # HHMMSS, 이 시각에 가까운 출발을 선호
+    window_start: Optional[str] = None  # HHMMSS, 이 시각 이후 출발만
+    window_end: Optional[str] = None  # HHMMSS, 이 시각까지 출발만
+    max_duration_minutes: Optional[int] = None
+    price_cap: Optional[int] = None  # 원, 가격 정보가 없는 열차(SRT)는 제외하지 않음
+    seat_class: Optional[str] = None  # GENERAL / SPECIAL / None(아무 등급)
+    time_weight: float = 1.0  # 선호 시각과 1분 차이당 점수
+    duration_weight: float = 0.5  # 소요 시간 1분당 점수
+    price_weight: float = 0.01  # 가격 100원당 1점
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "PreferenceProfile":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (data or {}).items() if k in known})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+    @classmethod
+    def for_target(cls, target) -> "PreferenceProfile":
+        """저장된 프로필이 있으면 사용하고, 없으면 타겟 시각/좌석 설정에서 기본 프로필 생성"""
+        stored = target.metadata.get('preference')
+        if stored:
+            profile = cls.from_dict(stored)
+        else:
+            seat = str(target.metadata.get('seat', '')).upper()
+            profile = cls(
+                window_start=target.time,
+                seat_class=SPECIAL if seat == 'SPECIAL_ONLY' else GENERAL if seat == 'GENERAL_ONLY' else None,
+            )
+        if profile.preferred_time is None:
+            profile.preferred_time = target.time
+        if profile.window_end is None:
+            profile.window_end = getattr(target, 'time_end', None)
+        return profile
+
+
+@dataclass
+class TrainCandidate:
+    train: Any
+    dep_minutes: int
+    duration_minutes: int
+    price: Optional[int]
+    seat_class: str  # 예약할 수 있는 등급 (선호 등급이 없으면 일반실 우선)
+    score: float
+
+
+def _train_fields(train: Any, service: str):
+    """(출발, 도착 시각, 일반실 여부, 특실 여부, 일반실 가격, 특실 가격)"""
+    if service == 'KTX':
+        return (
+            train.dpt_time, train.arv_time,
+            train.has_general_seat(), train.has_special_seat(),
+            getattr(train, 'general_price', None), getattr(train, 'special_price', None),
+        )
+    return (
+        train.dep_time, train.arr_time,
+        train.general_seat_available(), train.special_seat_available(),
+        None, None,
+    )
+
+
+def score_train(train: Any, service: str, profile: PreferenceProfile) -> Optional[TrainCandidate]:
+    """조건을 만족하면 후보 반환, 벗어나면 None"""
+    dep, arr, has_general, has_special, general_price, special_price = _train_fields(train, service)
+    dep_minutes = _hhmm_minutes(dep)
+    arr_minutes = _hhmm_minutes(arr)
+    if dep_minutes is None or arr_minutes is None:
+        return None
+
+    start = _hhmm_minutes(profile.window_start)
+    end = _hhmm_minutes(profile.window_end)
+    if (start is not None and dep_minutes < start) or (end is not None and dep_minutes > end):
+        return None
+    duration = (arr_minutes - dep_minutes) % (24 * 60)
+    if profile.max_duration_minutes is not None and duration > profile.max_duration_minutes:
+        return None
+
+    if profile.seat_class == SPECIAL:
+        if not has_special:
+            return None
+        seat_class, price = SPECIAL, special_price
+    elif profile.seat_class == GENERAL:
+        if not has_general:
+            return None
+        seat_class, price = GENERAL, general_price
+    elif has_general:
+        seat_class, price = GENERAL, general_price
+    elif has_special:
+        seat_class, price = SPECIAL, special_price
+    else:
+        return None
+    if profile.price_cap is not None and price and price > profile.price_cap:
+        return None
+
+    preferred = _hhmm_minutes(profile.preferred_time)
+    score = duration * profile.duration_weight
+    if preferred is not None:
+        score += abs(dep_minutes - preferred) * profile.time_weight
+    if price:
+        score += price * profile.price_weight
+    return TrainCandidate(
+        train=train,
+        dep_minutes=dep_minutes,
+        duration_minutes=duration,
+        price=price,
+        seat_class=seat_class,
+        score=score,
+    )
+
+
+def rank_trains(trains: Iterable[Any], service: str, profile: PreferenceProfile) -> List[TrainCandidate]:
+    """조건을 만족하는 열차를 점수 순(좋은 것부터)으로 반환. 동점이면 조회 결과 순서 유지"""
+    candidates = [c for c in (score_train(train, service, profile) for train in trains) if c is not None]
+    candidates.sort(key=lambda c: c.score)
+    return candidates
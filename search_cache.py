@@ -0,0 +1,120 @@
+"""
+열차 조회 공유 캐시 - 대화형 조회/다시검색/백그라운드 스캔이 같은 조건을 짧은 간격으로 조회하면 업스트림 요청 하나를 함께 사용
+
+결과를 받은 시각을 저장하고 신선도는 읽는 쪽이 정함 (스캔은 1~3초, 목록 보기는 더 길게).
+같은 키를 조회 중이면 TTL과 상관없이 진행 중인 요청을 함께 기다림 (더 새로운 결과이므로).
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fetched_at: float
+    hits: int = 0  # 캐시에서 바로 응답한 횟수
+    joined: int = 0  # 진행 중인 조회를 함께 기다린 횟수
+    last_hit: Optional[float] = None
+
+
+@dataclass
+class SearchCacheStats:
+    hits: int = 0
+    joined: int = 0
+    misses: int = 0
+    errors: int = 0
+    evictions: int = 0
+    by_kind: Dict[str, int] = field(default_factory=dict)  # 키 첫 요소(서비스)별 업스트림 조회 수
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.joined + self.misses
+        return (self.hits + self.joined) / total if total else 0.0
+
+
+class SearchCache:
+    """키별 조회 결과 캐시 + 진행 중 요청 병합
+
+    `get(key, fetch, ttl)`: `ttl`초 안에 받은 결과가 있으면 그대로, 같은 키를 조회 중이면 그 결과를,
+    없으면 `fetch()`를 실행해 저장. 예외는 캐시하지 않음 (함께 기다리던 호출에는 같은 예외 전달).
+    `max_age`보다 오래된 항목은 어떤 호출도 쓸 수 없으므로 자리가 필요할 때 먼저 정리.
+    """
+
+    def __init__(
+        self,
+        default_ttl: float = 2.0,
+        max_age: float = 60.0,
+        max_entries: int = 512,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.default_ttl = default_ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = SearchCacheStats()
+        self._logger = logging.getLogger(__name__ + ".SearchCache")
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        ttl = self.default_ttl if ttl is None else ttl
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.fetched_at <= ttl:
+            entry.hits += 1
+            entry.last_hit = now
+            self.stats.hits += 1
+            return entry.value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats.joined += 1
+            if entry is not None:
+                entry.joined += 1
+            return await asyncio.shield(inflight)
+
+        self.stats.misses += 1
+        kind = str(key[0]) if isinstance(key, tuple) and key else str(key)
+        self.stats.by_kind[kind] = self.stats.by_kind.get(kind, 0) + 1
+        future = asyncio.ensure_future(fetch())
+        self._inflight[key] = future
+        try:
+            value = await asyncio.shield(future)
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        self._store(key, value, entry)
+        return value
+
+    def _store(self, key: Hashable, value: Any, previous: Optional[CacheEntry]) -> None:
+        now = self._clock()
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            for stale in [k for k, e in self._entries.items() if now - e.fetched_at > self.max_age]:
+                del self._entries[stale]
+                self.stats.evictions += 1
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+                self.stats.evictions += 1
+        entry = CacheEntry(value=value, fetched_at=now)
+        if previous is not None:
+            # 항목별 적중 수는 새 결과로 바뀌어도 이어서 셈
+            entry.hits, entry.joined, entry.last_hit = previous.hits, previous.joined, previous.last_hit
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def entry_stats(self, limit: int = 10) -> List[Tuple[Hashable, CacheEntry]]:
+        """적중(바로 응답 + 함께 기다림)이 많은 항목 순"""
+        ranked = sorted(self._entries.items(), key=lambda item: item[1].hits + item[1].joined, reverse=True)
+        return ranked[:limit]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,172 @@
+"""
+KTX 객차/좌석 배치 캐시 - 스캔 단계에서 창측/좌석 등급 조건을 실제 좌석으로 확인
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+GENERAL_CLASS = "1"  # h_psrm_cl_cd 일반실
+SPECIAL_CLASS = "2"  # 특실
+WINDOW_POSITIONS = ("창측", "1인")
+ORDINARY_SEAT_TYPES = ("일반석", "2층석")  # 휠체어석/유아동반석 등은 자동 배정 대상에서 제외
+
+TrainKey = Tuple[str, str, str]  # (열차 번호, 출발 날짜, 출발 시각)
+UpstreamCall = Callable[[Callable[[], Any]], Awaitable[Any]]
+
+
+@dataclass
+class SeatPreference:
+    """타겟의 좌석 조건 (metadata의 인원/seat/window_only에서 생성)"""
+
+    count: int = 1
+    seat_class: Optional[str] = None  # GENERAL_CLASS / SPECIAL_CLASS / None(일반실 우선)
+    window_only: bool = False
+
+    @property
+    def strict(self) -> bool:
+        """검색 결과의 잔여석 표시만으로는 판단할 수 없는 조건이 있는지"""
+        return self.window_only
+
+    @classmethod
+    def for_target(cls, target) -> "SeatPreference":
+        metadata = target.metadata
+        count = int(metadata.get('adult_count', 1) or 0) + int(metadata.get('child_count', 0) or 0)
+        seat = str(metadata.get('seat', '')).upper()
+        return cls(
+            count=max(1, count),
+            seat_class=SPECIAL_CLASS if seat == 'SPECIAL_ONLY' else GENERAL_CLASS if seat == 'GENERAL_ONLY' else None,
+            window_only=bool(metadata.get('window_only', False)),
+        )
+
+
+@dataclass
+class CarMap:
+    car_no: str
+    seat_class: str
+    seats: Any  # letskorail Seats (좌석 정보가 없으면 None)
+
+
+def _car_map(car) -> CarMap:
+    """객차 좌석 조회 (CAR_DETAIL 요청 1회, 블로킹)"""
+    return CarMap(car_no=car.h_srcar_no, seat_class=car.h_psrm_cl_cd, seats=car.seats)
+
+
+def _lazy_cars(train) -> Any:
+    """train.cars 지연 조회 - 좌석은 _car_map에서 객차마다 차례로 조회 (블로킹)"""
+    return train.cars
+
+
+def select_seats(car_maps: List[CarMap], preference: SeatPreference) -> Optional[List[Dict[str, str]]]:
+    """조건에 맞는 좌석을 한 객차에서 인원수만큼 골라 Korail.reserve의 seat_opt 형식으로 반환 (없으면 None)
+
+    등급마다 모든 객차에서 가장 붙어 있는 좌석 묶음(Seats.select_block)을 고름.
+    """
+    if preference.seat_class is not None:
+        classes = (preference.seat_class,)
+    else:
+        classes = (GENERAL_CLASS, SPECIAL_CLASS)
+    position = WINDOW_POSITIONS if preference.window_only else None
+    for seat_class in classes:
+        best = None
+        for car in car_maps:
+            if car.seat_class != seat_class or car.seats is None:
+                continue
+            found = car.seats.select_block(
+                preference.count, position=position, seat_types=ORDINARY_SEAT_TYPES, h_psrm_cl_cd=seat_class,
+            )
+            if found is not None and (best is None or found[0] < best[0]):
+                best = found
+        if best is not None:
+            return best[1]
+    return None
+
+
+class SeatMapCache:
+    """열차별 좌석 배치 TTL 캐시
+
+    열차 하나의 객차 목록(CARS_INFO)과 좌석(CAR_DETAIL)은 `load_cars` 한 번으로 조회하고,
+    같은 열차를 동시에 요청하면 진행 중인 조회 하나를 함께 기다림.
+    `call`은 블로킹 함수를 받아 실행하는 코루틴 (서킷 브레이커 경유 등), 없으면 기본 executor 사용.
+    `load_cars`는 열차의 Cars를 반환하는 블로킹 함수 - Korail.fetch_cars를 쓰면 객차 좌석을
+    요청마다 별도 세션으로 동시에 받아 옴 (없으면 train.cars를 한 스레드에서 차례로 조회).
+    """
+
+    def __init__(
+        self,
+        call: Optional[UpstreamCall] = None,
+        load_cars: Optional[Callable[[Any], Any]] = None,
+        ttl: float = 30.0,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._call = call
+        self._load_cars = load_cars or _lazy_cars
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: Dict[TrainKey, Tuple[float, List[CarMap]]] = {}
+        self._inflight: Dict[TrainKey, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.car_requests = 0
+        self._logger = logging.getLogger(__name__ + ".SeatMapCache")
+
+    @staticmethod
+    def key(train) -> TrainKey:
+        return (train.train_no, train.dpt_date, train.dpt_time)
+
+    async def _run(self, func: Callable[[], Any]) -> Any:
+        if self._call is not None:
+            return await self._call(func)
+        return await asyncio.get_running_loop().run_in_executor(None, func)
+
+    async def get(self, train) -> List[CarMap]:
+        key = self.key(train)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > self._clock():
+            self.hits += 1
+            return entry[1]
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.ensure_future(self._fetch(train))
+        self._inflight[key] = future
+        try:
+            car_maps = await asyncio.shield(future)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        self._store(key, car_maps)
+        return car_maps
+
+    async def _fetch(self, train) -> List[CarMap]:
+        def load() -> List[CarMap]:
+            cars = self._load_cars(train)
+            return [_car_map(cars[number]) for number in cars.car_list()]
+
+        car_maps = await self._run(load)
+        self.car_requests += 1 + len(car_maps)
+        return car_maps
+
+    def _store(self, key: TrainKey, car_maps: List[CarMap]) -> None:
+        now = self._clock()
+        if len(self._entries) >= self.max_entries:
+            for stale in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[stale]
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (now + self.ttl, car_maps)
+
+    async def find_seats(self, train, preference: SeatPreference) -> Optional[List[Dict[str, str]]]:
+        """조건에 맞는 좌석 (좌석 배치 조회 실패 시 None)"""
+        try:
+            car_maps = await self.get(train)
+        except Exception as exc:
+            self._logger.debug("Seat map lookup failed for train %s: %s", train.train_no, exc)
+            return None
+        return select_seats(car_maps, preference)
@@ -0,0 +1,333 @@
+"""
+좌석 단위 취소표 감지 - 감시 중인 열차의 객차별 좌석 판매 상태를 비트셋으로 들고 객차 좌석 조회(CAR_DETAIL)만 반복해
+새로 풀린 좌석이 타겟 조건에 맞으면 고른 좌석(seat_opt)으로 바로 예매를 넘김
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from letskorail.train import Seats
+
+from pipeline import TargetItem, TargetRegistry
+from rate_limiter import TokenBucket
+from seat_maps import CarMap, SeatPreference, TrainKey, select_seats
+
+WATCH_FLAG = 'seat_watch'  # target.metadata에 True로 설정된 KTX 타겟만 감시
+
+TargetKey = Tuple[int, str]  # (chat_id, target_id)
+Dispatch = Callable[[TargetItem, Dict[str, Any]], Awaitable[None]]
+
+
+def is_watch_target(target: TargetItem) -> bool:
+    return (target.service or '').upper() == 'KTX' and bool(target.metadata.get(WATCH_FLAG))
+
+
+def seat_index(seats) -> Dict[str, int]:
+    """좌석 키 -> 비트 위치 (기준 좌석 배치의 좌석 순서)"""
+    return {key: bit for bit, key in enumerate(seats.seat_info)}
+
+
+def seats_bits(seats, index: Dict[str, int]) -> int:
+    """letskorail Seats의 판매 가능 좌석 비트셋"""
+    bits = 0
+    for key, seat in seats.seat_info.items():
+        bit = index.get(key)
+        if seat.sale_psb and bit is not None:
+            bits |= 1 << bit
+    return bits
+
+
+def sale_bits(detail: Dict[str, Any], index: Dict[str, int]) -> int:
+    """CAR_DETAIL 원본 응답의 판매 가능 좌석 비트셋 (Seats를 만들지 않음, index에 없는 좌석은 무시)"""
+    bits = 0
+    for seat in detail["seat_infos"]["seat_info"]:
+        if seat.get("h_sale_psb_flg") == "Y":
+            bit = index.get(seat["h_con_seat_no"])
+            if bit is not None:
+                bits |= 1 << bit
+    return bits
+
+
+@dataclass
+class WatchedCar:
+    car: Any  # letskorail Car (좌석 조회 요청 정보를 가짐)
+    index: Dict[str, int]
+    bits: int
+    seat_map: CarMap  # 비트셋이 바뀔 때만 새 Seats로 교체
+
+
+@dataclass
+class WatchedTrain:
+    train: Any
+    cars: List[WatchedCar]
+    targets: Set[TargetKey] = field(default_factory=set)
+
+
+@dataclass
+class WatchStats:
+    polls: int = 0
+    car_requests: int = 0
+    failed: int = 0
+    changed_cars: int = 0
+    opened_seats: int = 0
+    triggers: int = 0
+    released_holds: int = 0  # 예매 결과가 나와 잡아 둔 좌석을 되돌린 횟수
+
+
+def watch_train(train, cars) -> WatchedTrain:
+    """좌석 배치까지 불러온 열차(Korail.fetch_cars 결과)로 기준 비트셋 생성"""
+    watched = []
+    for number in cars.car_list():
+        car = cars[number]
+        seats = car.seats
+        if seats is None:
+            continue
+        index = seat_index(seats)
+        watched.append(WatchedCar(
+            car=car,
+            index=index,
+            bits=seats_bits(seats, index),
+            seat_map=CarMap(car_no=car.h_srcar_no, seat_class=car.h_psrm_cl_cd, seats=seats),
+        ))
+    return WatchedTrain(train=train, cars=watched)
+
+
+class SeatWatcher:
+    """seat_watch 타겟의 열차를 좌석 단위로 감시하는 워커
+
+    `discover_interval`초마다 타겟 시간 창의 열차(매진 포함)를 조회해 새 열차만 객차/좌석 배치를 받아 기준 비트셋을 만들고,
+    `poll_interval`초마다 감시 중인 객차의 좌석 조회만 레이트 리미터와 동시 실행 한도 안에서 보냄.
+    객차마다 이전 비트셋과 정수 비교 한 번으로 바뀐 객차를 찾고, 바뀐 객차만 좌석 배치를 다시 만들어
+    판매 가능 좌석이 있는 열차에서 타겟 조건(SeatPreference)으로 좌석을 골라 `dispatch`로 넘김.
+    새로 풀린 좌석은 바로, 이미 열려 있던 좌석은 넘길 수 없던 타겟이 다시 넘길 수 있게 되면 (쿨다운 이후) 넘김.
+    넘긴 좌석은 다른 타겟이 고르지 않도록 예매 결과가 나올 때까지 판매 불가로 잡아 두고, 결과가 나오면
+    현재 비트셋 기준으로 되돌림 (예매가 실패해 아직 남아 있는 좌석은 다시 고를 수 있음).
+
+    `train_reservation`은 `search_watch_trains(target, limit)`, `fetch_watch_cars(trains)`,
+    `fetch_car_detail(car)`, `seat_watch_payload(target, train, seat_opt)`를 제공.
+    """
+
+    def __init__(
+        self,
+        registry: TargetRegistry,
+        dispatch: Dispatch,
+        train_reservation,
+        limiter: TokenBucket,
+        poll_interval: float = 2.0,
+        discover_interval: float = 60.0,
+        max_trains: int = 3,
+        concurrency: int = 8,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.registry = registry
+        self.dispatch = dispatch
+        self.train_reservation = train_reservation
+        self.limiter = limiter
+        self.poll_interval = poll_interval
+        self.discover_interval = discover_interval
+        self.max_trains = max_trains
+        self.concurrency = concurrency
+        self._clock = clock
+        self.stats = WatchStats()
+        self._targets: Dict[TargetKey, TargetItem] = {}
+        self._next_discovery: Dict[TargetKey, float] = {}
+        self._trains: Dict[TrainKey, WatchedTrain] = {}
+        self._discovering: Dict[TrainKey, asyncio.Future] = {}  # 객차를 조회 중인 열차 (같은 노선 타겟끼리 공유)
+        self._holds: Dict[TargetKey, List[Tuple[WatchedCar, str]]] = {}  # 타겟별로 잡아 둔 (객차, 좌석)
+        self._stop_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._logger = logging.getLogger(__name__ + ".SeatWatcher")
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop_event.clear()
+        self._task = loop.create_task(self.run())
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def watched_cars(self) -> int:
+        return sum(len(train.cars) for train in self._trains.values())
+
+    async def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                await self.refresh()
+                if self._trains:
+                    await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._logger.exception("Seat watcher error: %s", exc)
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refresh(self) -> None:
+        """감시 타겟 갱신 - 새 타겟과 discover_interval이 지난 타겟만 열차를 다시 조회"""
+        now = self._clock()
+        self._targets = {(t.chat_id, t.target_id): t for t in self.registry.watch_targets(is_watch_target)}
+        for key in [k for k in self._next_discovery if k not in self._targets]:
+            del self._next_discovery[key]
+        due = [t for key, t in self._targets.items() if self._next_discovery.get(key, 0.0) <= now]
+        if due:
+            await asyncio.gather(*(self._discover(target) for target in due))
+        for train_key in list(self._trains):
+            watched = self._trains[train_key]
+            watched.targets &= self._targets.keys()
+            if not watched.targets:
+                del self._trains[train_key]
+
+    async def _discover(self, target: TargetItem) -> None:
+        key = (target.chat_id, target.target_id)
+        self._next_discovery[key] = self._clock() + self.discover_interval
+        try:
+            await self.limiter.acquire()
+            trains = await self.train_reservation.search_watch_trains(target, self.max_trains)
+            found = {(t.train_no, t.dpt_date, t.dpt_time): t for t in trains or []}
+            # 다른 타겟이 이미 조회 중인 열차는 다시 조회하지 않고 그 결과를 기다림
+            waiting = {self._discovering[k] for k in found if k in self._discovering}
+            new = {k: t for k, t in found.items() if k not in self._trains and k not in self._discovering}
+            if new:
+                await self._fetch_new(new)
+            if waiting:
+                await asyncio.gather(*waiting)
+        except Exception as exc:
+            # 조회 실패/결과 없음이면 기존 감시 열차를 유지하고 다음 주기에 다시 조회
+            self._logger.debug("Seat watch discovery failed for target %s: %s", target.target_id, exc)
+            return
+        for train_key, watched in self._trains.items():
+            if train_key in found:
+                watched.targets.add(key)
+            else:
+                watched.targets.discard(key)
+
+    async def _fetch_new(self, new: Dict[TrainKey, Any]) -> None:
+        """새 열차의 객차를 조회해 감시 목록에 추가 - 이미 있는 열차는 덮어쓰지 않음 (다른 타겟의 감시/좌석 유지)"""
+        future = asyncio.get_running_loop().create_future()
+        for train_key in new:
+            self._discovering[train_key] = future
+        try:
+            await self.limiter.acquire()
+            trains = list(new.values())
+            for train_key, train, cars in zip(new, trains, await self.train_reservation.fetch_watch_cars(trains)):
+                self._trains.setdefault(train_key, watch_train(train, cars))
+        finally:
+            for train_key in new:
+                if self._discovering.get(train_key) is future:
+                    del self._discovering[train_key]
+            future.set_result(None)
+
+    async def poll_once(self) -> int:
+        """감시 중인 모든 객차를 한 번씩 조회해 비교하고, 예매를 넘긴 타겟 수 반환"""
+        jobs = [(train, car) for train in self._trains.values() for car in train.cars]
+        if not jobs:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(car: WatchedCar) -> Dict[str, Any]:
+            async with semaphore:
+                await self.limiter.acquire()
+                return await self.train_reservation.fetch_car_detail(car.car)
+
+        details = await asyncio.gather(*(fetch(car) for _, car in jobs), return_exceptions=True)
+        self.stats.polls += 1
+        self.stats.car_requests += len(jobs)
+
+        opened: Set[int] = set()
+        for (train, car), detail in zip(jobs, details):
+            if isinstance(detail, Exception):
+                self.stats.failed += 1
+                self._logger.debug("Car %s poll failed: %s", car.seat_map.car_no, detail)
+                continue
+            if self._apply(car, detail):
+                opened.add(id(train))
+
+        self._sync_holds()
+        triggered = 0
+        for train in list(self._trains.values()):
+            if id(train) in opened:
+                triggered += await self._trigger(train, fresh=True)
+            elif any(car.bits for car in train.cars):
+                # 열려 있지만 넘기지 못한 좌석 - 그때 넘길 수 없던 타겟이 이제 넘길 수 있으면 다시 시도
+                triggered += await self._trigger(train, fresh=False)
+        return triggered
+
+    def _apply(self, car: WatchedCar, detail: Dict[str, Any]) -> bool:
+        """새 비트셋 반영 - 판매 가능으로 바뀐 좌석이 있으면 True"""
+        bits = sale_bits(detail, car.index)
+        if bits == car.bits:
+            return False
+        opened = bits & ~car.bits
+        car.bits = bits
+        car.seat_map.seats = Seats(detail)
+        self.stats.changed_cars += 1
+        if not opened:
+            return False
+        self.stats.opened_seats += bin(opened).count("1")
+        return True
+
+    async def _trigger(self, train: WatchedTrain, fresh: bool) -> int:
+        """열린 좌석을 타겟 조건으로 골라 넘김 (fresh가 아니면 이미 열려 있던 좌석이므로 쿨다운 중인 타겟은 건너뜀)"""
+        car_maps = [car.seat_map for car in train.cars]
+        now = datetime.utcnow()
+        triggered = 0
+        for key in sorted(train.targets):
+            target = self._targets.get(key)
+            if target is None or key in self._holds or not self.registry.can_dispatch(target):
+                continue
+            if not fresh and target.cooldown_until and target.cooldown_until > now:
+                continue
+            seat_opt = select_seats(car_maps, SeatPreference.for_target(target))
+            if not seat_opt:
+                continue
+            self._hold_seats(key, train, seat_opt)
+            self._logger.info("Seat opened on train %s for target %s: %s", train.train.train_no, target.target_id,
+                              ", ".join(f"{s['car_no']}-{s['seat']}" for s in seat_opt))
+            await self.dispatch(target, self.train_reservation.seat_watch_payload(target, train.train, seat_opt))
+            self.stats.triggers += 1
+            triggered += 1
+        return triggered
+
+    def _hold_seats(self, key: TargetKey, train: WatchedTrain, seat_opt: List[Dict[str, str]]) -> None:
+        """넘긴 좌석을 판매 불가로 표시 (같은 열차를 감시하는 다른 타겟이 같은 좌석을 고르지 않도록)"""
+        by_car = {car.seat_map.car_no: car for car in train.cars}
+        held = self._holds.setdefault(key, [])
+        for seat in seat_opt:
+            car = by_car.get(seat['car_no'])
+            if car is not None and seat['seat'] in car.seat_map.seats.seat_info:
+                car.seat_map.seats.seat_info[seat['seat']].sale_psb = False
+                held.append((car, seat['seat']))
+
+    def _sync_holds(self) -> None:
+        """예매 결과가 나온 (더 이상 예매 중이 아닌) 타겟이 잡아 둔 좌석은 현재 비트셋 기준으로 되돌리고,
+        아직 예매 중인 좌석은 좌석 배치를 새로 만든 객차에서도 계속 판매 불가로 표시"""
+        for key in list(self._holds):
+            target = self._targets.get(key)
+            if target is not None and self.registry.is_dispatching(target):
+                for car, seat in self._holds[key]:
+                    info = car.seat_map.seats.seat_info.get(seat)
+                    if info is not None:
+                        info.sale_psb = False
+                continue
+            for car, seat in self._holds.pop(key):
+                bit = car.index.get(seat)
+                info = car.seat_map.seats.seat_info.get(seat)
+                if bit is not None and info is not None:
+                    info.sale_psb = bool(car.bits >> bit & 1)
+            self.stats.released_holds += 1
@@ -0,0 +1,576 @@
+"""
+스캐너 샤딩 - chat_id 일관 해시로 타겟을 여러 워커 프로세스에 나눠 스캔/예매
+
+- 워커 프로세스마다 자체 TargetRegistry, ScannerWorker, ReservationExecutor와
+  업스트림 로그인 세션을 가짐 (그룹은 한 채팅 안에서만 묶이므로 그룹 락/예매 상태도 샤드 안에서 끝남)
+- 봇 프로세스의 ShardCoordinator는 TargetRegistry와 같은 메서드로 요청을 담당 샤드에 전달
+- 워커가 죽으면 링에서 빼고 그 채팅들을 남은 샤드로 옮긴 뒤, 재시작되면 원래 샤드로 되돌림
+"""
+import asyncio
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pipeline import ReservationExecutor, ReservationTask, ScannerWorker, TargetItem, TargetRegistry
+from target_store import TargetStore, target_from_dict, target_to_dict
+
+logger = logging.getLogger(__name__)
+
+# (타겟 dict 목록, 예매 완료된 그룹 ID 목록) - 샤드 간 이동 및 코디네이터 미러 형식
+ChatSnapshot = Tuple[List[Dict[str, Any]], List[str]]
+
+
+class ShardUnavailableError(RuntimeError):
+    """살아있는 샤드 워커가 없거나 요청 중 워커가 종료됨"""
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class ConsistentHashRing:
+    """가상 노드를 둔 일관 해시 링 - 노드가 빠지거나 돌아와도 그 노드 몫의 키만 이동"""
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = 512) -> None:
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._point_nodes: Dict[int, int] = {}
+        self._nodes: set = set()
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self) -> List[int]:
+        return sorted(self._nodes)
+
+    def add_node(self, node: int) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            bisect.insort(self._points, point)
+            self._point_nodes[point] = node
+
+    def remove_node(self, node: int) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        self._points = [p for p in self._points if self._point_nodes[p] != node]
+        self._point_nodes = {p: n for p, n in self._point_nodes.items() if n != node}
+
+    def node_for(self, key: Any) -> Optional[int]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._point_nodes[self._points[index]]
+
+
+# ---- 워커 프로세스 ----
+
+def _encode_targets(targets: List[TargetItem]) -> List[Dict[str, Any]]:
+    return [target_to_dict(target) for target in targets]
+
+
+def _encode_result(value: Any) -> Tuple[str, Any]:
+    """프로세스 간 전달용 - 타겟은 저장 형식(dict)으로 바꿔 열차 객체 등을 제외"""
+    if isinstance(value, TargetItem):
+        return 'target', target_to_dict(value)
+    if isinstance(value, list) and value and isinstance(value[0], TargetItem):
+        return 'targets', _encode_targets(value)
+    return 'value', value
+
+
+def _decode_result(encoded: Tuple[str, Any]) -> Any:
+    kind, value = encoded
+    if kind == 'target':
+        return target_from_dict(value)
+    if kind == 'targets':
+        return [target_from_dict(data) for data in value]
+    return value
+
+
+class ShardOutbox:
+    """워커 프로세스에서 TelegramOutbox 대신 주입 - 알림을 봇 프로세스로 전달"""
+
+    def __init__(self, send: Callable[[tuple], None]) -> None:
+        self._send = send
+
+    async def send_message(self, chat_id: int, text: str, reply_markup=None, **kwargs) -> None:
+        if reply_markup is not None:
+            kwargs['reply_markup'] = reply_markup
+        self._send(('message', chat_id, text, kwargs))
+
+    async def send_progress(self, chat_id: int, key: str, text: str) -> None:
+        self._send(('progress', chat_id, key, text))
+
+
+class ShardReservationExecutor(ReservationExecutor):
+    """예매가 끝나면 바뀐 채팅 상태를 코디네이터 미러에 알리는 실행기"""
+
+    def __init__(
+        self,
+        train_reservation,
+        registry: TargetRegistry,
+        on_chat_changed: Callable[[int], None],
+        group_strategy=None,
+    ) -> None:
+        super().__init__(train_reservation, registry, group_strategy=group_strategy)
+        self._on_chat_changed = on_chat_changed
+
+    async def _process_task(self, reservation_task: ReservationTask) -> None:
+        try:
+            await super()._process_task(reservation_task)
+        finally:
+            self._on_chat_changed(reservation_task.target.chat_id)
+
+
+@dataclass
+class ShardRuntime:
+    registry: TargetRegistry
+    scanner: ScannerWorker
+    executor: ReservationExecutor
+    workers: List[Any] = field(default_factory=list)  # 스캐너와 함께 시작/정지하는 보조 워커 (SeatWatcher 등)
+
+
+def build_shard_runtime(
+    train_reservation,
+    store: Optional[TargetStore],
+    outbox: ShardOutbox,
+    on_chat_changed: Callable[[int], None],
+    group_strategy_factory: Optional[Callable[[Any, TargetRegistry], Any]] = None,
+    workers_factory: Optional[Callable[[Any, TargetRegistry, ScannerWorker], List[Any]]] = None,
+) -> ShardRuntime:
+    """워커 프로세스의 파이프라인 구성 (train_reservation은 이 프로세스에서 로그인한 인스턴스)"""
+    registry = TargetRegistry(store=store)
+    registry.restore_from_store()
+    group_strategy = group_strategy_factory(train_reservation, registry) if group_strategy_factory else None
+    executor = ShardReservationExecutor(train_reservation, registry, on_chat_changed, group_strategy)
+    scanner = ScannerWorker(registry, executor, train_reservation)
+    train_reservation.attach_pipeline(registry, scanner, executor)
+    train_reservation.attach_outbox(outbox)
+    executor.bind_bot(outbox)
+    workers = workers_factory(train_reservation, registry, scanner) if workers_factory else []
+    return ShardRuntime(registry=registry, scanner=scanner, executor=executor, workers=workers)
+
+
+# 코디네이터가 호출할 수 있는 레지스트리 메서드 (첫 인자는 모두 chat_id)
+SHARD_METHODS = frozenset({
+    'add_target', 'add_targets', 'add_target_group', 'remove_target', 'remove_targets',
+    'update_targets', 'clear_targets', 'list_targets', 'get_targets_by_group',
+    'deactivate_group', 'activate_target', 'export_chat', 'import_chat',
+})
+_READ_ONLY_METHODS = frozenset({'list_targets', 'get_targets_by_group', 'export_chat'})
+
+
+class _ShardServer:
+    """워커 프로세스 쪽 - 파이프로 받은 요청을 로컬 레지스트리에 실행"""
+
+    def __init__(self, shard_index: int, conn, factory: Callable[..., ShardRuntime]) -> None:
+        self.shard_index = shard_index
+        self.conn = conn
+        self.factory = factory
+        self.runtime: Optional[ShardRuntime] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._logger = logging.getLogger(__name__ + ".ShardServer")
+
+    def _send(self, message: tuple) -> None:
+        # 이벤트 루프 스레드에서만 호출되므로 파이프 쓰기가 겹치지 않음
+        try:
+            self.conn.send(message)
+        except (BrokenPipeError, OSError):
+            self._logger.warning("Shard %d: coordinator pipe closed", self.shard_index)
+
+    def _read_loop(self, inbox: asyncio.Queue) -> None:
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                message = None
+            self._loop.call_soon_threadsafe(inbox.put_nowait, message)
+            if message is None or message[0] == 'stop':
+                return
+
+    async def _snapshot(self, chat_id: int) -> ChatSnapshot:
+        targets, reserved_groups = await self.runtime.registry.export_chat(chat_id)
+        return _encode_targets(targets), reserved_groups
+
+    def _chat_changed(self, chat_id: int) -> None:
+        self._loop.create_task(self._push_chat(chat_id))
+
+    async def _push_chat(self, chat_id: int) -> None:
+        self._send(('chat', chat_id, await self._snapshot(chat_id)))
+
+    async def _handle(self, request_id: int, method: str, args: tuple) -> None:
+        try:
+            if method not in SHARD_METHODS:
+                raise ValueError(f"Unknown shard method: {method}")
+            chat_id = args[0]
+            if method == 'import_chat':
+                args = (chat_id, [target_from_dict(data) for data in args[1]], args[2])
+            result = await getattr(self.runtime.registry, method)(*args)
+            if method == 'export_chat':
+                encoded = ('value', await self._snapshot(chat_id))
+            else:
+                encoded = _encode_result(result)
+            snapshot = None if method in _READ_ONLY_METHODS else await self._snapshot(chat_id)
+            self._send(('result', request_id, True, encoded, snapshot))
+        except Exception as exc:
+            self._logger.exception("Shard %d: %s failed", self.shard_index, method)
+            self._send(('result', request_id, False, f"{type(exc).__name__}: {exc}", None))
+
+    async def serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        inbox: asyncio.Queue = asyncio.Queue()
+        threading.Thread(target=self._read_loop, args=(inbox,), daemon=True,
+                         name=f"shard-{self.shard_index}-reader").start()
+
+        self.runtime = self.factory(self.shard_index, ShardOutbox(self._send), self._chat_changed)
+        registry = self.runtime.registry
+        self.runtime.scanner.start(self._loop)
+        for worker in self.runtime.workers:
+            worker.start(self._loop)
+        self.runtime.executor.start(self._loop)
+        chats = {chat_id: await self._snapshot(chat_id) for chat_id in registry.chat_ids()}
+        self._send(('ready', chats))
+        self._logger.info("Shard %d ready with %d chats", self.shard_index, len(chats))
+
+        tasks = set()
+        while True:
+            message = await inbox.get()
+            if message is None or message[0] == 'stop':
+                break
+            _, request_id, method, args = message
+            task = self._loop.create_task(self._handle(request_id, method, args))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        await self.runtime.scanner.stop()
+        for worker in self.runtime.workers:
+            await worker.stop()
+        await self.runtime.executor.stop()
+        await asyncio.get_running_loop().run_in_executor(None, registry.close_store)
+
+
+def run_shard_worker(shard_index: int, conn, factory: Callable[..., ShardRuntime]) -> None:
+    """워커 프로세스 진입점 (factory는 spawn으로 전달되므로 모듈 최상위 함수여야 함)"""
+    asyncio.run(_ShardServer(shard_index, conn, factory).serve())
+
+
+# ---- 봇 프로세스 ----
+
+@dataclass
+class ShardProcess:
+    index: int
+    process: Any = None
+    conn: Any = None
+    generation: int = 0
+    ready: bool = False
+    restarts: int = 0
+    pending: Dict[int, asyncio.Future] = field(default_factory=dict)
+
+    @property
+    def alive(self) -> bool:
+        return self.ready and self.process is not None and self.process.is_alive()
+
+
+class ShardCoordinator:
+    """TargetRegistry 대신 사용하는 샤드 코디네이터
+
+    - 채팅별 요청을 일관 해시 링에서 고른 워커로 전달 (같은 채팅은 항상 같은 워커)
+    - 변경 요청 결과와 예매 완료 이벤트로 채팅별 타겟 미러를 유지해 워커가 죽어도 다른 샤드로 옮길 수 있음
+    - 워커가 보낸 알림은 `outbox`(TelegramOutbox)로 발송
+    """
+
+    def __init__(
+        self,
+        shard_count: int,
+        factory: Callable[..., ShardRuntime],
+        replicas: int = 512,
+        restart_delay: float = 1.0,
+        call_timeout: float = 30.0,
+    ) -> None:
+        self.shard_count = shard_count
+        self.factory = factory
+        self.restart_delay = restart_delay
+        self.call_timeout = call_timeout
+        self.ring = ConsistentHashRing(replicas=replicas)
+        self.outbox = None
+        self.moved_chats = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._shards: Dict[int, ShardProcess] = {i: ShardProcess(index=i) for i in range(shard_count)}
+        self._owners: Dict[int, int] = {}  # chat_id -> 현재 타겟을 가진 샤드
+        self._mirror: Dict[int, ChatSnapshot] = {}  # 빈 스냅샷은 삭제된 채팅 (재시작한 워커의 옛 기록 제거용)
+        self._request_ids = itertools.count(1)
+        self._move_lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+        self._background: set = set()
+        self._logger = logging.getLogger(__name__ + ".ShardCoordinator")
+
+    def bind_outbox(self, outbox) -> None:
+        self.outbox = outbox
+
+    # ---- 프로세스 관리 ----
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._stopping = False
+        for shard in self._shards.values():
+            self._spawn(shard)
+
+    def is_running(self) -> bool:
+        return not self._stopping and any(shard.alive for shard in self._shards.values())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for shard in self._shards.values():
+            if shard.conn is not None:
+                try:
+                    shard.conn.send(('stop',))
+                except (BrokenPipeError, OSError):
+                    pass
+        for shard in self._shards.values():
+            if shard.process is not None:
+                await self._loop.run_in_executor(None, shard.process.join, 10.0)
+                if shard.process.is_alive():
+                    shard.process.terminate()
+
+    def _spawn(self, shard: ShardProcess) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=run_shard_worker,
+            args=(shard.index, child_conn, self.factory),
+            name=f"scanner-shard-{shard.index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        shard.generation += 1
+        shard.process = process
+        shard.conn = parent_conn
+        shard.ready = False
+        threading.Thread(
+            target=self._read_loop, args=(shard, shard.generation), daemon=True,
+            name=f"shard-{shard.index}-coordinator-reader",
+        ).start()
+        self._logger.info("Shard %d started (pid %s)", shard.index, process.pid)
+
+    def _read_loop(self, shard: ShardProcess, generation: int) -> None:
+        conn = shard.conn
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                self._loop.call_soon_threadsafe(self._on_exit, shard, generation)
+                return
+            self._loop.call_soon_threadsafe(self._on_message, shard, generation, message)
+
+    def _run_background(self, coro) -> None:
+        task = self._loop.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _on_exit(self, shard: ShardProcess, generation: int) -> None:
+        if generation != shard.generation:
+            return
+        shard.ready = False
+        for future in shard.pending.values():
+            if not future.done():
+                future.set_exception(ShardUnavailableError(f"shard {shard.index} exited"))
+        shard.pending.clear()
+        if self._stopping:
+            return
+        self._logger.error("Shard %d (pid %s) exited, moving its chats", shard.index,
+                           shard.process.pid if shard.process else None)
+        self.ring.remove_node(shard.index)
+        self._run_background(self._rebalance())
+        self._loop.call_later(self.restart_delay, self._restart, shard)
+
+    def _restart(self, shard: ShardProcess) -> None:
+        if self._stopping:
+            return
+        shard.restarts += 1
+        self._spawn(shard)
+
+    def _on_message(self, shard: ShardProcess, generation: int, message: tuple) -> None:
+        if generation != shard.generation:
+            return
+        kind = message[0]
+        if kind == 'result':
+            _, request_id, ok, payload, snapshot = message
+            future = shard.pending.pop(request_id, None)
+            if future is None or future.done():
+                return
+            if ok:
+                future.set_result((payload, snapshot))
+            else:
+                future.set_exception(RuntimeError(f"shard {shard.index}: {payload}"))
+        elif kind == 'chat':
+            _, chat_id, snapshot = message
+            if self._owners.get(chat_id) == shard.index:
+                self._mirror[chat_id] = snapshot
+        elif kind == 'message':
+            _, chat_id, text, kwargs = message
+            if self.outbox is not None:
+                self._run_background(self.outbox.send_message(chat_id=chat_id, text=text, **kwargs))
+        elif kind == 'progress':
+            _, chat_id, key, text = message
+            if self.outbox is not None:
+                self._run_background(self.outbox.send_progress(chat_id, key, text))
+        elif kind == 'ready':
+            self._on_ready(shard, message[1])
+
+    def _on_ready(self, shard: ShardProcess, chats: Dict[int, ChatSnapshot]) -> None:
+        shard.ready = True
+        self.ring.add_node(shard.index)
+        for chat_id, snapshot in chats.items():
+            owner = self._owners.get(chat_id)
+            if owner is None:
+                self._owners[chat_id] = shard.index
+                self._mirror[chat_id] = snapshot
+            elif owner != shard.index and self.ring.node_for(chat_id) != shard.index:
+                # 죽어 있는 동안 다른 샤드로 옮겨졌고 돌아오지도 않을 채팅의 옛 기록
+                # (돌아올 채팅은 재배치 때 import_chat이 통째로 교체)
+                self._run_background(self._call(shard, 'clear_targets', chat_id))
+        self._logger.info("Shard %d ready (%d chats restored, restarts %d)",
+                          shard.index, len(chats), shard.restarts)
+        self._run_background(self._rebalance())
+
+    # ---- 요청 전달 ----
+
+    async def _call(self, shard: ShardProcess, method: str, *args) -> Tuple[Any, Optional[ChatSnapshot]]:
+        if not shard.alive:
+            raise ShardUnavailableError(f"shard {shard.index} is not running")
+        request_id = next(self._request_ids)
+        future = self._loop.create_future()
+        shard.pending[request_id] = future
+        try:
+            shard.conn.send(('call', request_id, method, args))
+        except (BrokenPipeError, OSError) as exc:
+            shard.pending.pop(request_id, None)
+            raise ShardUnavailableError(f"shard {shard.index}: {exc}") from exc
+        try:
+            return await asyncio.wait_for(future, self.call_timeout)
+        finally:
+            shard.pending.pop(request_id, None)
+
+    async def _place(self, chat_id: int) -> ShardProcess:
+        """채팅을 링이 가리키는 샤드에 두고 그 샤드 반환 (필요하면 이전 샤드에서 옮김)"""
+        desired = self.ring.node_for(chat_id)
+        if desired is None:
+            raise ShardUnavailableError("no scanner shard is running")
+        if self._owners.get(chat_id, desired) == desired:
+            self._owners[chat_id] = desired
+            return self._shards[desired]
+        async with self._move_lock:
+            desired = self.ring.node_for(chat_id)
+            if desired is None:
+                raise ShardUnavailableError("no scanner shard is running")
+            owner = self._owners.get(chat_id, desired)
+            if owner != desired:
+                await self._move(chat_id, self._shards[owner], self._shards[desired])
+            return self._shards[desired]
+
+    async def _move(self, chat_id: int, source: ShardProcess, target: ShardProcess) -> None:
+        snapshot = self._mirror.get(chat_id, ([], []))
+        if source.alive:
+            try:
+                snapshot, _ = await self._call(source, 'export_chat', chat_id)
+                snapshot = _decode_result(snapshot)
+            except (ShardUnavailableError, asyncio.TimeoutError):
+                pass  # 미러 사용
+        targets, reserved_groups = snapshot
+        _, new_snapshot = await self._call(target, 'import_chat', chat_id, targets, reserved_groups)
+        self._owners[chat_id] = target.index
+        self._mirror[chat_id] = new_snapshot
+        if source.alive:
+            try:
+                await self._call(source, 'clear_targets', chat_id)
+            except (ShardUnavailableError, asyncio.TimeoutError):
+                pass  # 재시작 후 ready 처리에서 정리됨
+        self.moved_chats += 1
+        self._logger.info("Chat %s moved from shard %d to shard %d (%d targets)",
+                          chat_id, source.index, target.index, len(targets))
+
+    async def _rebalance(self) -> None:
+        for chat_id in list(self._owners):
+            if self.ring.node_for(chat_id) == self._owners.get(chat_id):
+                continue
+            try:
+                await self._place(chat_id)
+            except (ShardUnavailableError, asyncio.TimeoutError, RuntimeError) as exc:
+                self._logger.warning("Rebalance of chat %s deferred: %s", chat_id, exc)
+
+    async def _call_chat(self, method: str, chat_id: int, *args) -> Any:
+        shard = await self._place(chat_id)
+        payload, snapshot = await self._call(shard, method, chat_id, *args)
+        if snapshot is not None:
+            self._mirror[chat_id] = snapshot
+        return _decode_result(payload)
+
+    # ---- TargetRegistry와 같은 인터페이스 ----
+
+    async def add_target(self, chat_id: int, *args, **kwargs) -> TargetItem:
+        targets = await self.add_targets(chat_id, [dict(zip(
+            ('service', 'departure', 'arrival', 'date', 'time'), args), **kwargs)])
+        return targets[0]
+
+    async def add_targets(self, chat_id: int, targets_data: List[Dict[str, Any]]) -> List[TargetItem]:
+        return await self._call_chat('add_targets', chat_id, targets_data) or []
+
+    async def add_target_group(
+        self,
+        chat_id: int,
+        targets_data: List[Dict[str, Any]],
+        group_id: Optional[str] = None,
+    ) -> List[TargetItem]:
+        return await self._call_chat('add_target_group', chat_id, targets_data, group_id) or []
+
+    async def remove_target(self, chat_id: int, target_id: str) -> bool:
+        return await self.remove_targets(chat_id, [target_id]) > 0
+
+    async def remove_targets(self, chat_id: int, target_ids: List[str]) -> int:
+        return await self._call_chat('remove_targets', chat_id, target_ids)
+
+    async def update_targets(self, chat_id: int, updates: Dict[str, Dict[str, Any]]) -> List[TargetItem]:
+        return await self._call_chat('update_targets', chat_id, updates) or []
+
+    async def clear_targets(self, chat_id: int) -> int:
+        return await self._call_chat('clear_targets', chat_id)
+
+    async def list_targets(self, chat_id: int) -> List[TargetItem]:
+        return await self._call_chat('list_targets', chat_id) or []
+
+    async def get_targets_by_group(self, chat_id: int, group_id: str) -> List[TargetItem]:
+        return await self._call_chat('get_targets_by_group', chat_id, group_id) or []
+
+    async def deactivate_group(self, chat_id: int, group_id: str) -> int:
+        return await self._call_chat('deactivate_group', chat_id, group_id)
+
+    async def activate_target(self, chat_id: int, target_id: str) -> Optional[TargetItem]:
+        return await self._call_chat('activate_target', chat_id, target_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """샤드별 상태 (/multi_status, 헬스체크용)"""
+        chats_per_shard: Dict[int, int] = {}
+        for chat_id, owner in self._owners.items():
+            if self._mirror.get(chat_id, ([], []))[0]:
+                chats_per_shard[owner] = chats_per_shard.get(owner, 0) + 1
+        return {
+            'moved_chats': self.moved_chats,
+            'shards': {
+                shard.index: {
+                    'alive': shard.alive,
+                    'pid': shard.process.pid if shard.process else None,
+                    'restarts': shard.restarts,
+                    'chats': chats_per_shard.get(shard.index, 0),
+                }
+                for shard in self._shards.values()
+            },
+        }
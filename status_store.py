@@ -0,0 +1,96 @@
+"""
+상태 파일 저장소 - 이벤트 루프 밖에서 원자적으로, 짧은 간격의 갱신은 한 번에 모아서 기록
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    """임시 파일에 쓴 뒤 rename으로 교체 (중간에 죽어도 이전 파일 또는 새 파일만 남음)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            # json.dump는 순수 파이썬 인코더로 조각마다 write하므로 한 번에 직렬화
+            f.write(json.dumps(data, ensure_ascii=False))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DebouncedJsonWriter:
+    """마지막 갱신 후 `delay`초 동안 추가 갱신이 없으면 최신 내용만 기록하는 JSON 저장기
+
+    - 갱신이 계속 이어져도 기록되지 않은 첫 갱신 후 `max_delay`초가 지나면 기록
+    - `update(data)`는 메모리의 최신 값만 바꾸고 바로 반환 (파일 I/O 없음)
+    - 실제 쓰기는 기본 executor 스레드에서 `atomic_write_json`으로 수행
+    - 실행 중인 이벤트 루프가 없으면 즉시 동기 기록
+    """
+
+    def __init__(self, path: str, delay: float = 0.5, max_delay: float = 5.0) -> None:
+        self.path = path
+        self.delay = delay
+        self.max_delay = max_delay
+        self._latest: Any = None
+        self._dirty = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._pending_since: Optional[float] = None  # 기록되지 않은 첫 갱신 시각 (loop.time())
+        self._io_lock = threading.Lock()  # 동시에 두 번 쓰지 않도록
+        self.write_count = 0
+        self.update_count = 0
+
+    def update(self, data: Any) -> None:
+        self._latest = data
+        self._dirty = True
+        self.update_count += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        now = loop.time()
+        if self._pending_since is None:
+            self._pending_since = now
+        if self._timer is not None:
+            self._timer.cancel()
+        when = min(now + self.delay, self._pending_since + self.max_delay)
+        self._timer = loop.call_at(when, self._flush_in_executor, loop)
+
+    def _flush_in_executor(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._timer = None
+        self._pending_since = None
+        loop.run_in_executor(None, self.flush_sync)
+
+    def flush_sync(self) -> None:
+        with self._io_lock:
+            if not self._dirty:
+                return
+            data = self._latest
+            self._dirty = False
+            try:
+                atomic_write_json(self.path, data)
+                self.write_count += 1
+            except OSError as exc:
+                self._dirty = True
+                logger.error("상태 파일 저장 실패(%s): %s", self.path, exc)
+
+    async def flush(self) -> None:
+        """대기 중인 기록을 즉시 수행 (종료 시 호출)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending_since = None
+        await asyncio.get_running_loop().run_in_executor(None, self.flush_sync)
@@ -0,0 +1,387 @@
+"""
+TargetRegistry 영속화 - 변경 로그(WAL, JSON lines) + 주기적 스냅샷 압축
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pipeline import TargetItem
+from status_store import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+_DATETIME_FIELDS = ('last_scan', 'last_success', 'next_scan', 'cooldown_until')
+_TARGET_FIELDS = tuple(f.name for f in fields(TargetItem))
+_DATETIME_INDEXES = tuple(_TARGET_FIELDS.index(name) for name in _DATETIME_FIELDS)
+_NEXT_SCAN_INDEX = _TARGET_FIELDS.index('next_scan')
+_LAST_SCAN_INDEX = _TARGET_FIELDS.index('last_scan')
+_METADATA_INDEX = _TARGET_FIELDS.index('metadata')
+_PENDING_INDEX = _TARGET_FIELDS.index('pending')
+_PRIMITIVES = (str, int, float, bool, type(None))
+_DROP = object()
+
+
+def _jsonable(value: Any) -> Any:
+    """JSON으로 저장할 수 없는 값(열차 객체 등)은 버림"""
+    if isinstance(value, dict):
+        if all(isinstance(item, _PRIMITIVES) for item in value.values()):
+            return dict(value)
+        result = {}
+        for key, item in value.items():
+            item = _jsonable(item)
+            if item is not _DROP:
+                result[str(key)] = item
+        return result
+    if isinstance(value, (list, tuple)):
+        return [item for item in (_jsonable(v) for v in value) if item is not _DROP]
+    if isinstance(value, _PRIMITIVES):
+        return value
+    return _DROP
+
+
+def target_to_dict(target: TargetItem) -> Dict[str, Any]:
+    data = {name: getattr(target, name) for name in _TARGET_FIELDS}
+    for name in _DATETIME_FIELDS:
+        value = data[name]
+        data[name] = value.isoformat() if value is not None else None
+    data['metadata'] = _jsonable(target.metadata)
+    # 예매 대기 상태는 재시작 후 이어갈 수 없으므로 저장하지 않음
+    data['pending'] = False
+    return data
+
+
+def target_from_dict(data: Dict[str, Any]) -> TargetItem:
+    values = {name: data[name] for name in _TARGET_FIELDS if name in data}
+    for name in _DATETIME_FIELDS:
+        value = values.get(name)
+        if value is not None:
+            values[name] = datetime.fromisoformat(value)
+    if values.get('next_scan') is None:
+        values.pop('next_scan', None)
+    return TargetItem(**values)
+
+
+def _row_from_dict(data: Dict[str, Any]) -> List[Any]:
+    """저장 형식(dict) → 필드 순서대로의 값 배열 (누락 필드는 기본값)"""
+    if all(name in data for name in _TARGET_FIELDS):
+        return [data[name] for name in _TARGET_FIELDS]
+    return _row_from_target(target_from_dict(data))
+
+
+def _row_from_target(target: TargetItem) -> List[Any]:
+    data = target_to_dict(target)
+    return [data[name] for name in _TARGET_FIELDS]
+
+
+def _capture_row(target: TargetItem) -> List[Any]:
+    """스냅샷용 값 배열 복사 (datetime은 불변이므로 그대로 두고 기록 스레드에서 변환)"""
+    row = [getattr(target, name) for name in _TARGET_FIELDS]
+    row[_METADATA_INDEX] = _jsonable(target.metadata)
+    row[_PENDING_INDEX] = False
+    return row
+
+
+def _target_from_row(row: List[Any]) -> TargetItem:
+    for index in _DATETIME_INDEXES:
+        value = row[index]
+        if value is not None:
+            row[index] = datetime.fromisoformat(value)
+    if row[_NEXT_SCAN_INDEX] is None:
+        row[_NEXT_SCAN_INDEX] = datetime.utcnow()
+    return TargetItem(*row)
+
+
+@dataclass
+class _Snapshot:
+    rows: List[List[Any]]  # 압축 시점에 복사한 값 배열 (datetime은 기록 스레드에서 문자열로 변환)
+    group_reserved: Dict[str, bool]
+    covered: int  # 스냅샷에 포함된 WAL 레코드 수 (기록에 성공하면 카운터에서 뺌)
+
+
+class TargetStore:
+    """변경 로그 + 스냅샷 기반 타겟 저장소
+
+    - `{path}.wal`: 변경마다 한 줄씩 추가 (put/scan/remove/clear/group)
+    - `{path}.snapshot.json`: 압축된 전체 상태 (원자적 교체)
+    - 로그가 `compact_every`줄을 넘으면 레지스트리가 스냅샷을 새로 쓰고 로그를 비움
+
+    기록 메서드는 이벤트 루프에서 호출되므로 레코드를 메모리 큐에 넣고 바로 반환하고,
+    파일 쓰기/flush와 스냅샷 직렬화+fsync는 전용 기록 스레드가 `flush_interval`초 간격으로 모아서 수행.
+    같은 타겟의 스캔 기록은 한 번 모으는 동안 마지막 것만 남김 (put/remove/clear가 오면 그 이전 스캔 기록은 버림).
+    """
+
+    def __init__(self, path: str, compact_every: int = 10000, flush_interval: float = 0.2) -> None:
+        self.path = path
+        self.wal_path = f"{path}.wal"
+        self.snapshot_path = f"{path}.snapshot.json"
+        self.compact_every = compact_every
+        self.flush_interval = flush_interval
+        self._wal = None
+        self._wal_records = 0
+        # 기록 스레드로 넘길 작업 (WAL 한 줄 문자열 또는 _Snapshot) + 타겟별 마지막 스캔 기록
+        self._queue: List[Any] = []
+        self._scans: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._busy = False
+        self._compacting = False  # 큐에 스냅샷이 있는 동안은 다시 압축하지 않음
+        self._flush_requested = False
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.coalesced_scans = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    # ---- 기록 ----
+
+    def put(self, target: TargetItem) -> None:
+        self._append({'op': 'put', 'target': target_to_dict(target)}, drop_scan=(target.chat_id, target.target_id))
+
+    def record_scan(self, target: TargetItem) -> None:
+        """스캔 일정만 기록 (스캔마다 호출되므로 전체 타겟 대신 시각만 저장)"""
+        key = (target.chat_id, target.target_id)
+        record = {
+            'op': 'scan',
+            'chat_id': target.chat_id,
+            'target_id': target.target_id,
+            'last_scan': target.last_scan.isoformat() if target.last_scan else None,
+            'next_scan': target.next_scan.isoformat(),
+        }
+        with self._cond:
+            if key in self._scans:
+                self.coalesced_scans += 1
+            else:
+                self._wal_records += 1
+            self._scans[key] = record
+            self._wake_locked()
+
+    def remove(self, chat_id: int, target_id: str) -> None:
+        self._append({'op': 'remove', 'chat_id': chat_id, 'target_id': target_id}, drop_scan=(chat_id, target_id))
+
+    def clear(self, chat_id: int) -> None:
+        with self._cond:
+            for key in [key for key in self._scans if key[0] == chat_id]:
+                del self._scans[key]
+        self._append({'op': 'clear', 'chat_id': chat_id})
+
+    def set_group_reserved(self, group_id: str, reserved: bool) -> None:
+        self._append({'op': 'group', 'group_id': group_id, 'reserved': reserved})
+
+    def needs_compaction(self) -> bool:
+        return not self._compacting and self._wal_records >= self.compact_every
+
+    def _append(self, record: Dict[str, Any], drop_scan: Optional[Tuple[int, str]] = None) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self._cond:
+            if drop_scan is not None:
+                # 이 레코드가 더 새로운 상태이므로 앞서 모아 둔 스캔 기록은 쓰지 않음
+                self._scans.pop(drop_scan, None)
+            self._queue.append(line)
+            self._wal_records += 1
+            self._wake_locked()
+
+    def compact(self, targets: Iterable[TargetItem], group_reserved: Dict[str, bool]) -> None:
+        """현재 전체 상태를 스냅샷으로 쓰고 변경 로그를 비움
+
+        이벤트 루프에서 값 배열을 복사하고 (이후 변경과 섞이지 않도록 metadata도 복사),
+        직렬화/fsync/로그 교체는 기록 스레드에서 수행. 스냅샷 기록에 실패하면 로그를 비우지 않고
+        이어서 기록하며 `needs_compaction()`도 계속 True로 남음.
+        """
+        rows = [_capture_row(target) for target in targets]
+        group_reserved = {k: v for k, v in group_reserved.items() if v}
+        with self._cond:
+            self._queue.append(_Snapshot(rows, group_reserved, self._wal_records))
+            self._compacting = True
+            self._wake_locked()
+
+    def flush(self) -> None:
+        """큐에 쌓인 기록이 모두 파일에 쓰일 때까지 대기 (이벤트 루프 밖에서 호출)"""
+        with self._cond:
+            while self._thread is not None and (self._queue or self._scans or self._busy):
+                self._flush_requested = True
+                self._cond.notify_all()
+                self._cond.wait()
+
+    def close(self) -> None:
+        """남은 기록을 모두 쓰고 기록 스레드와 로그 파일을 닫음"""
+        with self._cond:
+            thread = self._thread
+            self._closing = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join()
+        with self._cond:
+            self._thread = None
+            self._closing = False
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def _wake_locked(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="target-store-writer", daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    def _writer(self) -> None:
+        while True:
+            with self._cond:
+                while not (self._queue or self._scans or self._closing):
+                    self._cond.wait()
+                # 첫 기록 후 잠시 기다려 그동안의 변경을 한 번의 write+flush로 모음
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closing or self._flush_requested):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_requested = False
+                items, self._queue = self._queue, []
+                scans, self._scans = self._scans, {}
+                if not (items or scans):
+                    self._cond.notify_all()
+                    return
+                self._busy = True
+            try:
+                self._write_batch(items, scans)
+            except Exception as exc:
+                logger.error("Target store write failed: %s", exc)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self.batches += 1
+                    self._cond.notify_all()
+
+    def _write_batch(self, items: List[Any], scans: Dict[Tuple[int, str], Dict[str, Any]]) -> None:
+        lines: List[str] = []
+        for item in items:
+            if not isinstance(item, _Snapshot):
+                lines.append(item)
+                continue
+            try:
+                self._write_snapshot(item)
+            except Exception as exc:
+                # 기존 로그를 그대로 두고 앞뒤 레코드를 이어서 기록 (다음 변경 때 다시 압축)
+                logger.error("Target snapshot write failed, keeping WAL: %s", exc)
+                with self._cond:
+                    self._compacting = False
+                continue
+            # 스냅샷 이전의 레코드는 스냅샷에 포함되므로 쓰지 않음 (로그는 새로 시작됨)
+            lines = []
+            with self._cond:
+                self._wal_records = max(0, self._wal_records - item.covered)
+                self._compacting = False
+        lines.extend(json.dumps(record, ensure_ascii=False, separators=(',', ':')) for record in scans.values())
+        if not lines:
+            return
+        if self._wal is None:
+            self._wal = open(self.wal_path, 'a', encoding='utf-8')
+        self._wal.write('\n'.join(lines))
+        self._wal.write('\n')
+        self._wal.flush()
+
+    def _write_snapshot(self, snapshot: '_Snapshot') -> None:
+        # 타겟마다 키를 반복하지 않도록 필드 목록 + 값 배열로 저장
+        rows = snapshot.rows
+        for row in rows:
+            for index in _DATETIME_INDEXES:
+                value = row[index]
+                if value is not None:
+                    row[index] = value.isoformat()
+        atomic_write_json(self.snapshot_path, {
+            'version': 2,
+            'created_at': datetime.utcnow().isoformat(),
+            'fields': list(_TARGET_FIELDS),
+            'rows': rows,
+            'group_reserved': snapshot.group_reserved,
+        })
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = open(self.wal_path, 'w', encoding='utf-8')
+        logger.info("Target snapshot written: %d targets", len(rows))
+
+    # ---- 복구 ----
+
+    def load(self) -> Tuple[List[TargetItem], Dict[str, bool]]:
+        """스냅샷 + 변경 로그를 재생해 (타겟 목록, 그룹 예매 상태) 반환"""
+        # (chat_id, target_id) -> 필드 순서대로의 값 배열
+        targets: Dict[Tuple[int, str], List[Any]] = {}
+        group_reserved: Dict[str, bool] = {}
+        chat_index = _TARGET_FIELDS.index('chat_id')
+        target_index = _TARGET_FIELDS.index('target_id')
+
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            names = snapshot['fields']
+            if tuple(names) == _TARGET_FIELDS:
+                for row in snapshot['rows']:
+                    targets[(row[chat_index], row[target_index])] = row
+            else:
+                # 필드 구성이 바뀐 이전 스냅샷
+                for row in snapshot['rows']:
+                    data = dict(zip(names, row))
+                    targets[(data['chat_id'], data['target_id'])] = _row_from_dict(data)
+            group_reserved.update(snapshot.get('group_reserved', {}))
+        except FileNotFoundError:
+            pass
+
+        replayed = 0
+        try:
+            with open(self.wal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 기록 도중 종료되어 잘린 마지막 줄
+                        logger.warning("Skipping truncated WAL record")
+                        continue
+                    self._apply(record, targets, group_reserved)
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        self._wal_records = replayed
+
+        items = [_target_from_row(row) for row in targets.values()]
+        logger.info("Target store loaded: %d targets (%d WAL records replayed)", len(items), replayed)
+        return items, group_reserved
+
+    @staticmethod
+    def _apply(
+        record: Dict[str, Any],
+        targets: Dict[Tuple[int, str], List[Any]],
+        group_reserved: Dict[str, bool],
+    ) -> None:
+        op = record.get('op')
+        if op == 'put':
+            data = record['target']
+            targets[(data['chat_id'], data['target_id'])] = _row_from_dict(data)
+        elif op == 'scan':
+            row = targets.get((record['chat_id'], record['target_id']))
+            if row is not None:
+                row[_LAST_SCAN_INDEX] = record['last_scan']
+                row[_NEXT_SCAN_INDEX] = record['next_scan']
+        elif op == 'remove':
+            targets.pop((record['chat_id'], record['target_id']), None)
+        elif op == 'clear':
+            chat_id = record['chat_id']
+            for key in [key for key in targets if key[0] == chat_id]:
+                del targets[key]
+        elif op == 'group':
+            if record.get('reserved'):
+                group_reserved[record['group_id']] = True
+            else:
+                group_reserved.pop(record['group_id'], None)
+
+
+def open_target_store_from_env(suffix: str = '') -> Optional[TargetStore]:
+    """TARGET_STORE_PATH가 설정되어 있으면 저장소 생성 (샤드 워커는 suffix로 파일을 나눔)"""
+    path = os.getenv('TARGET_STORE_PATH')
+    if not path:
+        return None
+    return TargetStore(path + suffix, compact_every=int(os.getenv('TARGET_STORE_COMPACT_EVERY', '10000')))
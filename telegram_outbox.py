@@ -0,0 +1,221 @@
+"""
+텔레그램 발신 메시지 큐 - 예약 경로에서 send_message 지연/flood 제한을 분리
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from rate_limiter import TokenBucket
+
+# 텔레그램 메시지 최대 길이
+MAX_MESSAGE_LENGTH = 4096
+
+
+@dataclass
+class OutboundMessage:
+    chat_id: int
+    text: str
+    reply_markup: Any = None
+    progress_key: Optional[str] = None  # 설정되면 같은 키의 메시지를 제자리 수정
+    attempts: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def coalescable(self) -> bool:
+        return self.reply_markup is None and self.progress_key is None
+
+
+class TelegramOutbox:
+    """텔레그램 전역/채팅별 발신 제한을 지키는 비동기 발신 큐
+
+    - `send_message`는 큐에 넣고 즉시 반환 (예약 경로를 막지 않음)
+    - 채팅별 최소 간격 동안 쌓인 일반 텍스트는 하나의 메시지로 합쳐 발송
+    - `send_progress`는 같은 키의 이전 메시지를 수정 (진행 상황 메시지 폭주 방지)
+    - `RetryAfter`는 워커에서 대기 후 재시도
+    """
+
+    def __init__(
+        self,
+        bot=None,
+        global_rate: float = 25.0,
+        per_chat_interval: float = 1.0,
+        max_attempts: int = 5,
+    ) -> None:
+        self.bot = bot
+        self.per_chat_interval = per_chat_interval
+        self.max_attempts = max_attempts
+        self._global_bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._pending: Dict[int, Deque[OutboundMessage]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._scheduled: set = set()  # ready 큐에 들어가 있거나 예약된 채팅
+        self._next_allowed: Dict[int, float] = {}
+        self._progress_message_ids: Dict[Tuple[int, str], int] = {}
+        self._paused_until = 0.0
+        self._stop_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sent_count = 0
+        self.coalesced_count = 0
+        self.retry_after_count = 0
+        self._logger = logging.getLogger(__name__ + ".TelegramOutbox")
+
+    def bind_bot(self, bot) -> None:
+        self.bot = bot
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task and not self._task.done():
+            return
+        self._loop = loop
+        self._stop_event.clear()
+        self._task = loop.create_task(self.run())
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def send_message(self, chat_id: int, text: str, reply_markup=None, **kwargs) -> None:
+        """`bot.send_message` 대체 - 큐에 넣고 바로 반환"""
+        if kwargs:
+            self._logger.debug("Ignoring unsupported send_message options: %s", list(kwargs))
+        self._enqueue(OutboundMessage(chat_id=chat_id, text=text, reply_markup=reply_markup))
+
+    async def send_progress(self, chat_id: int, key: str, text: str) -> None:
+        """진행 상황 메시지 - 처음엔 발송, 이후엔 같은 메시지를 수정"""
+        pending = self._pending.get(chat_id)
+        if pending:
+            # 아직 발송되지 않은 같은 키의 진행 메시지는 최신 내용으로 교체
+            for message in pending:
+                if message.progress_key == key:
+                    message.text = text
+                    return
+        self._enqueue(OutboundMessage(chat_id=chat_id, text=text, progress_key=key))
+
+    def pending_count(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    def _enqueue(self, message: OutboundMessage) -> None:
+        self._pending.setdefault(message.chat_id, deque()).append(message)
+        self._schedule(message.chat_id)
+
+    def _schedule(self, chat_id: int, delay: float = 0.0) -> None:
+        if chat_id in self._scheduled:
+            return
+        self._scheduled.add(chat_id)
+        if delay > 0 and self._loop is not None:
+            self._loop.call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    def _take_batch(self, chat_id: int) -> List[OutboundMessage]:
+        """채팅의 대기 메시지 중 한 번에 보낼 묶음을 꺼냄"""
+        pending = self._pending.get(chat_id)
+        if not pending:
+            return []
+        first = pending.popleft()
+        batch = [first]
+        if first.coalescable:
+            length = len(first.text)
+            while pending and pending[0].coalescable:
+                nxt = pending[0]
+                if length + 2 + len(nxt.text) > MAX_MESSAGE_LENGTH:
+                    break
+                batch.append(pending.popleft())
+                length += 2 + len(nxt.text)
+        if not pending:
+            self._pending.pop(chat_id, None)
+        return batch
+
+    def _requeue_front(self, chat_id: int, batch: List[OutboundMessage]) -> None:
+        pending = self._pending.setdefault(chat_id, deque())
+        pending.extendleft(reversed(batch))
+
+    async def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                chat_id = await self._ready.get()
+                self._scheduled.discard(chat_id)
+
+                now = time.monotonic()
+                wait = max(self._next_allowed.get(chat_id, 0.0), self._paused_until) - now
+                if wait > 0:
+                    # 채팅별 간격/전역 일시정지 동안 더 쌓인 메시지는 다음 발송 때 합쳐짐
+                    self._schedule(chat_id, wait)
+                    continue
+
+                batch = self._take_batch(chat_id)
+                if not batch:
+                    continue
+
+                await self._global_bucket.acquire()
+                await self._deliver(chat_id, batch)
+
+                if chat_id in self._pending:
+                    self._schedule(chat_id, self.per_chat_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._logger.exception("Telegram outbox error: %s", exc)
+
+    async def _deliver(self, chat_id: int, batch: List[OutboundMessage]) -> None:
+        self._next_allowed[chat_id] = time.monotonic() + self.per_chat_interval
+        head = batch[0]
+        try:
+            if head.progress_key is not None:
+                await self._send_or_edit_progress(head)
+            else:
+                text = "\n\n".join(m.text for m in batch)
+                await self.bot.send_message(chat_id=chat_id, text=text, reply_markup=head.reply_markup)
+            self.sent_count += 1
+            self.coalesced_count += len(batch) - 1
+        except RetryAfter as exc:
+            retry_after = float(getattr(exc, 'retry_after', 1.0) or 1.0)
+            self.retry_after_count += 1
+            self._logger.warning("Telegram flood limit for chat %s, retry after %.1fs", chat_id, retry_after)
+            # 전역 제한일 수 있으므로 전체 발송을 잠시 멈춤
+            self._paused_until = time.monotonic() + retry_after
+            self._requeue_front(chat_id, batch)
+            self._schedule(chat_id, retry_after)
+        except BadRequest as exc:
+            self._logger.warning("Dropping message for chat %s: %s", chat_id, exc)
+        except NetworkError as exc:
+            for message in batch:
+                message.attempts += 1
+            if head.attempts >= self.max_attempts:
+                self._logger.error("Giving up message for chat %s after %d attempts: %s",
+                                   chat_id, head.attempts, exc)
+                return
+            backoff = min(30.0, 2.0 ** head.attempts)
+            self._requeue_front(chat_id, batch)
+            self._schedule(chat_id, backoff)
+
+    async def _send_or_edit_progress(self, message: OutboundMessage) -> None:
+        key = (message.chat_id, message.progress_key)
+        message_id = self._progress_message_ids.get(key)
+        if message_id is not None:
+            try:
+                await self.bot.edit_message_text(chat_id=message.chat_id, message_id=message_id, text=message.text)
+                return
+            except BadRequest as exc:
+                if "not modified" in str(exc).lower():
+                    return
+                # 메시지가 삭제된 경우 등은 새로 발송
+                self._progress_message_ids.pop(key, None)
+        sent = await self.bot.send_message(chat_id=message.chat_id, text=message.text)
+        self._progress_message_ids[key] = sent.message_id
+
+    def reset_progress(self, chat_id: int, key: str) -> None:
+        """다음 진행 메시지는 새로 발송하도록 진행 메시지 연결을 해제"""
+        self._progress_message_ids.pop((chat_id, key), None)
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# 테스트는 저장소 루트의 평면 모듈과 vendored 라이브러리(letskorail, SRT)를 그대로 import
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'letskorail-master'), os.path.join(ROOT, 'SRT-2.6.7')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class FakeClock:
+    """clock 인자로 넘기는 수동 시계 (now를 직접 앞당김)"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from availability_events import SEAT_OPENED, AvailabilityTracker
+from pipeline import TargetRegistry
+
+
+class FakeTrain:
+    def __init__(self, general):
+        self.train_no, self.dpt_time = '101', '080000'
+        self.general = general
+
+    def has_general_seat(self):
+        return self.general
+
+    def has_special_seat(self):
+        return False
+
+    def has_waiting_list(self):
+        return False
+
+
+def test_parties_on_same_route_are_tracked_separately():
+    tracker = AvailabilityTracker()
+    route = ('KTX', '서울', '부산', '20250812')
+    assert [e.kind for e in tracker.observe(*route, [FakeTrain(True)])] == [SEAT_OPENED]
+    # 4인 조회에서는 좌석이 없어도 1인 상태를 닫지 않음
+    assert tracker.observe(*route, [FakeTrain(False)], party=(4, 0)) == []
+    assert tracker.observe(*route, [FakeTrain(True)]) == []
+    events = tracker.observe(*route, [FakeTrain(True)], party=(4, 0))
+    assert [e.route for e in events] == [route + ((4, 0),)]
+
+
+def test_expedite_only_matches_same_party():
+    async def run():
+        registry = TargetRegistry()
+        solo = await registry.add_target(1, 'KTX', '서울', '부산', '20250812', '080000')
+        family = await registry.add_target(1, 'KTX', '서울', '부산', '20250812', '080000',
+                                           metadata={'adult_count': 4})
+        later = datetime.utcnow() + timedelta(minutes=5)
+        solo.next_scan = family.next_scan = later
+        assert await registry.expedite('KTX', '서울', '부산', '20250812', (4, 0)) == 1
+        assert family.next_scan < later
+        assert solo.next_scan == later
+
+    asyncio.run(run())
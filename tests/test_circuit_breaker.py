@@ -0,0 +1,31 @@
+from circuit_breaker import CircuitBreaker
+
+
+def _half_open_breaker(clock, **kwargs):
+    breaker = CircuitBreaker("KTX.search", minimum_calls=1, open_seconds=30, clock=clock, **kwargs)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return breaker
+
+
+def test_half_open_allows_single_probe_until_result(clock):
+    breaker = _half_open_breaker(clock)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_probe_without_result_reopens_after_timeout(clock):
+    breaker = _half_open_breaker(clock, probe_timeout=10)
+    assert breaker.allow_request()
+    clock.now += 9
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trip_count == 2
+    clock.now += 30
+    assert breaker.allow_request()  # 다음 open 기간 뒤 새 프로브 허용
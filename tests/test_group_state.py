@@ -0,0 +1,59 @@
+from group_state import GroupStateMachine
+
+
+def _machine(clock):
+    return GroupStateMachine(claim_timeout=10, reserve_timeout=60, queue_timeout=600, clock=clock)
+
+
+def _reserving(groups, target_id='t1'):
+    token = groups.claim('g')
+    assert groups.begin_reserving('g', token, target_id)
+    return token
+
+
+def test_reserve_timeout_starts_when_task_is_dequeued(clock):
+    groups = _machine(clock)
+    token = _reserving(groups)
+    clock.now += 300  # 실행기 큐에서 대기 (reserve_timeout보다 길게)
+    assert groups.state('g') == GroupStateMachine.RESERVING
+    assert groups.start_reserving('g', token)
+    clock.now += 59
+    assert groups.state('g') == GroupStateMachine.RESERVING
+    clock.now += 1
+    assert groups.state('g') == GroupStateMachine.IDLE
+    assert not groups.start_reserving('g', token)
+
+
+def test_late_success_cancels_second_claim_that_is_still_claiming(clock):
+    groups = _machine(clock)
+    stale = _reserving(groups)
+    groups.start_reserving('g', stale)
+    clock.now += 60
+    second = groups.claim('g')
+    assert second is not None
+    assert groups.complete('g', stale, True) is True
+    assert groups.state('g') == GroupStateMachine.RESERVED
+    assert not groups.begin_reserving('g', second, 't2')
+
+
+def test_late_success_while_second_claim_reserving_ends_reserved(clock):
+    groups = _machine(clock)
+    stale = _reserving(groups)
+    groups.start_reserving('g', stale)
+    clock.now += 60
+    second = _reserving(groups, 't2')
+    assert groups.complete('g', stale, True) is True
+    assert groups.state('g') == GroupStateMachine.RESERVING  # 진행 중인 예매는 멈출 수 없음
+    assert groups.complete('g', second, False) is True  # 두 번째가 실패해도 그룹은 예매 완료
+    assert groups.state('g') == GroupStateMachine.RESERVED
+
+
+def test_second_claim_still_queued_is_not_started_after_late_success(clock):
+    groups = _machine(clock)
+    stale = _reserving(groups)
+    groups.start_reserving('g', stale)
+    clock.now += 60
+    second = _reserving(groups, 't2')
+    groups.complete('g', stale, True)
+    assert not groups.start_reserving('g', second)
+    assert groups.state('g') == GroupStateMachine.RESERVED
@@ -0,0 +1,71 @@
+import asyncio
+
+from group_strategy import SpeculativeGroupReservation
+from pipeline import ReservationTask, TargetItem
+
+
+def _member(target_id, priority):
+    return TargetItem(target_id=target_id, chat_id=1, service='KTX', departure='서울', arrival='부산',
+                      date='20250812', time='080000', group_id='g1', priority=priority)
+
+
+class FakeRegistry:
+    def __init__(self, members):
+        self.members = members
+
+    async def get_targets_by_group(self, chat_id, group_id):
+        return self.members
+
+
+class FakeTrains:
+    def __init__(self, cancel_results):
+        self.cancel_results = list(cancel_results)
+        self.cancel_calls = 0
+
+    async def scan_for_available_train(self, target):
+        return {'summary': target.target_id}
+
+    async def hold_reservation(self, target, payload):
+        # 2순위가 먼저 잡히고 1순위가 뒤에 잡혀 2순위를 취소하게 함
+        await asyncio.sleep(0.01 * (3 - target.priority))
+        return f"R-{target.target_id}"
+
+    async def cancel_reservation(self, target, reservation):
+        self.cancel_calls += 1
+        return self.cancel_results.pop(0)
+
+    def reservation_number(self, service, reservation):
+        return reservation
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append(text)
+
+
+def _run(cancel_results):
+    first, second = _member('a', 1), _member('b', 2)
+    trains = FakeTrains(cancel_results)
+    strategy = SpeculativeGroupReservation(trains, FakeRegistry([first, second]), cancel_retry_delay=0)
+    bot = FakeBot()
+    winner = asyncio.run(strategy.execute(ReservationTask(target=first, train_payload={'summary': 'a'}), bot))
+    return winner, trains, strategy, bot
+
+
+def test_cancel_is_retried_before_giving_up():
+    winner, trains, strategy, bot = _run([False, True])
+    assert winner.target_id == 'a'
+    assert trains.cancel_calls == 2
+    assert strategy.stats.cancel_failures == 0
+    assert '직접 취소' not in bot.sent[0]
+
+
+def test_uncancelled_hold_is_reported_with_reservation_number():
+    winner, trains, strategy, bot = _run([False, False, False])
+    assert trains.cancel_calls == 3
+    assert strategy.stats.cancel_failures == 1
+    assert '직접 취소' in bot.sent[0]
+    assert 'R-b' in bot.sent[0]
@@ -0,0 +1,39 @@
+import asyncio
+from datetime import timedelta
+
+from pipeline import TargetRegistry
+
+
+def _course(time):
+    return {'service': 'KTX', 'departure': '서울', 'arrival': '부산', 'date': '20991015', 'time': time}
+
+
+def test_pending_next_scan_is_rescaled_when_allocation_shrinks():
+    async def run():
+        registry = TargetRegistry()
+        first = await registry.add_target(1, **_course('080000'))
+        scanned = await registry.fetch_next_target()
+        assert scanned is first
+        assert first.next_scan - first.last_scan == timedelta(seconds=first.scan_interval)
+
+        await registry.add_targets(1, [_course(f"{9 + i:02d}0000") for i in range(9)])
+        # 엔티티 10개 → 채팅 할당량 95회/분을 나눠 약 6.3초 간격
+        assert first.scan_interval > 6
+        assert first.next_scan == first.last_scan + timedelta(seconds=first.scan_interval)
+
+    asyncio.run(run())
+
+
+def test_unscanned_and_other_chat_targets_are_left_alone():
+    async def run():
+        registry = TargetRegistry()
+        other = await registry.add_target(2, **_course('080000'))
+        await registry.fetch_next_target()
+        other_next = other.next_scan
+        waiting = await registry.add_target(1, **_course('080000'))
+        waiting_next = waiting.next_scan
+        await registry.add_targets(1, [_course('090000')])
+        assert waiting.next_scan == waiting_next
+        assert other.next_scan == other_next
+
+    asyncio.run(run())
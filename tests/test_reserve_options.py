@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from letskorail.options import SeatOption
+from SRT import SeatType
+
+from reserve_options import ktx_reserve_kwargs, srt_reserve_kwargs
+from scoring import GENERAL, SPECIAL, PreferenceProfile, rank_trains
+
+
+def _target(**metadata):
+    return SimpleNamespace(time='080000', time_end=None, metadata=metadata)
+
+
+def _ktx_train(general=True, special=True):
+    return SimpleNamespace(
+        dpt_time='090000', arv_time='113000',
+        has_general_seat=lambda: general, has_special_seat=lambda: special,
+        general_price=50000, special_price=80000,
+    )
+
+
+def test_ktx_hold_reserves_ranked_class_not_seat_preference():
+    # seat='SPECIAL'(특실 우선)이어도 가격 상한은 일반실 가격으로 통과했으므로 일반실만 예약
+    target = _target(seat='SPECIAL', preference={'price_cap': 60000})
+    ranked = rank_trains([_ktx_train()], 'KTX', PreferenceProfile.for_target(target))
+    assert ranked[0].seat_class == GENERAL
+
+    calls = []
+
+    def reserve(train, **kwargs):
+        calls.append(kwargs)
+
+    reserve(ranked[0].train, **ktx_reserve_kwargs(target, {'seat_class': ranked[0].seat_class}))
+    assert calls == [{'seat_opt': SeatOption.GENERAL_ONLY}]
+
+
+def test_ktx_special_candidate_reserves_special_only():
+    kwargs = ktx_reserve_kwargs(_target(seat='GENERAL_FIRST'), {'seat_class': SPECIAL})
+    assert kwargs['seat_opt'] == SeatOption.SPECIAL_ONLY
+
+
+def test_ktx_selected_seats_take_precedence():
+    seats = [{'car_no': '0005', 'seat': '7A', 'psrm_cl_cd': '1'}]
+    assert ktx_reserve_kwargs(_target(), {'seat_class': GENERAL, 'seat_opt': seats})['seat_opt'] is seats
+
+
+def test_ktx_without_ranked_class_falls_back_to_target_setting():
+    assert ktx_reserve_kwargs(_target(seat='SPECIAL'), {})['seat_opt'] == SeatOption.SPECIAL_FIRST
+
+
+def test_srt_hold_reserves_ranked_class():
+    target = _target(seat='GENERAL_FIRST', window_seat=True)
+    kwargs = srt_reserve_kwargs(target, {'seat_class': SPECIAL}, passengers=['adult'])
+    assert kwargs == {'passengers': ['adult'], 'special_seat': SeatType.SPECIAL_ONLY, 'window_seat': True}
+    assert srt_reserve_kwargs(target, {'seat_class': GENERAL})['special_seat'] == SeatType.GENERAL_ONLY
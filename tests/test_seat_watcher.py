@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+from letskorail.train import Car, Cars, Seats
+
+from pipeline import TargetRegistry
+from rate_limiter import TokenBucket
+from seat_watcher import SeatWatcher
+
+
+def _detail(free):
+    return {"h_srcar_no": "0001", "h_max_seat_no": "8", "seat_infos": {"seat_info": [
+        {"h_con_seat_no": f"{row}{col}", "h_seat_no": str((row - 1) * 4 + "ABCD".index(col) + 1),
+         "h_for_rev_dir_dv": "009", "h_sale_psb_flg": "Y" if f"{row}{col}" in free else "N",
+         "h_sigl_win_in_dv": "012" if col in "AD" else "013", "h_dmd_seat_att": "015"}
+        for row in (1, 2) for col in "ABCD"
+    ]}}
+
+
+class Source:
+    def __init__(self):
+        self.free = set()
+        self.car_fetches = 0
+        car = Car({"h_srcar_no": "0001", "h_psrm_cl_cd": "1"})
+        car._set_loaded_seats(Seats(_detail(self.free)))
+        self.train = SimpleNamespace(train_no="101", dpt_date="20991015", dpt_time="080000", cars=Cars((car,)))
+
+    async def search_watch_trains(self, target, limit):
+        return [self.train]
+
+    async def fetch_watch_cars(self, found):
+        self.car_fetches += 1
+        await asyncio.sleep(0)
+        return [train.cars for train in found]
+
+    async def fetch_car_detail(self, car):
+        return _detail(self.free)
+
+    def seat_watch_payload(self, target, train, seat_opt):
+        return {"seat_opt": seat_opt}
+
+
+async def _watcher():
+    registry = TargetRegistry()
+    target = await registry.add_target(1, "KTX", "서울", "부산", "20991015", "080000", metadata={"seat_watch": True})
+    source = Source()
+    dispatched = []
+
+    async def dispatch(target, payload):
+        dispatched.append(payload["seat_opt"])
+        await registry.set_pending(target.chat_id, target.target_id, True)
+
+    watcher = SeatWatcher(registry, dispatch, source, TokenBucket(rate=1000.0, capacity=1000.0))
+    await watcher.refresh()
+    return registry, target, source, watcher, dispatched
+
+
+def test_open_seat_is_retriggered_once_target_can_dispatch():
+    async def run():
+        registry, target, source, watcher, dispatched = await _watcher()
+        await registry.set_pending(1, target.target_id, True)  # 좌석이 풀릴 때 다른 예매 진행 중
+        source.free = {"1A"}
+        assert await watcher.poll_once() == 0
+        await registry.set_pending(1, target.target_id, False)
+        await watcher.refresh()
+        assert await watcher.poll_once() == 1  # 비트 변화 없이도 다시 평가
+        assert [(s["car_no"], s["seat"]) for s in dispatched[0]] == [("0001", "1A")]
+
+    asyncio.run(run())
+
+
+def test_held_seat_is_restored_after_failed_reservation():
+    async def run():
+        registry, target, source, watcher, dispatched = await _watcher()
+        source.free = {"1A"}
+        assert await watcher.poll_once() == 1
+        seat_info = watcher._trains[("101", "20991015", "080000")].cars[0].seat_map.seats.seat_info
+        assert not seat_info["1A"].sale_psb  # 예매 결과가 나올 때까지 잡아 둠
+
+        await watcher.poll_once()
+        assert not seat_info["1A"].sale_psb
+
+        await registry.handle_reservation_result(1, target.target_id, False)
+        await watcher.refresh()
+        assert await watcher.poll_once() == 0  # 실패 쿨다운 중에는 이미 열린 좌석을 다시 넘기지 않음
+        assert seat_info["1A"].sale_psb
+        assert watcher.stats.released_holds == 1
+
+    asyncio.run(run())
+
+
+def test_concurrent_discovery_of_same_train_is_shared():
+    async def run():
+        registry = TargetRegistry()
+        first = await registry.add_target(1, "KTX", "서울", "부산", "20991015", "080000", metadata={"seat_watch": True})
+        second = await registry.add_target(2, "KTX", "서울", "부산", "20991015", "080000", metadata={"seat_watch": True})
+        source = Source()
+
+        async def dispatch(target, payload):
+            pass
+
+        watcher = SeatWatcher(registry, dispatch, source, TokenBucket(rate=1000.0, capacity=1000.0))
+        await watcher.refresh()
+        assert source.car_fetches == 1
+        watched = watcher._trains[("101", "20991015", "080000")]
+        assert watched.targets == {(1, first.target_id), (2, second.target_id)}
+
+    asyncio.run(run())
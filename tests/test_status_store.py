@@ -0,0 +1,22 @@
+import asyncio
+import json
+
+from status_store import DebouncedJsonWriter
+
+
+def test_continuous_updates_are_written_within_max_delay(tmp_path):
+    path = str(tmp_path / 'status.json')
+    writer = DebouncedJsonWriter(path, delay=0.05, max_delay=0.15)
+
+    async def run():
+        for i in range(20):
+            # delay보다 짧은 간격으로 계속 갱신 (max_delay가 없으면 마지막 flush 전까지 기록 없음)
+            writer.update({'n': i})
+            await asyncio.sleep(0.02)
+        written_before_flush = writer.write_count
+        await writer.flush()
+        return written_before_flush
+
+    assert asyncio.run(run()) >= 1
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == {'n': 19}
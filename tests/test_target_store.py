@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from pipeline import TargetItem
+from target_store import TargetStore
+
+
+def _target(target_id, chat_id=1, **kwargs):
+    return TargetItem(target_id=target_id, chat_id=chat_id, service='KTX', departure='서울', arrival='부산',
+                      date='20250812', time='080000', **kwargs)
+
+
+def test_scan_records_are_coalesced_and_replayed(tmp_path):
+    store = TargetStore(str(tmp_path / 'targets'), flush_interval=60)
+    target = _target('a')
+    store.put(target)
+    base = datetime(2025, 8, 1, 9)
+    for i in range(5):
+        target.last_scan = base + timedelta(seconds=i)
+        target.next_scan = base + timedelta(seconds=i + 30)
+        store.record_scan(target)
+    store.close()
+
+    with open(store.wal_path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 2  # put + 마지막 스캔 기록
+    assert store.coalesced_scans == 4
+    targets, _ = TargetStore(str(tmp_path / 'targets')).load()
+    assert [t.next_scan for t in targets] == [base + timedelta(seconds=34)]
+
+
+def test_put_after_scan_drops_older_scan_record(tmp_path):
+    store = TargetStore(str(tmp_path / 'targets'), flush_interval=60)
+    target = _target('a')
+    store.put(target)
+    target.next_scan = datetime(2025, 8, 1, 9)
+    store.record_scan(target)
+    target.next_scan = datetime(2025, 8, 1, 10)
+    store.put(target)
+    store.close()
+
+    targets, _ = TargetStore(str(tmp_path / 'targets')).load()
+    assert targets[0].next_scan == datetime(2025, 8, 1, 10)
+
+
+def test_records_after_compaction_survive_wal_truncation(tmp_path):
+    store = TargetStore(str(tmp_path / 'targets'), flush_interval=60)
+    first, second = _target('a'), _target('b')
+    store.put(first)
+    store.compact([first], {'g1': True})
+    store.put(second)
+    store.remove(1, 'a')
+    assert not store.needs_compaction()
+    store.flush()
+    store.close()
+
+    targets, group_reserved = TargetStore(str(tmp_path / 'targets')).load()
+    assert [t.target_id for t in targets] == ['b']
+    assert group_reserved == {'g1': True}
+
+
+def test_failed_snapshot_keeps_wal_and_compaction_pending(tmp_path, monkeypatch):
+    import target_store
+
+    def fail(path, data):
+        raise OSError("disk full")
+
+    store = TargetStore(str(tmp_path / 'targets'), compact_every=2, flush_interval=60)
+    first, second = _target('a', metadata={'seat': 'GENERAL_FIRST'}), _target('b')
+    store.put(first)
+    store.put(second)
+    assert store.needs_compaction()
+    monkeypatch.setattr(target_store, 'atomic_write_json', fail)
+    store.compact([first, second], {})
+    assert not store.needs_compaction()  # 스냅샷 기록 중에는 다시 압축하지 않음
+    first.metadata['seat'] = 'SPECIAL_ONLY'  # 복사된 값 배열에는 영향 없음
+    store.remove(1, 'b')
+    store.flush()
+    assert store.needs_compaction()
+
+    monkeypatch.undo()
+    store.close()
+    targets, _ = TargetStore(str(tmp_path / 'targets')).load()
+    assert [t.target_id for t in targets] == ['a']
+
+
+def test_successful_snapshot_discards_covered_records(tmp_path):
+    store = TargetStore(str(tmp_path / 'targets'), compact_every=2, flush_interval=60)
+    target = _target('a', metadata={'seat': 'GENERAL_FIRST'})
+    store.put(target)
+    store.put(_target('b'))
+    store.compact([target], {})
+    target.metadata = {'seat': 'SPECIAL_ONLY'}
+    store.put(target)
+    store.flush()
+    assert not store.needs_compaction()
+    store.close()
+
+    with open(store.wal_path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
+    targets, _ = TargetStore(str(tmp_path / 'targets')).load()
+    assert targets[0].metadata == {'seat': 'SPECIAL_ONLY'}
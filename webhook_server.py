@@ -0,0 +1,227 @@
+"""
+텔레그램 웹훅 서버 - Render 웹 서비스 포트에서 업데이트 수신 및 헬스/레디니스 엔드포인트 제공
+"""
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+from aiohttp import ClientSession, web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """aiohttp 기반 웹훅 수신 서버
+
+    - POST /{url_path}: 텔레그램 업데이트 수신 후 application.update_queue에 적재
+    - GET /healthz: 프로세스 생존 확인 (항상 200)
+    - GET /readyz: 준비 상태 확인 (readiness_checks가 모두 True일 때만 200)
+    """
+
+    def __init__(
+        self,
+        application,
+        port: int = 10000,
+        url_path: str = "telegram",
+        secret_token: Optional[str] = None,
+        listen: str = "0.0.0.0",
+        readiness_checks: Optional[Dict[str, Callable[[], bool]]] = None,
+    ) -> None:
+        self.application = application
+        self.port = port
+        self.url_path = url_path.strip("/")
+        self.secret_token = secret_token
+        self.listen = listen
+        self.readiness_checks = readiness_checks or {}
+        self.received_count = 0
+        self.rejected_count = 0
+        self.last_update_at: Optional[float] = None
+        self._started_at = time.monotonic()
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(f"/{self.url_path}", self._handle_update)
+        app.router.add_get("/healthz", self._handle_health)
+        app.router.add_get("/readyz", self._handle_ready)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info("웹훅 서버 시작: %s:%s/%s", self.listen, self.port, self.url_path)
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token:
+            received = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(received, self.secret_token):
+                self.rejected_count += 1
+                return web.Response(status=403)
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self.rejected_count += 1
+            return web.Response(status=400)
+
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except Exception as exc:
+            # JSON이지만 업데이트 형식이 아닌 본문 (필드 누락/타입 불일치 등)
+            logger.debug("잘못된 업데이트 본문: %s", exc)
+            update = None
+        if update is None:
+            self.rejected_count += 1
+            return web.Response(status=400)
+
+        await self.application.update_queue.put(update)
+        self.received_count += 1
+        self.last_update_at = time.monotonic()
+        return web.Response(status=200)
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'status': 'ok',
+            'uptime': round(time.monotonic() - self._started_at, 1),
+            'updates_received': self.received_count,
+        })
+
+    async def _handle_ready(self, request: web.Request) -> web.Response:
+        checks = {}
+        for name, check in self.readiness_checks.items():
+            try:
+                checks[name] = bool(check())
+            except Exception:
+                checks[name] = False
+        ready = all(checks.values())
+        return web.json_response({'ready': ready, 'checks': checks}, status=200 if ready else 503)
+
+
+async def run_webhook(
+    application,
+    webhook_url: str,
+    port: int,
+    secret_token: Optional[str] = None,
+    readiness_checks: Optional[Dict[str, Callable[[], bool]]] = None,
+    url_path: str = "telegram",
+) -> None:
+    """애플리케이션을 웹훅 모드로 실행 (중단될 때까지 대기)"""
+    secret_token = secret_token or secrets.token_urlsafe(32)
+    checks = {'application': lambda: application.running}
+    checks.update(readiness_checks or {})
+    server = WebhookServer(application, port=port, url_path=url_path,
+                           secret_token=secret_token, readiness_checks=checks)
+
+    await application.initialize()
+    await application.start()
+    await server.start()
+    try:
+        await application.bot.set_webhook(
+            url=f"{webhook_url.rstrip('/')}/{server.url_path}",
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=False,
+        )
+        logger.info("웹훅 등록 완료: %s/%s", webhook_url.rstrip('/'), server.url_path)
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        await application.stop()
+        await application.shutdown()
+        # run_polling과 같이 종료 후 post_shutdown 실행 (파이프라인 정리/상태 기록)
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)
+
+
+class _QueueOnlyApplication:
+    """셀프 테스트용 - update_queue와 bot만 가진 최소 애플리케이션"""
+
+    def __init__(self, bot) -> None:
+        self.bot = bot
+        self.update_queue: asyncio.Queue = asyncio.Queue()
+        self.running = True
+
+
+def _synthetic_update(update_id: int) -> Dict:
+    now = int(time.time())
+    chat = {'id': 1000 + update_id, 'type': 'private', 'first_name': 'selftest'}
+    if update_id % 2:
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': {'id': chat['id'], 'is_bot': False, 'first_name': 'selftest'},
+                'chat_instance': str(chat['id']),
+                'data': 'date_today',
+                'message': {'message_id': update_id, 'date': now, 'chat': chat, 'text': 'calendar'},
+            },
+        }
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'date': now, 'chat': chat, 'text': '/status',
+                    'entities': [{'type': 'bot_command', 'offset': 0, 'length': 7}]},
+    }
+
+
+async def self_test(port: int = 18080, count: int = 200) -> bool:
+    """로컬 웹훅 서버에 가짜 업데이트를 보내 수신/헬스/레디니스 동작과 지연을 확인"""
+    from telegram import Bot
+
+    application = _QueueOnlyApplication(Bot("123456:SELFTEST"))
+    secret = secrets.token_urlsafe(16)
+    server = WebhookServer(application, port=port, secret_token=secret, listen="127.0.0.1",
+                           readiness_checks={'application': lambda: application.running})
+    await server.start()
+    base = f"http://127.0.0.1:{port}"
+    ok = True
+    elapsed = 0.0
+    try:
+        async with ClientSession() as session:
+            async with session.get(f"{base}/healthz") as resp:
+                ok &= resp.status == 200
+            async with session.get(f"{base}/readyz") as resp:
+                ok &= resp.status == 200
+            async with session.post(f"{base}/{server.url_path}", json=_synthetic_update(0)) as resp:
+                ok &= resp.status == 403  # 시크릿 누락
+            async with session.post(f"{base}/{server.url_path}", json={'update_id': 0, 'message': 'x'},
+                                    headers={SECRET_HEADER: secret}) as resp:
+                ok &= resp.status == 400  # 업데이트 형식이 아닌 본문
+
+            started = time.perf_counter()
+            headers = {SECRET_HEADER: secret}
+            for update_id in range(1, count + 1):
+                async with session.post(f"{base}/{server.url_path}", json=_synthetic_update(update_id),
+                                        headers=headers) as resp:
+                    ok &= resp.status == 200
+            elapsed = time.perf_counter() - started
+
+            ok &= application.update_queue.qsize() == count
+            application.running = False
+            async with session.get(f"{base}/readyz") as resp:
+                ok &= resp.status == 503
+    finally:
+        await server.stop()
+
+    print(f"웹훅 셀프 테스트 {'성공' if ok else '실패'}: 업데이트 {count}건, "
+          f"평균 {elapsed / count * 1000:.2f}ms/건")
+    return ok
+
+
+if __name__ == "__main__":
+    if "--self-test" in sys.argv:
+        sys.exit(0 if asyncio.run(self_test()) else 1)
+    print("사용법: python webhook_server.py --self-test")